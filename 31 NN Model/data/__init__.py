@@ -11,6 +11,8 @@ Now you can use the dataset class by specifying flag '--dataset_mode dummy'.
 See our template dataset class 'template_dataset.py' for more details.
 """
 import importlib
+import random
+import numpy as np
 import torch.utils.data
 from data.base_dataset import BaseDataset
 
@@ -72,18 +74,45 @@ class CustomDatasetDataLoader():
         dataset_class = find_dataset_using_name(opt.dataset_mode)
         self.dataset = dataset_class(opt)
         print("dataset [%s] was created" % type(self.dataset).__name__)
+        loader_options = {}
+        if int(opt.num_threads) > 0:  # these options are only accepted with worker processes
+            loader_options['persistent_workers'] = opt.persistent_workers
+            loader_options['prefetch_factor'] = opt.prefetch_factor
+        generator = None
+        if opt.seed is not None:
+            generator = torch.Generator()
+            generator.manual_seed(opt.seed)
+        self.sampler = None
+        if opt.distributed:  # every process loads its own part of the data, shuffled with the same seed in all processes
+            self.sampler = torch.utils.data.distributed.DistributedSampler(
+                self.dataset, shuffle=not opt.serial_batches, seed=opt.seed if opt.seed is not None else 0,
+                drop_last=opt.drop_last)
         self.dataloader = torch.utils.data.DataLoader(
             self.dataset,
             batch_size=opt.batch_size,
-            shuffle=not opt.serial_batches,
-            num_workers=int(opt.num_threads))
+            shuffle=not opt.serial_batches and self.sampler is None,
+            sampler=self.sampler,
+            num_workers=int(opt.num_threads),
+            pin_memory=opt.pin_memory,
+            drop_last=opt.drop_last,
+            worker_init_fn=seed_worker,
+            generator=generator,
+            **loader_options)
 
     def load_data(self):
         return self
 
+    def set_epoch(self, epoch):
+        """Shuffle the data of every process differently in every epoch; only needed with --distributed"""
+        if self.sampler is not None:
+            self.sampler.set_epoch(epoch)
+
     def __len__(self):
-        """Return the number of data in the dataset"""
-        return min(len(self.dataset), self.opt.max_dataset_size)
+        """Return the number of data in the dataset (of this process with --distributed)"""
+        if self.opt.drop_last:
+            return min(len(self.dataloader) * self.opt.batch_size, self.opt.max_dataset_size)
+        num_data = len(self.sampler) if self.sampler is not None else len(self.dataset)
+        return min(num_data, self.opt.max_dataset_size)
 
     def __iter__(self):
         """Return a batch of data"""
@@ -91,3 +120,14 @@ class CustomDatasetDataLoader():
             if i * self.opt.batch_size >= self.opt.max_dataset_size:
                 break
             yield data
+
+
+def seed_worker(worker_id):
+    """Seed the random number generators of a data loading worker.
+
+    PyTorch gives every worker its own torch seed (derived from the seed of the data loader), but the 'random' and
+    numpy generators used by the transforms would otherwise start from the same state in every worker.
+    """
+    worker_seed = torch.initial_seed() % 2 ** 32
+    np.random.seed(worker_seed)
+    random.seed(worker_seed)
@@ -1,4 +1,6 @@
 import os
+import numpy as np
+import torch
 from data.base_dataset import BaseDataset, get_params, get_transform
 from data.image_folder import make_dataset
 from PIL import Image
@@ -20,7 +22,7 @@ class AlignedDataset(BaseDataset):
         """
         BaseDataset.__init__(self, opt)
         self.dir_AB = os.path.join(opt.dataroot, opt.phase)  # get the image directory
-        self.AB_paths = sorted(make_dataset(self.dir_AB, opt.max_dataset_size))  # get image paths
+        self.AB_paths = sorted(make_dataset(self.dir_AB, opt.max_dataset_size, opt.manifest_path))  # get image paths
         assert(self.opt.load_size >= self.opt.crop_size)   # crop_size should be smaller than the size of loaded image
         self.input_nc = self.opt.output_nc if self.opt.direction == 'BtoA' else self.opt.input_nc
         self.output_nc = self.opt.input_nc if self.opt.direction == 'BtoA' else self.opt.output_nc
@@ -46,6 +48,25 @@ class AlignedDataset(BaseDataset):
         A = AB.crop((0, 0, w2, h))
         B = AB.crop((w2, 0, w, h))
 
+        A, B = self.transform_pair(A, B)
+
+        return {'A': A, 'B': B, 'A_paths': AB_path, 'B_paths': AB_path}
+
+    def transform_pair(self, A, B):
+        """Apply the same random augmentation to an image pair and convert it to normalized tensors.
+
+        Parameters:
+            A (PIL image) -- the image in the input domain
+            B (PIL image) -- its corresponding image in the target domain
+
+        Returns the transformed A and B tensors. With --gpu_augment, A and B are returned as uint8 tensors and
+        augmented by the model, batch by batch (see data/batch_augmentation.py).
+        """
+        if self.opt.gpu_augment:
+            return to_uint8_tensor(np.array(A)), to_uint8_tensor(np.array(B))
+
+        w2, h = A.size
+
         # apply the same transform to both A and B
         transform_params = get_params(self.opt, A.size)
         A_transform = get_transform(self.opt, transform_params, grayscale=(self.input_nc == 1))
@@ -59,11 +80,13 @@ class AlignedDataset(BaseDataset):
             A = TF.affine(A,angle=0,translate=(randx,randy),scale=1,shear=0)
             B = TF.affine(B,angle=0,translate=(randx,randy),scale=1,shear=0)
 
-        A = A_transform(A)
-        B = B_transform(B)
-
-        return {'A': A, 'B': B, 'A_paths': AB_path, 'B_paths': AB_path}
+        return A_transform(A), B_transform(B)
 
     def __len__(self):
         """Return the total number of images in the dataset."""
         return len(self.AB_paths)
+
+
+def to_uint8_tensor(image):
+    """Convert a (H, W, 3) uint8 array to a (3, H, W) tensor sharing its memory."""
+    return torch.from_numpy(image).permute(2, 0, 1)
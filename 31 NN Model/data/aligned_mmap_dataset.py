@@ -0,0 +1,129 @@
+"""This module implements a paired dataset backed by a memory-mapped array store.
+
+The store of a phase lives in the directory '/path/to/data/<phase>_mmap' and holds two files:
+    -- pairs.npy:   a uint8 array of shape (N, 2, H, W, 3) in the .npy format; [i, 0] is the A image and [i, 1] the B
+                    image of the i-th pair, already split and decoded.
+    -- index.json:  the format version, the array shape and the paths of the AB images the pairs were built from.
+
+The store is built once from an aligned dataset directory with datasets/make_dataset_mmap.py. DataLoader workers map
+the array instead of reading it, so a pair is sliced out of the page cache without any JPEG decoding or cropping.
+"""
+import json
+import os
+import numpy as np
+from PIL import Image
+from data.aligned_dataset import AlignedDataset, to_uint8_tensor
+from data.base_dataset import BaseDataset
+from data.image_folder import make_dataset
+
+STORE_VERSION = 1
+PAIRS_FILE_NAME = 'pairs.npy'
+INDEX_FILE_NAME = 'index.json'
+
+
+def get_store_dir(dataroot, phase):
+    """Return the directory of the memory-mapped store of a phase."""
+    return os.path.join(dataroot, phase + '_mmap')
+
+
+def build_mmap_store(dir_AB, store_dir, load_size=None, max_dataset_size=float("inf"), manifest_path=None):
+    """Decode the AB images of an aligned dataset directory, split them and write them to a memory-mapped store.
+
+    Parameters:
+        dir_AB (str)            -- directory of the AB images, e.g. '/path/to/data/train'
+        store_dir (str)         -- directory the store is written to
+        load_size (int)         -- if given, every A and B image is resized to load_size x load_size (as the
+                                   'resize_and_crop' preprocessing does); otherwise all images must have the same size
+        max_dataset_size (int)  -- maximum number of pairs written to the store
+        manifest_path (str)     -- JSON file caching the listing of the dataset directory, see make_dataset
+
+    Returns the number of pairs written
+    """
+    AB_paths = sorted(make_dataset(dir_AB, max_dataset_size, manifest_path))
+    if len(AB_paths) == 0:
+        raise RuntimeError('Found 0 images in: ' + dir_AB)
+
+    def load_pair(AB_path):
+        AB = Image.open(AB_path).convert('RGB')
+        w, h = AB.size
+        w2 = int(w / 2)
+        A, B = AB.crop((0, 0, w2, h)), AB.crop((w2, 0, w, h))
+        if load_size is not None:
+            A = A.resize((load_size, load_size), Image.BICUBIC)
+            B = B.resize((load_size, load_size), Image.BICUBIC)
+        return np.stack([np.asarray(A), np.asarray(B)])
+
+    os.makedirs(store_dir, exist_ok=True)
+    first_pair = load_pair(AB_paths[0])
+    shape = (len(AB_paths),) + first_pair.shape
+    # write to temporary files first, so that an interrupted build does not leave a store that looks complete
+    pairs_path = os.path.join(store_dir, PAIRS_FILE_NAME)
+    pairs = np.lib.format.open_memmap(pairs_path + '.tmp', mode='w+', dtype=np.uint8, shape=shape)
+    pairs[0] = first_pair
+    for i, AB_path in enumerate(AB_paths[1:], 1):
+        pair = load_pair(AB_path)
+        if pair.shape != first_pair.shape:
+            raise RuntimeError('%s has size %s but the first image has size %s; all images of a store need the same '
+                               'size, use load_size to resize them' % (AB_path, pair.shape[1:3], first_pair.shape[1:3]))
+        pairs[i] = pair
+    pairs.flush()
+    del pairs
+    os.replace(pairs_path + '.tmp', pairs_path)
+
+    index_path = os.path.join(store_dir, INDEX_FILE_NAME)
+    with open(index_path + '.tmp', 'w') as f:
+        json.dump({'version': STORE_VERSION, 'shape': list(shape), 'paths': AB_paths}, f)
+    os.replace(index_path + '.tmp', index_path)
+    return len(AB_paths)
+
+
+class AlignedMmapDataset(AlignedDataset):
+    """A paired dataset class that reads pre-split image pairs from a memory-mapped store.
+
+    It returns the same data points as AlignedDataset ('--dataset_mode aligned'), with the same augmentation, but
+    reads them from the store in '/path/to/data/<phase>_mmap' (see datasets/make_dataset_mmap.py).
+    """
+
+    def __init__(self, opt):
+        """Initialize this dataset class.
+
+        Parameters:
+            opt (Option class) -- stores all the experiment flags; needs to be a subclass of BaseOptions
+        """
+        BaseDataset.__init__(self, opt)
+        self.store_dir = get_store_dir(opt.dataroot, opt.phase)
+        with open(os.path.join(self.store_dir, INDEX_FILE_NAME)) as f:
+            index = json.load(f)
+        if index.get('version') != STORE_VERSION:
+            raise RuntimeError('%s was built with another version of the store format, build it again with '
+                               'datasets/make_dataset_mmap.py' % self.store_dir)
+        self.AB_paths = index['paths'][:min(opt.max_dataset_size, len(index['paths']))]
+        assert(self.opt.load_size >= self.opt.crop_size)   # crop_size should be smaller than the size of loaded image
+        self.input_nc = self.opt.output_nc if self.opt.direction == 'BtoA' else self.opt.input_nc
+        self.output_nc = self.opt.input_nc if self.opt.direction == 'BtoA' else self.opt.output_nc
+        self.pairs = None  # mapped lazily, so that every DataLoader worker maps the file itself
+
+    def __getitem__(self, index):
+        """Return a data point and its metadata information.
+
+        Parameters:
+            index - - a random integer for data indexing
+
+        Returns a dictionary that contains A, B, A_paths and B_paths (see AlignedDataset)
+        """
+        if self.pairs is None:
+            # copy-on-write mapping: the pairs are never written, but tensors can only share writable memory
+            self.pairs = np.load(os.path.join(self.store_dir, PAIRS_FILE_NAME), mmap_mode='c')
+        # slicing the mapped array does not copy; the pages are read from the page cache when the pair is transformed
+        pair = self.pairs[index]
+        if self.opt.gpu_augment:  # the model augments the batch, the pair is copied once when the batch is collated
+            A, B = to_uint8_tensor(pair[0]), to_uint8_tensor(pair[1])
+        else:
+            A, B = self.transform_pair(Image.fromarray(pair[0]), Image.fromarray(pair[1]))
+
+        AB_path = self.AB_paths[index]
+        return {'A': A, 'B': B, 'A_paths': AB_path, 'B_paths': AB_path}
+
+    def __len__(self):
+        """Return the total number of images in the dataset."""
+        return len(self.AB_paths)
@@ -0,0 +1,120 @@
+"""This module implements the augmentation of the paired datasets as batched tensor operations.
+
+With '--gpu_augment', the aligned datasets return the A and B images as uncollated uint8 tensors and skip the PIL
+transforms. The model then augments the whole collated batch on the training device with <BatchAugmentation>, which
+applies the same steps as <AlignedDataset.transform_pair>:
+    -- the OCT2Hist random translation (training only),
+    -- the resize or scale_width of --preprocess,
+    -- the random crop, the random horizontal flip (unless --no_flip),
+    -- the grayscale conversion (if the domain has 1 channel) and the normalization to [-1, 1].
+Every pair of the batch draws its own random parameters, which are shared by its A and B images.
+
+The resize is a single antialiased bicubic interpolation of the batch. The translation, crop and flip are fused into
+one affine transformation per image, sampled with nearest-neighbor interpolation as the PIL affine transform does, so
+crops and flips copy pixels exactly. All images of a batch need the same size (which the stores of
+'--dataset_mode aligned_mmap' guarantee).
+"""
+import torch
+import torch.nn.functional as F
+
+
+class BatchAugmentation():
+    """This class augments collated batches of uint8 image pairs with the options of a paired dataset."""
+
+    def __init__(self, opt):
+        """Initialize the augmentation with the preprocessing options.
+
+        Parameters:
+            opt (Option class) -- stores all the experiment flags; needs to be a subclass of BaseOptions
+        """
+        self.opt = opt
+        # number of channels of the 'A' and 'B' images of the dataset (see AlignedDataset)
+        self.A_nc = opt.output_nc if opt.direction == 'BtoA' else opt.input_nc
+        self.B_nc = opt.input_nc if opt.direction == 'BtoA' else opt.output_nc
+
+    def __call__(self, A, B):
+        """Augment a batch of image pairs.
+
+        Parameters:
+            A (tensor) -- uint8 images of the input domain, (N, 3, H, W)
+            B (tensor) -- uint8 images of the target domain, (N, 3, H, W)
+
+        Returns the augmented A and B images as float tensors, normalized to [-1, 1]
+        """
+        assert A.dtype == torch.uint8 and B.dtype == torch.uint8, \
+            '--gpu_augment needs a dataset that returns uint8 images, e.g. --dataset_mode aligned or aligned_mmap'
+        num_channels = A.shape[1]
+        AB = torch.cat((A, B), 1).float() / 255  # transform A and B together, so they share the random parameters
+        N, _, h, w = AB.shape
+
+        # translate images by a random amount to increase robustness (in pixels of the original images)
+        if self.opt.isTrain:
+            scale = 0.5
+            translation = (torch.rand(N, 2, device=AB.device) * 2 - 1) * torch.tensor([w, h], device=AB.device) * scale
+        else:
+            translation = torch.zeros(N, 2, device=AB.device)
+
+        # resize the batch to the loaded size
+        load_w, load_h = self._get_load_size(w, h)
+        if (load_w, load_h) != (w, h):
+            try:
+                AB = F.interpolate(AB, size=(load_h, load_w), mode='bicubic', align_corners=False, antialias=True)
+            except TypeError:  # torch < 1.11 does not antialias, which only matters when the images are scaled down
+                AB = F.interpolate(AB, size=(load_h, load_w), mode='bicubic', align_corners=False)
+            AB = AB.clamp(0, 1)  # bicubic interpolation overshoots at edges, as PIL's does before rounding to uint8
+            translation = translation * torch.tensor([load_w / w, load_h / h], device=AB.device)
+
+        # random crop position and random mirroring of every pair
+        out_w, out_h = self._get_output_size(load_w, load_h)
+        crop = torch.stack([torch.randint(0, max(0, load_w - out_w) + 1, (N,), device=AB.device),
+                            torch.randint(0, max(0, load_h - out_h) + 1, (N,), device=AB.device)], 1).float()
+        if self.opt.no_flip:
+            flip = torch.zeros(N, dtype=torch.bool, device=AB.device)
+        else:
+            flip = torch.rand(N, device=AB.device) > 0.5
+
+        # Compose the translation, crop and flip into one affine transform that maps the normalized coordinates o of
+        # every output pixel to the normalized coordinates of the input pixel it is sampled from (align_corners=False):
+        # x_in = sx * o + sx + 2 * (x_start + crop_x) / load_w - 2 * translation_x / load_w - 1, where sx is
+        # -out_w / load_w when flipping (reading the crop from its right edge, x_start = out_w) and out_w / load_w
+        # otherwise (x_start = 0); y_in likewise without flipping
+        sx = (1 - 2 * flip.float()) * out_w / load_w
+        sy = torch.full((N,), out_h / load_h, device=AB.device)
+        x_start = flip.float() * out_w
+        tx = sx + 2 * (x_start + crop[:, 0] - translation[:, 0]) / load_w - 1
+        ty = sy + 2 * (crop[:, 1] - translation[:, 1]) / load_h - 1
+        zeros = torch.zeros(N, device=AB.device)
+        theta = torch.stack([torch.stack([sx, zeros, tx], 1), torch.stack([zeros, sy, ty], 1)], 1)
+        grid = F.affine_grid(theta, [N, AB.shape[1], out_h, out_w], align_corners=False)
+        # pixels translated in from outside of the image are black, as with the PIL affine transform
+        AB = F.grid_sample(AB, grid, mode='nearest', padding_mode='zeros', align_corners=False)
+
+        A, B = AB[:, :num_channels], AB[:, num_channels:]
+        return self._to_output(A, self.A_nc), self._to_output(B, self.B_nc)
+
+    def _get_load_size(self, w, h):
+        """Return the size the images are resized to before cropping (see get_transform)."""
+        opt = self.opt
+        if 'resize' in opt.preprocess:
+            return opt.load_size, opt.load_size
+        if 'scale_width' in opt.preprocess:
+            if w == opt.load_size and h >= opt.crop_size:
+                return w, h
+            return opt.load_size, int(max(opt.load_size * h / w, opt.crop_size))
+        if opt.preprocess == 'none':  # sizes are rounded to multiples of 4
+            return int(round(w / 4) * 4), int(round(h / 4) * 4)
+        return w, h
+
+    def _get_output_size(self, load_w, load_h):
+        """Return the size of the augmented images."""
+        if 'crop' in self.opt.preprocess and (load_w > self.opt.crop_size or load_h > self.opt.crop_size):
+            return self.opt.crop_size, self.opt.crop_size
+        return load_w, load_h
+
+    @staticmethod
+    def _to_output(images, num_channels):
+        """Convert RGB images in [0, 1] to <num_channels> channels normalized to [-1, 1]."""
+        if num_channels == 1:  # ITU-R 601-2 luma transform, as PIL's convert('L')
+            weights = torch.tensor([0.299, 0.587, 0.114], device=images.device).view(1, 3, 1, 1)
+            images = (images * weights).sum(1, keepdim=True)
+        return images * 2 - 1
@@ -5,6 +5,7 @@ so that this class can load images from both current directory and its subdirect
 """
 
 import torch.utils.data as data
+from data.image_manifest import ImageManifest
 
 from PIL import Image
 import os
@@ -20,10 +21,21 @@ def is_image_file(filename):
     return any(filename.endswith(extension) for extension in IMG_EXTENSIONS)
 
 
-def make_dataset(dir, max_dataset_size=float("inf")):
+def make_dataset(dir, max_dataset_size=float("inf"), manifest_path=None):
+    """Return the paths of the images under <dir>.
+
+    If <manifest_path> is given, the directory listing is served from (and kept up to date in) a persistent
+    ImageManifest instead of walking the whole directory tree.
+    """
     images = []
     assert os.path.isdir(dir), '%s is not a valid directory' % dir
 
+    if manifest_path is not None:
+        manifest = ImageManifest(manifest_path)
+        images = manifest.list_images(dir, IMG_EXTENSIONS)
+        manifest.save()
+        return images[:min(max_dataset_size, len(images))]
+
     for root, _, fnames in sorted(os.walk(dir)):
         for fname in fnames:
             if is_image_file(fname):
@@ -0,0 +1,120 @@
+"""This module implements a persistent index of the image files in a dataset directory tree.
+
+Listing a large dataset with os.walk on network-mounted storage can take minutes. The index is stored as a JSON file
+that records, for every image, its relative path, file size, modification time, image dimensions and pair key (the
+file name without extension). A directory is only listed again if its modification time changed, i.e. if files or
+subdirectories were added, removed or renamed; unchanged directories cost a single stat call.
+"""
+import json
+import os
+import tempfile
+from PIL import Image
+
+
+class ImageManifest():
+    """This class loads, incrementally updates and saves the index of one or more dataset directories."""
+
+    VERSION = 1
+
+    def __init__(self, manifest_path):
+        """Load the index from <manifest_path>; an empty index is created if the file does not exist yet.
+
+        Parameters:
+            manifest_path (str) -- path of the JSON file holding the index
+        """
+        self.manifest_path = manifest_path
+        self.dirs = {}
+        self.is_modified = False
+        if os.path.isfile(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            if manifest.get('version') == self.VERSION:  # indexes of other versions are rebuilt from scratch
+                self.dirs = manifest['dirs']
+
+    def list_images(self, dir, extensions):
+        """Return the paths of all images under <dir> (including its subdirectories), sorted by path.
+
+        Parameters:
+            dir (str)               -- root directory of the images
+            extensions (str list)   -- file extensions of the images to list
+        """
+        images = []
+        for entry in self.list_entries(dir):
+            if any(entry['path'].endswith(extension) for extension in extensions):
+                images.append(os.path.join(dir, entry['path']))
+        return images
+
+    def list_entries(self, dir):
+        """Return the index entries of all files under <dir>, sorted by path.
+
+        Every entry is a dictionary holding the 'path' (relative to <dir>), 'size', 'mtime', 'width', 'height' and
+        'pair_key' of a file.
+        """
+        entries = []
+        pending = ['']
+        while pending:
+            rel_dir = pending.pop()
+            listing = self._get_listing(os.path.join(dir, rel_dir) if rel_dir else dir)
+            for name, entry in listing['files'].items():
+                entry = dict(entry)
+                entry['path'] = os.path.join(rel_dir, name)
+                entries.append(entry)
+            pending += [os.path.join(rel_dir, name) for name in listing['subdirs']]
+        return sorted(entries, key=lambda entry: entry['path'])
+
+    def save(self):
+        """Write the index to <manifest_path> if it changed; the file is replaced atomically.
+
+        Every save writes its own temporary file, so that several processes (e.g. the processes of --distributed) can
+        save the same index at once; the last save wins.
+        """
+        if not self.is_modified:
+            return
+        manifest_dir = os.path.dirname(os.path.abspath(self.manifest_path))
+        fd, tmp_path = tempfile.mkstemp(dir=manifest_dir, prefix=os.path.basename(self.manifest_path) + '.',
+                                        suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'version': self.VERSION, 'dirs': self.dirs}, f)
+            os.chmod(tmp_path, 0o644)  # mkstemp creates files that only their owner can read
+            os.replace(tmp_path, self.manifest_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self.is_modified = False
+
+    def _get_listing(self, dir):
+        """Return the cached listing of a single directory, listing it again only if it changed.
+
+        Entries of files whose size and modification time did not change are reused, so only new or modified
+        images are opened to read their dimensions.
+        """
+        key = os.path.relpath(os.path.abspath(dir), os.path.dirname(os.path.abspath(self.manifest_path)))
+        dir_mtime = os.stat(dir).st_mtime
+        cached = self.dirs.get(key)
+        if cached is not None and cached['mtime'] == dir_mtime:
+            return cached
+
+        previous_files = cached['files'] if cached is not None else {}
+        files, subdirs = {}, []
+        with os.scandir(dir) as it:
+            for dir_entry in it:
+                if dir_entry.is_dir():
+                    subdirs.append(dir_entry.name)
+                    continue
+                stat = dir_entry.stat()
+                previous = previous_files.get(dir_entry.name)
+                if previous is not None and previous['size'] == stat.st_size and previous['mtime'] == stat.st_mtime:
+                    files[dir_entry.name] = previous
+                    continue
+                try:
+                    with Image.open(dir_entry.path) as img:  # only the image header is read
+                        width, height = img.size
+                except (IOError, SyntaxError):
+                    width, height = None, None
+                files[dir_entry.name] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'width': width,
+                                         'height': height, 'pair_key': os.path.splitext(dir_entry.name)[0]}
+
+        self.dirs[key] = {'mtime': dir_mtime, 'files': files, 'subdirs': sorted(subdirs)}
+        self.is_modified = True
+        return self.dirs[key]
@@ -0,0 +1,29 @@
+"""Build the memory-mapped store of an aligned dataset, used by '--dataset_mode aligned_mmap'.
+
+Example:
+    python datasets/make_dataset_mmap.py --dataroot ./datasets/facades --phases train test --load_size 286
+
+Every phase directory '/path/to/data/<phase>' of AB images is written to '/path/to/data/<phase>_mmap'.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # import the data package
+from data.aligned_mmap_dataset import build_mmap_store, get_store_dir
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('build the memory-mapped stores of an aligned dataset')
+    parser.add_argument('--dataroot', required=True, help='path to the aligned dataset (should have subfolders train, test, etc)')
+    parser.add_argument('--phases', nargs='+', default=['train'], help='subfolders to build a store for')
+    parser.add_argument('--load_size', type=int, default=None, help='if given, resize every A and B image to load_size x load_size; otherwise all images must have the same size')
+    parser.add_argument('--max_dataset_size', type=int, default=float("inf"), help='maximum number of pairs per store')
+    parser.add_argument('--manifest_path', type=str, default=None, help='JSON file caching the listing of the dataset directories')
+    args = parser.parse_args()
+
+    for phase in args.phases:
+        store_dir = get_store_dir(args.dataroot, phase)
+        num_pairs = build_mmap_store(os.path.join(args.dataroot, phase), store_dir, args.load_size,
+                                     args.max_dataset_size, args.manifest_path)
+        print('phase = %s, wrote %d pairs to %s' % (phase, num_pairs, store_dir))
@@ -1,4 +1,5 @@
 import os
+import contextlib
 import torch
 from collections import OrderedDict
 from abc import ABC, abstractmethod
@@ -42,6 +43,19 @@ class BaseModel(ABC):
         self.optimizers = []
         self.image_paths = []
         self.metric = 0  # used for learning rate policy 'plateau'
+        # automatic mixed precision (--amp); see <autocast> and <backward>
+        self.amp = self.isTrain and opt.amp
+        self.amp_dtype = None
+        if self.amp:
+            amp_dtype = opt.amp_dtype
+            if amp_dtype == 'auto':
+                amp_dtype = 'float16' if self.device.type == 'cuda' else 'bfloat16'
+            if amp_dtype not in ['float16', 'bfloat16']:
+                raise NotImplementedError('amp dtype [%s] is not recognized' % amp_dtype)
+            if amp_dtype == 'float16' and self.device.type != 'cuda':
+                raise ValueError('--amp_dtype float16 needs a GPU, use bfloat16 on CPUs')
+            self.amp_dtype = getattr(torch, amp_dtype)
+        self.grad_scalers = {}  # one gradient scaler per optimizer with float16, created by <backward>
 
     @staticmethod
     def modify_commandline_options(parser, is_train):
@@ -152,12 +166,10 @@ class BaseModel(ABC):
                 save_filename = '%s_net_%s.pth' % (epoch, name)
                 save_path = os.path.join(self.save_dir, save_filename)
                 net = getattr(self, 'net' + name)
-
-                if len(self.gpu_ids) > 0 and torch.cuda.is_available():
-                    torch.save(net.module.cpu().state_dict(), save_path)
-                    net.cuda(self.gpu_ids[0])
-                else:
-                    torch.save(net.cpu().state_dict(), save_path)
+                if isinstance(net, (torch.nn.DataParallel, torch.nn.parallel.DistributedDataParallel)):
+                    net = net.module
+                # the weights are saved from the device they are on; load_networks maps them to the device of the model
+                torch.save(net.state_dict(), save_path)
 
     def __patch_instance_norm_state_dict(self, state_dict, module, keys, i=0):
         """Fix InstanceNorm checkpoints incompatibility (prior to 0.4)"""
@@ -184,7 +196,7 @@ class BaseModel(ABC):
                 load_filename = '%s_net_%s.pth' % (epoch, name)
                 load_path = os.path.join(self.save_dir, load_filename)
                 net = getattr(self, 'net' + name)
-                if isinstance(net, torch.nn.DataParallel):
+                if isinstance(net, (torch.nn.DataParallel, torch.nn.parallel.DistributedDataParallel)):
                     net = net.module
                 print('loading the model from %s' % load_path)
                 # if you are using PyTorch newer than 0.4 (e.g., built from
@@ -216,6 +228,45 @@ class BaseModel(ABC):
                 print('[Network %s] Total number of parameters : %.3f M' % (name, num_params / 1e6))
         print('-----------------------------------------------')
 
+    def autocast(self):
+        """Return the context in which the forward passes and losses are computed.
+
+        With --amp, operations that are safe in 16 bits run in <amp_dtype>; otherwise everything runs in float32.
+        """
+        if not self.amp:
+            return contextlib.nullcontext()
+        return torch.autocast(self.device.type, dtype=self.amp_dtype)
+
+    def backward(self, loss, optimizer):
+        """Calculate the gradients of a loss whose gradients are applied by <optimizer> (see <step>).
+
+        With float16 mixed precision, the loss is scaled by the gradient scaler of the optimizer so that small
+        gradients do not underflow. bfloat16 has the range of float32 and needs no scaling.
+        """
+        if self.amp_dtype != torch.float16:
+            loss.backward()
+            return
+        self._get_grad_scaler(optimizer).scale(loss).backward()
+
+    def step(self, optimizer):
+        """Update the weights of an optimizer with the gradients calculated by <backward>.
+
+        With float16 mixed precision, the gradients are unscaled first; steps whose gradients overflowed are skipped
+        and the scale is lowered.
+        """
+        if self.amp_dtype != torch.float16:
+            optimizer.step()
+            return
+        grad_scaler = self._get_grad_scaler(optimizer)
+        grad_scaler.step(optimizer)
+        grad_scaler.update()
+
+    def _get_grad_scaler(self, optimizer):
+        """Return the gradient scaler of an optimizer, used with float16 mixed precision."""
+        if id(optimizer) not in self.grad_scalers:
+            self.grad_scalers[id(optimizer)] = torch.cuda.amp.GradScaler()
+        return self.grad_scalers[id(optimizer)]
+
     def set_requires_grad(self, nets, requires_grad=False):
         """Set requies_grad=Fasle for all the networks to avoid unnecessary computations
         Parameters:
@@ -228,3 +279,21 @@ class BaseModel(ABC):
             if net is not None:
                 for param in net.parameters():
                     param.requires_grad = requires_grad
+
+    def no_sync(self, nets):
+        """Return the context in which networks run without receiving gradients, e.g. the discriminators in the generator step.
+
+        Parameters:
+            nets (network list)   -- a list of networks
+
+        With --distributed, a forward pass of a DistributedDataParallel network prepares the averaging of its gradients
+        in the next backward pass, which never finishes if the network gets no gradients (see <set_requires_grad>).
+        The forward passes in this context skip that preparation.
+        """
+        if not isinstance(nets, list):
+            nets = [nets]
+        stack = contextlib.ExitStack()
+        for net in nets:
+            if isinstance(net, torch.nn.parallel.DistributedDataParallel):
+                stack.enter_context(net.no_sync())
+        return stack
@@ -107,7 +107,18 @@ def init_net(net, init_type='normal', init_gain=0.02, gpu_ids=[]):
         gpu_ids (int list) -- which GPUs the network runs on: e.g., 0,1,2
 
     Return an initialized network.
+
+    With --distributed, every process runs the network on its own GPU (or on the CPU) and the network is wrapped in
+    DistributedDataParallel instead of DataParallel; batch normalization layers are synchronized across the GPUs.
     """
+    if torch.distributed.is_available() and torch.distributed.is_initialized():
+        if len(gpu_ids) > 0:
+            assert(torch.cuda.is_available())
+            net = torch.nn.SyncBatchNorm.convert_sync_batchnorm(net)  # SyncBatchNorm only runs on GPUs
+            net.to(gpu_ids[0])
+        init_weights(net, init_type, init_gain=init_gain)
+        # the wrapper copies the weights of the first process to the other processes, so all replicas start equal
+        return torch.nn.parallel.DistributedDataParallel(net, device_ids=gpu_ids[:1] if gpu_ids else None)
     if len(gpu_ids) > 0:
         assert(torch.cuda.is_available())
         net.to(gpu_ids[0])
@@ -264,6 +275,8 @@ class GANLoss(nn.Module):
         Returns:
             the calculated loss.
         """
+        # the losses are always computed in float32, also when the discriminator runs in 16 bits (--amp)
+        prediction = prediction.float()
         if self.gan_mode in ['lsgan', 'vanilla']:
             target_tensor = self.get_target_tensor(prediction, target_is_real)
             loss = self.loss(prediction, target_tensor)
@@ -1,6 +1,7 @@
 import torch
 from .base_model import BaseModel
 from . import networks
+from data.batch_augmentation import BatchAugmentation
 
 
 class Pix2PixModel(BaseModel):
@@ -70,6 +71,8 @@ class Pix2PixModel(BaseModel):
             self.optimizer_D = torch.optim.Adam(self.netD.parameters(), lr=opt.lr, betas=(opt.beta1, 0.999))
             self.optimizers.append(self.optimizer_G)
             self.optimizers.append(self.optimizer_D)
+        # with --gpu_augment, the batches are augmented on the device in <set_input>
+        self.batch_augmentation = BatchAugmentation(opt) if opt.gpu_augment else None
 
     def set_input(self, input):
         """Unpack input data from the dataloader and perform necessary pre-processing steps.
@@ -78,10 +81,15 @@ class Pix2PixModel(BaseModel):
             input (dict): include the data itself and its metadata information.
 
         The option 'direction' can be used to swap images in domain A and domain B.
+        With --gpu_augment, the uint8 images of the batch are augmented here, on the device of the model.
         """
         AtoB = self.opt.direction == 'AtoB'
-        self.real_A = input['A' if AtoB else 'B'].to(self.device)
-        self.real_B = input['B' if AtoB else 'A'].to(self.device)
+        # the copies are asynchronous if the batch is in pinned memory (--pin_memory)
+        A, B = input['A'].to(self.device, non_blocking=True), input['B'].to(self.device, non_blocking=True)
+        if self.batch_augmentation is not None:
+            A, B = self.batch_augmentation(A, B)
+        self.real_A = A if AtoB else B
+        self.real_B = B if AtoB else A
         self.image_paths = input['A_paths' if AtoB else 'B_paths']
 
     def forward(self):
@@ -90,39 +98,45 @@ class Pix2PixModel(BaseModel):
 
     def backward_D(self):
         """Calculate GAN loss for the discriminator"""
-        # Fake; stop backprop to the generator by detaching fake_B
-        fake_AB = torch.cat((self.real_A, self.fake_B), 1)  # we use conditional GANs; we need to feed both input and output to the discriminator
-        pred_fake = self.netD(fake_AB.detach())
-        self.loss_D_fake = self.criterionGAN(pred_fake, False)
-        # Real
-        real_AB = torch.cat((self.real_A, self.real_B), 1)
-        pred_real = self.netD(real_AB)
-        self.loss_D_real = self.criterionGAN(pred_real, True)
-        # combine loss and calculate gradients
-        self.loss_D = (self.loss_D_fake + self.loss_D_real) * 0.5
-        self.loss_D.backward()
+        with self.autocast():
+            # Fake; stop backprop to the generator by detaching fake_B
+            fake_AB = torch.cat((self.real_A, self.fake_B), 1)  # we use conditional GANs; we need to feed both input and output to the discriminator
+            pred_fake = self.netD(fake_AB.detach())
+            self.loss_D_fake = self.criterionGAN(pred_fake, False)
+            # Real
+            real_AB = torch.cat((self.real_A, self.real_B), 1)
+            pred_real = self.netD(real_AB)
+            self.loss_D_real = self.criterionGAN(pred_real, True)
+            # combine loss
+            self.loss_D = (self.loss_D_fake + self.loss_D_real) * 0.5
+        # calculate gradients
+        self.backward(self.loss_D, self.optimizer_D)
 
     def backward_G(self):
         """Calculate GAN and L1 loss for the generator"""
-        # First, G(A) should fake the discriminator
-        fake_AB = torch.cat((self.real_A, self.fake_B), 1)
-        pred_fake = self.netD(fake_AB)
-        self.loss_G_GAN = self.criterionGAN(pred_fake, True)
-        # Second, G(A) = B
-        self.loss_G_L1 = self.criterionL1(self.fake_B, self.real_B) * self.opt.lambda_L1
-        # combine loss and calculate gradients
-        self.loss_G = self.loss_G_GAN + self.loss_G_L1
-        self.loss_G.backward()
+        with self.autocast():
+            # First, G(A) should fake the discriminator
+            fake_AB = torch.cat((self.real_A, self.fake_B), 1)
+            with self.no_sync(self.netD):  # D gets no gradients, see <set_requires_grad>
+                pred_fake = self.netD(fake_AB)
+            self.loss_G_GAN = self.criterionGAN(pred_fake, True)
+            # Second, G(A) = B
+            self.loss_G_L1 = self.criterionL1(self.fake_B.float(), self.real_B) * self.opt.lambda_L1
+            # combine loss
+            self.loss_G = self.loss_G_GAN + self.loss_G_L1
+        # calculate gradients
+        self.backward(self.loss_G, self.optimizer_G)
 
     def optimize_parameters(self):
-        self.forward()                   # compute fake images: G(A)
+        with self.autocast():
+            self.forward()               # compute fake images: G(A)
         # update D
         self.set_requires_grad(self.netD, True)  # enable backprop for D
         self.optimizer_D.zero_grad()     # set D's gradients to zero
         self.backward_D()                # calculate gradients for D
-        self.optimizer_D.step()          # update D's weights
+        self.step(self.optimizer_D)      # update D's weights
         # update G
         self.set_requires_grad(self.netD, False)  # D requires no gradients when optimizing G
         self.optimizer_G.zero_grad()        # set G's gradients to zero
         self.backward_G()                   # calculate graidents for G
-        self.optimizer_G.step()             # udpate G's weights
+        self.step(self.optimizer_G)         # udpate G's weights
@@ -1,6 +1,6 @@
 import argparse
 import os
-from util import util
+from util import util, distributed
 import torch
 import models
 import data
@@ -38,16 +38,23 @@ class BaseOptions():
         parser.add_argument('--init_gain', type=float, default=0.02, help='scaling factor for normal, xavier and orthogonal.')
         parser.add_argument('--no_dropout', action='store_true', help='no dropout for the generator')
         # dataset parameters
-        parser.add_argument('--dataset_mode', type=str, default='unaligned', help='chooses how datasets are loaded. [unaligned | aligned | single | colorization]')
+        parser.add_argument('--dataset_mode', type=str, default='unaligned', help='chooses how datasets are loaded. [unaligned | aligned | aligned_mmap | single | colorization]')
         parser.add_argument('--direction', type=str, default='AtoB', help='AtoB or BtoA')
         parser.add_argument('--serial_batches', action='store_true', help='if true, takes images in order to make batches, otherwise takes them randomly')
         parser.add_argument('--num_threads', default=4, type=int, help='# threads for loading data')
         parser.add_argument('--batch_size', type=int, default=1, help='input batch size')
+        parser.add_argument('--pin_memory', action='store_true', help='if specified, batches are loaded into pinned (page-locked) memory, which speeds up and overlaps their copies to the GPU')
+        parser.add_argument('--persistent_workers', action='store_true', help='if specified, the data loading workers are kept alive between epochs instead of being started again for every epoch (needs num_threads > 0)')
+        parser.add_argument('--prefetch_factor', type=int, default=2, help='# batches loaded in advance by each data loading worker (only used if num_threads > 0)')
+        parser.add_argument('--drop_last', action='store_true', help='if specified, drop the last incomplete batch of every epoch, so that all batches have the same shape')
+        parser.add_argument('--seed', type=int, default=None, help='if given, seeds the shuffling of the data and the random augmentations of the data loading workers, which makes the order and augmentation of the data reproducible')
         parser.add_argument('--load_size', type=int, default=286, help='scale images to this size')
         parser.add_argument('--crop_size', type=int, default=256, help='then crop to this size')
+        parser.add_argument('--manifest_path', type=str, default=None, help='JSON file caching the listing of the dataset directories. Created on first use; only directories that changed are listed again')
         parser.add_argument('--max_dataset_size', type=int, default=float("inf"), help='Maximum number of samples allowed per dataset. If the dataset directory contains more than max_dataset_size, only a subset is loaded.')
         parser.add_argument('--preprocess', type=str, default='resize_and_crop', help='scaling and cropping of images at load time [resize_and_crop | crop | scale_width | scale_width_and_crop | none]')
         parser.add_argument('--no_flip', action='store_true', help='if specified, do not flip the images for data augmentation')
+        parser.add_argument('--gpu_augment', action='store_true', help='if specified, the aligned datasets return uint8 images and the model augments every batch with tensor operations on its device instead of PIL on the DataLoader workers. All images of a batch need the same size')
         parser.add_argument('--display_winsize', type=int, default=256, help='display window size for both visdom and HTML')
         # additional parameters
         parser.add_argument('--epoch', type=str, default='latest', help='which epoch to load? set to latest to use latest cached model')
@@ -120,7 +127,15 @@ class BaseOptions():
             suffix = ('_' + opt.suffix.format(**vars(opt))) if opt.suffix != '' else ''
             opt.name = opt.name + suffix
 
-        self.print_options(opt)
+        # join the process group first, so that only the first process prints and saves the options
+        rank, local_rank, world_size = 0, 0, 1
+        if self.isTrain and opt.distributed:
+            use_gpu = any(int(str_id) >= 0 for str_id in opt.gpu_ids.split(','))
+            rank, local_rank, world_size = distributed.init_distributed(opt.dist_backend, use_gpu)
+        if rank == 0:
+            self.print_options(opt)
+        opt.distributed = self.isTrain and opt.distributed
+        opt.rank, opt.local_rank, opt.world_size = rank, local_rank, world_size
 
         # set gpu ids
         str_ids = opt.gpu_ids.split(',')
@@ -129,6 +144,8 @@ class BaseOptions():
             id = int(str_id)
             if id >= 0:
                 opt.gpu_ids.append(id)
+        if opt.distributed and len(opt.gpu_ids) > 0:  # every process trains on one of the GPUs of its machine
+            opt.gpu_ids = [opt.gpu_ids[local_rank % len(opt.gpu_ids)]]
         if len(opt.gpu_ids) > 0:
             torch.cuda.set_device(opt.gpu_ids[0])
 
@@ -35,6 +35,12 @@ class TrainOptions(BaseOptions):
         parser.add_argument('--pool_size', type=int, default=50, help='the size of image buffer that stores previously generated images')
         parser.add_argument('--lr_policy', type=str, default='linear', help='learning rate policy. [linear | step | plateau | cosine]')
         parser.add_argument('--lr_decay_iters', type=int, default=50, help='multiply by a gamma every lr_decay_iters iterations')
+        # mixed precision parameters
+        parser.add_argument('--amp', action='store_true', help='use automatic mixed precision: run the forward passes and losses in 16 bits where it is safe (autocast) with a gradient scaler per optimizer for float16')
+        parser.add_argument('--amp_dtype', type=str, default='auto', help='16-bit type of --amp [auto | float16 | bfloat16]. auto uses float16 on GPUs and bfloat16 on CPUs')
+        # distributed training parameters
+        parser.add_argument('--distributed', action='store_true', help='train with one process per GPU (or several CPU processes with --gpu_ids -1) started by torchrun, see util/distributed.py. --batch_size is the batch size of every process')
+        parser.add_argument('--dist_backend', type=str, default='auto', help='backend of --distributed [auto | nccl | gloo]. auto uses nccl on GPUs and gloo on CPUs')
 
         self.isTrain = True
         return parser
@@ -0,0 +1,67 @@
+"""This module contains helper functions for training with one process per device (--distributed).
+
+The processes are started by torchrun, which sets the environment variables RANK, LOCAL_RANK and WORLD_SIZE of every
+process (and MASTER_ADDR and MASTER_PORT of the process group), e.g.:
+    torchrun --nproc_per_node=2 train.py --dataroot ./datasets/facades --model pix2pix --distributed --gpu_ids 0,1
+Every process trains a replica of the networks on its own part of the data (see <CustomDatasetDataLoader>); the
+networks are wrapped in DistributedDataParallel (see <networks.init_net>), which averages their gradients.
+Without GPUs ('--gpu_ids -1') the processes run on the CPU with the gloo backend, which is useful for testing.
+"""
+import os
+import torch
+import torch.distributed as dist
+
+
+def init_distributed(backend='auto', use_gpu=True):
+    """Join the process group of the processes started by torchrun.
+
+    Parameters:
+        backend (str)   -- the backend of the process group [auto | nccl | gloo]; auto uses nccl on GPUs and gloo on CPUs
+        use_gpu (bool)  -- whether the processes train on GPUs
+
+    Returns the rank of the process, its rank on the local machine and the number of processes
+    """
+    if 'RANK' not in os.environ or 'WORLD_SIZE' not in os.environ:
+        raise RuntimeError('--distributed needs the environment of torchrun, start the training with e.g. '
+                           'torchrun --nproc_per_node=2 train.py ... --distributed')
+    if backend == 'auto':
+        backend = 'nccl' if use_gpu else 'gloo'
+    if backend not in ['nccl', 'gloo']:
+        raise NotImplementedError('distributed backend [%s] is not recognized' % backend)
+    if backend == 'nccl' and not use_gpu:
+        raise ValueError('the nccl backend needs GPUs, use --dist_backend gloo with --gpu_ids -1')
+    dist.init_process_group(backend=backend, init_method='env://')
+    return dist.get_rank(), int(os.environ.get('LOCAL_RANK', 0)), dist.get_world_size()
+
+
+def is_distributed():
+    """Return whether this process is part of a process group."""
+    return dist.is_available() and dist.is_initialized()
+
+
+def is_main_process():
+    """Return whether this process does the logging and saving, i.e. it has rank 0 or there is a single process."""
+    return not is_distributed() or dist.get_rank() == 0
+
+
+def average_losses(losses, device):
+    """Average the losses of all processes.
+
+    Parameters:
+        losses (OrderedDict) -- the losses of this process, see <BaseModel.get_current_losses>
+        device (device)      -- the device of the process; nccl can only reduce tensors on GPUs
+
+    Returns the averaged losses, in the same order. Every process has to call this function.
+    """
+    if not is_distributed() or len(losses) == 0:
+        return losses
+    values = torch.tensor(list(losses.values()), dtype=torch.float64, device=device)
+    dist.all_reduce(values)
+    values /= dist.get_world_size()
+    return type(losses)(zip(losses.keys(), values.tolist()))
+
+
+def cleanup():
+    """Leave the process group at the end of the training."""
+    if is_distributed():
+        dist.destroy_process_group()
@@ -9,13 +9,17 @@ class ImagePool():
     rather than the ones produced by the latest generators.
     """
 
-    def __init__(self, pool_size):
+    def __init__(self, pool_size, seed=None):
         """Initialize the ImagePool class
 
         Parameters:
             pool_size (int) -- the size of image buffer, if pool_size=0, no buffer will be created
+            seed (int)      -- if given, the pool draws its random choices from its own generator with this seed.
+                               With --distributed, all processes use the same seed, so that their pools return
+                               stored images for the same images of the batch and replace the same buffer slots
         """
         self.pool_size = pool_size
+        self.random = random.Random(seed) if seed is not None else random
         if self.pool_size > 0:  # create an empty pool
             self.num_imgs = 0
             self.images = []
@@ -42,9 +46,9 @@ class ImagePool():
                 self.images.append(image)
                 return_images.append(image)
             else:
-                p = random.uniform(0, 1)
+                p = self.random.uniform(0, 1)
                 if p > 0.5:  # by 50% chance, the buffer will return a previously stored image, and insert the current image into the buffer
-                    random_id = random.randint(0, self.pool_size - 1)  # randint is inclusive
+                    random_id = self.random.randint(0, self.pool_size - 1)  # randint is inclusive
                     tmp = self.images[random_id].clone()
                     self.images[random_id] = image
                     return_images.append(tmp)
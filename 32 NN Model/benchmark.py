@@ -0,0 +1,391 @@
+import tensorflow as tf
+import input_pipeline as ip
+import generator
+import discriminator
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from oct2hist_model import OCT2HistModel, PRECISION_POLICIES
+
+'''
+This module is a CPU benchmark suite of the OCT2Hist model and its building blocks. Every benchmark returns a dict of
+metrics, and the suite writes them as JSON and compares them to a baseline JSON file written by an earlier run, so that
+performance regressions are caught:
+
+    'models'            : Time to build the generator and the discriminator (generator.build_model and
+                          discriminator.build_model)
+    'forward_backward'  : Images per second of the generator forward pass and of the forward and backward pass of a
+                          training step (OCT2HistModel.compute_gradients), for several batch sizes
+    'jitter'            : Images per second of random_translate_jitter applied image by image and of
+                          random_translate_jitter_batch applied to a whole batch
+    'load_dataset'      : Images per second of load_dataset over synthetic JPEG images written to a temporary folder
+    'xla'               : Training steps and generator calls per second with and without XLA compilation (see the
+                          jit_compile parameter of OCT2HistModel)
+
+Except for load_dataset, random images are used so that the input pipeline does not affect the measurements. Metrics
+ending in '_per_sec' are better when higher, metrics ending in '_ms' are better when lower.
+'''
+
+# Benchmarks of the suite, see run_benchmarks
+BENCHMARKS = ['models', 'forward_backward', 'jitter', 'load_dataset', 'xla']
+
+'''
+Creates a batch of random normalized OCT and histology images
+
+    Parameters:
+        batch_size      (int)    : Number of image pairs in the batch
+
+    Returns:
+        input_image     (Tensor) : The batch of OCT images
+        target          (Tensor) : The batch of histology images
+'''
+def make_random_batch(batch_size):
+    return (tf.random.uniform([batch_size, 256, 256, 3], -1, 1, seed=1),
+            tf.random.uniform([batch_size, 256, 256, 3], -1, 1, seed=2))
+
+
+'''
+Times a function after running it a number of times to warm up (tracing and compilation happen on the first calls)
+
+    Parameters:
+        fn              (function) : The function to time. The tensors it returns are read to wait for the computation
+                                     to finish
+        num_runs        (int)      : Number of timed calls
+        num_warmup_runs (int)      : Number of calls before the timing starts
+
+    Returns:
+        runs_per_sec    (float)    : The number of calls per second
+'''
+def time_function(fn, num_runs, num_warmup_runs):
+    for _ in range(num_warmup_runs):
+        _wait_for(fn())
+
+    start = time.perf_counter()
+    for _ in range(num_runs):
+        result = fn()
+    _wait_for(result)
+    return num_runs / (time.perf_counter() - start)
+
+
+'''
+Waits for the computation of the tensors of a (nested) result to finish by reading them
+'''
+def _wait_for(result):
+    for value in tf.nest.flatten(result):
+        if isinstance(value, tf.Tensor):
+            value.numpy()
+
+
+'''
+Measures the training steps and generator calls per second of the OCT2Hist model
+
+    Parameters:
+        jit_compile         (boolean) : Whether the model is compiled with XLA
+        batch_size          (int)     : Number of image pairs per training step and generator call
+        num_steps           (int)     : Number of timed training steps and generator calls
+        num_warmup_steps    (int)     : Number of training steps and generator calls before the timing starts
+        precision_policy    (str)     : The Keras mixed precision policy the model is built with
+
+    Returns:
+        results             (dict)    : 'train_steps_per_sec' and 'generate_calls_per_sec'
+'''
+def benchmark_model(jit_compile, batch_size=1, num_steps=20, num_warmup_steps=3, precision_policy='float32'):
+    model = OCT2HistModel(num_epochs_const_lr=1, num_epochs_decay_lr=1, num_batches=1, is_train=True,
+                          precision_policy=precision_policy, jit_compile=jit_compile)
+    input_image, target = make_random_batch(batch_size)
+
+    results = {'train_steps_per_sec': time_function(lambda: model.train_step(input_image, target)[0],
+                                                    num_steps, num_warmup_steps),
+               'generate_calls_per_sec': time_function(lambda: model.generate(input_image),
+                                                       num_steps, num_warmup_steps)}
+
+    # The model sets the global Keras policy, restore the default
+    tf.keras.mixed_precision.set_global_policy('float32')
+    return results
+
+
+'''
+Measures the time it takes to build the generator and the discriminator
+
+    Parameters:
+        num_runs            (int)     : Number of timed builds of each model
+        num_warmup_runs     (int)     : Number of builds of each model before the timing starts
+
+    Returns:
+        results             (dict)    : 'generator_build_ms' and 'discriminator_build_ms'
+'''
+def benchmark_build_models(num_runs=3, num_warmup_runs=1):
+    results = {}
+    for name, build_model in [('generator', generator.build_model), ('discriminator', discriminator.build_model)]:
+        results[name + '_build_ms'] = 1000 / time_function(build_model, num_runs, num_warmup_runs)
+        # Release the built models, their layer names would otherwise keep growing the Keras graph
+        tf.keras.backend.clear_session()
+    return results
+
+
+'''
+Measures the images per second of the generator forward pass and of the forward and backward pass of a training step
+at several batch sizes
+
+    Parameters:
+        batch_sizes         (list)    : The batch sizes to measure
+        num_steps           (int)     : Number of timed calls per batch size
+        num_warmup_steps    (int)     : Number of calls per batch size before the timing starts
+
+    Returns:
+        results             (dict)    : 'forward_images_per_sec_batch_<batch size>' and
+                                        'forward_backward_images_per_sec_batch_<batch size>' for every batch size
+'''
+def benchmark_forward_backward(batch_sizes=(1, 2, 4), num_steps=10, num_warmup_steps=2):
+    model = OCT2HistModel(num_epochs_const_lr=1, num_epochs_decay_lr=1, num_batches=1, is_train=True)
+
+    results = {}
+    for batch_size in batch_sizes:
+        input_image, target = make_random_batch(batch_size)
+        results['forward_images_per_sec_batch_{}'.format(batch_size)] = batch_size * time_function(
+            lambda: model.generate(input_image), num_steps, num_warmup_steps)
+        results['forward_backward_images_per_sec_batch_{}'.format(batch_size)] = batch_size * time_function(
+            lambda: model.compute_gradients(input_image, target, batch_size), num_steps, num_warmup_steps)
+    return results
+
+
+'''
+Measures the images per second of the random jitter augmentation, applied image by image with random_translate_jitter
+and to a whole batch with random_translate_jitter_batch
+
+    Parameters:
+        batch_size          (int)     : Number of image pairs augmented per measurement
+        num_runs            (int)     : Number of timed augmentations of the batch
+        num_warmup_runs     (int)     : Number of augmentations of the batch before the timing starts
+
+    Returns:
+        results             (dict)    : 'jitter_per_image_images_per_sec' and 'jitter_per_batch_images_per_sec'
+'''
+def benchmark_jitter(batch_size=16, num_runs=10, num_warmup_runs=2):
+    input_images = tf.random.uniform([batch_size, ip.IMG_JIT_HEIGHT, ip.IMG_JIT_WIDTH, 3], -1, 1, seed=1)
+    real_images = tf.random.uniform([batch_size, ip.IMG_JIT_HEIGHT, ip.IMG_JIT_WIDTH, 3], -1, 1, seed=2)
+
+    per_image = lambda: [ip.random_translate_jitter(input_images[i], real_images[i]) for i in range(batch_size)]
+    per_batch = lambda: ip.random_translate_jitter_batch(input_images, real_images)
+    return {'jitter_per_image_images_per_sec': batch_size * time_function(per_image, num_runs, num_warmup_runs),
+            'jitter_per_batch_images_per_sec': batch_size * time_function(per_batch, num_runs, num_warmup_runs)}
+
+
+'''
+Writes a folder of synthetic OCT images and a folder of synthetic histology images of the same names
+
+    Parameters:
+        folder              (str)     : The folder the 'OCT/' and 'hist/' folders are created in
+        num_images          (int)     : Number of image pairs
+        height              (int)     : Height of the images
+        width               (int)     : Width of the images
+
+    Returns:
+        OCT_data_folder     (str)     : The folder of the OCT images
+        hist_data_folder    (str)     : The folder of the histology images
+'''
+def write_synthetic_dataset(folder, num_images, height=512, width=1024):
+    OCT_data_folder = os.path.join(folder, 'OCT', '')
+    hist_data_folder = os.path.join(folder, 'hist', '')
+    for data_folder, seed in [(OCT_data_folder, 1), (hist_data_folder, 2)]:
+        os.makedirs(data_folder, exist_ok=True)
+        for i in range(num_images):
+            image = tf.random.stateless_uniform([height, width, 3], seed=[seed, i], maxval=256, dtype=tf.int32)
+            tf.io.write_file(os.path.join(data_folder, 'image_{:05d}.jpg'.format(i)),
+                             tf.io.encode_jpeg(tf.cast(image, tf.uint8)))
+    return OCT_data_folder, hist_data_folder
+
+
+'''
+Measures the images per second load_dataset delivers when training on synthetic JPEG images
+
+    Parameters:
+        num_images          (int)     : Number of synthetic image pairs
+        batch_size          (int)     : The batch size of the dataset
+        num_epochs          (int)     : Number of timed epochs, after one epoch of warm up
+
+    Returns:
+        results             (dict)    : 'load_dataset_images_per_sec'
+'''
+def benchmark_load_dataset(num_images=64, batch_size=4, num_epochs=2):
+    folder = tempfile.mkdtemp()
+    try:
+        OCT_data_folder, hist_data_folder = write_synthetic_dataset(folder, num_images)
+        dataset, _ = ip.load_dataset(OCT_data_folder, hist_data_folder, is_train=True, batch_size=batch_size)
+
+        for _ in dataset:
+            pass
+        start = time.perf_counter()
+        for _ in range(num_epochs):
+            for _ in dataset:
+                pass
+        return {'load_dataset_images_per_sec': num_images * num_epochs / (time.perf_counter() - start)}
+    finally:
+        shutil.rmtree(folder)
+
+
+'''
+Measures the training steps and generator calls per second with and without XLA compilation
+
+    Parameters:
+        batch_size          (int)     : Number of image pairs per training step and generator call
+        num_steps           (int)     : Number of timed training steps and generator calls
+        num_warmup_steps    (int)     : Number of training steps and generator calls before the timing starts
+        precision_policy    (str)     : The Keras mixed precision policy the model is built with
+
+    Returns:
+        results             (dict)    : The results of benchmark_model under 'xla' and 'no_xla', and the speedups of XLA
+'''
+def benchmark_xla(batch_size=1, num_steps=20, num_warmup_steps=3, precision_policy='float32'):
+    results = {}
+    for jit_compile in [False, True]:
+        results['xla' if jit_compile else 'no_xla'] = benchmark_model(jit_compile, batch_size, num_steps,
+                                                                      num_warmup_steps, precision_policy)
+    for key in ['train_steps_per_sec', 'generate_calls_per_sec']:
+        results[key.replace('_per_sec', '_speedup')] = results['xla'][key] / results['no_xla'][key]
+    return results
+
+
+'''
+Runs benchmarks of the suite
+
+    Parameters:
+        benchmarks          (list)    : The names of the benchmarks to run, see BENCHMARKS
+        batch_sizes         (list)    : The batch sizes of the forward_backward benchmark
+        num_steps           (int)     : Number of timed steps of the model benchmarks
+        num_warmup_steps    (int)     : Number of steps before the timing starts in the model benchmarks
+        xla_batch_size      (int)     : Number of image pairs per training step and generator call of the xla benchmark
+        precision_policy    (str)     : The Keras mixed precision policy the model of the xla benchmark is built with
+
+    Returns:
+        results             (dict)    : The metrics of every benchmark, under the name of the benchmark, and the
+                                        environment they were measured in under 'environment'
+'''
+def run_benchmarks(benchmarks=BENCHMARKS, batch_sizes=(1, 2, 4), num_steps=10, num_warmup_steps=2, xla_batch_size=1,
+                   precision_policy='float32'):
+    results = {'environment': {'tensorflow': tf.__version__, 'python': platform.python_version(),
+                               'machine': platform.machine(), 'cpu_count': os.cpu_count()}}
+    for name in benchmarks:
+        print('Running the {} benchmark'.format(name))
+        if name == 'models':
+            results[name] = benchmark_build_models()
+        elif name == 'forward_backward':
+            results[name] = benchmark_forward_backward(batch_sizes, num_steps, num_warmup_steps)
+        elif name == 'jitter':
+            results[name] = benchmark_jitter()
+        elif name == 'load_dataset':
+            results[name] = benchmark_load_dataset()
+        elif name == 'xla':
+            results[name] = benchmark_xla(xla_batch_size, num_steps, num_warmup_steps, precision_policy)
+        else:
+            raise Exception('benchmarks must be in {}'.format(', '.join(BENCHMARKS)))
+    return results
+
+
+'''
+Compares the metrics of a run to the metrics of a baseline run. Only metrics ending in '_per_sec' or '_ms' are
+compared, other values (e.g. speedups) are informative.
+
+    Parameters:
+        results             (dict)    : The results of run_benchmarks
+        baseline            (dict)    : The results of the baseline run
+        tolerance           (float)   : The relative slowdown that is tolerated, as the timings of CPU runs vary
+
+    Returns:
+        comparison          (dict)    : Maps '<benchmark>/<metric>' of every metric in both runs to its baseline value,
+                                        value, speedup (> 1 is faster than the baseline) and whether it regressed
+'''
+def compare_to_baseline(results, baseline, tolerance=0.1):
+    comparison = {}
+    for benchmark, metrics in results.items():
+        if benchmark == 'environment' or benchmark not in baseline:
+            continue
+        for metric, value in _flatten_metrics(metrics).items():
+            baseline_value = _flatten_metrics(baseline[benchmark]).get(metric)
+            if baseline_value is None or not (metric.endswith('_per_sec') or metric.endswith('_ms')):
+                continue
+            speedup = value / baseline_value if metric.endswith('_per_sec') else baseline_value / value
+            comparison['{}/{}'.format(benchmark, metric)] = {'baseline': baseline_value, 'value': value,
+                                                              'speedup': speedup,
+                                                              'regressed': speedup < 1 - tolerance}
+    return comparison
+
+
+def _flatten_metrics(metrics, prefix=''):
+    flat_metrics = {}
+    for key, value in metrics.items():
+        if isinstance(value, dict):
+            flat_metrics.update(_flatten_metrics(value, prefix + key + '/'))
+        else:
+            flat_metrics[prefix + key] = value
+    return flat_metrics
+
+
+if __name__ == '__main__':
+
+    # Setup command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--benchmarks', nargs='*', default=BENCHMARKS, choices=BENCHMARKS, help='Benchmarks to run')
+    parser.add_argument('--batch_sizes', nargs='*', type=int, default=[1, 2, 4],
+                        help='Batch sizes of the forward_backward benchmark')
+    parser.add_argument('--num_steps', type=int, default=10, help='Number of timed steps of the model benchmarks')
+    parser.add_argument('--num_warmup_steps', type=int, default=2,
+                        help='Number of steps before the timing starts, which includes tracing and XLA compilation')
+    parser.add_argument('--batch_size', type=int, default=1,
+                        help='Number of image pairs per training step and generator call of the xla benchmark')
+    parser.add_argument('--precision_policy', type=str, default='float32', choices=PRECISION_POLICIES,
+                        help='Keras mixed precision policy the model of the xla benchmark is built with')
+    parser.add_argument('--num_threads', type=int, default=0,
+                        help='Number of CPU threads TensorFlow uses within and across ops, 0 lets TensorFlow choose. '
+                             'Fix it to compare runs on machines with a different number of cores.')
+    parser.add_argument('--seed', type=int, default=8, help='Seed of the random weights and augmentations')
+    parser.add_argument('--device', type=str, default='/cpu:0', help='Device the benchmarks run on')
+    parser.add_argument('--output_file', type=str, default=None, help='JSON file the results are written to')
+    parser.add_argument('--baseline', type=str, default=None,
+                        help='JSON file of an earlier run (see --save_baseline) the results are compared to. The '
+                             'script exits with an error if a metric regressed.')
+    parser.add_argument('--save_baseline', type=str, default=None,
+                        help='JSON file the results are written to as the baseline of later runs')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='Relative slowdown compared to the baseline that is not reported as a regression')
+    args = parser.parse_args()
+
+    # Make the runs reproducible
+    if args.num_threads > 0:
+        tf.config.threading.set_intra_op_parallelism_threads(args.num_threads)
+        tf.config.threading.set_inter_op_parallelism_threads(args.num_threads)
+    tf.random.set_seed(args.seed)
+
+    with tf.device(args.device):
+        results = run_benchmarks(args.benchmarks, args.batch_sizes, args.num_steps, args.num_warmup_steps,
+                                 args.batch_size, args.precision_policy)
+    results['environment'].update({'device': args.device, 'num_threads': args.num_threads,
+                                   'xla_batch_size': args.batch_size, 'precision_policy': args.precision_policy})
+
+    regressions = []
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('environment') != results['environment']:
+            print('Warning: the baseline was measured in a different environment: {}'.format(
+                baseline.get('environment')))
+        results['comparison'] = compare_to_baseline(results, baseline, args.tolerance)
+        regressions = [metric for metric, comparison in results['comparison'].items() if comparison['regressed']]
+
+    print(json.dumps(results, indent=2))
+    if args.output_file is not None:
+        with open(args.output_file, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline is not None:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({key: value for key, value in results.items() if key != 'comparison'}, f, indent=2)
+
+    if regressions:
+        print('Performance regressed by more than {:.0%} compared to the baseline: {}'.format(
+            args.tolerance, ', '.join(regressions)))
+        sys.exit(1)
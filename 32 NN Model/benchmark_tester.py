@@ -0,0 +1,52 @@
+import tensorflow as tf
+import input_pipeline as ip
+import benchmark
+import shutil
+import tempfile
+
+
+class BenchmarkTest(tf.test.TestCase):
+
+    # Verify that the synthetic images form a dataset load_dataset can train on
+    def test_write_synthetic_dataset(self):
+        folder = tempfile.mkdtemp()
+        try:
+            OCT_data_folder, hist_data_folder = benchmark.write_synthetic_dataset(folder, 3, height=64, width=128)
+            dataset, num_batches = ip.load_dataset(OCT_data_folder, hist_data_folder, is_train=True, batch_size=1)
+            self.assertEqual(num_batches, 3)
+            for _, OCT_image, hist_image in dataset.take(1):
+                self.assertAllEqual(tf.shape(OCT_image), [1, 256, 256, 3])
+                self.assertAllEqual(tf.shape(hist_image), [1, 256, 256, 3])
+        finally:
+            shutil.rmtree(folder)
+
+    # Verify that metrics are compared in the direction in which they improve, and that only slowdowns beyond the
+    # tolerance are regressions
+    def test_compare_to_baseline(self):
+        baseline = {'environment': {}, 'jitter': {'jitter_per_batch_images_per_sec': 100.0},
+                    'models': {'generator_build_ms': 100.0, 'discriminator_build_ms': 100.0},
+                    'xla': {'train_steps_speedup': 2.0}}
+        results = {'environment': {}, 'jitter': {'jitter_per_batch_images_per_sec': 50.0},
+                   'models': {'generator_build_ms': 105.0, 'discriminator_build_ms': 50.0},
+                   'xla': {'train_steps_speedup': 1.0}, 'load_dataset': {'load_dataset_images_per_sec': 10.0}}
+
+        comparison = benchmark.compare_to_baseline(results, baseline, tolerance=0.1)
+        self.assertCountEqual(comparison.keys(), ['jitter/jitter_per_batch_images_per_sec',
+                                                  'models/generator_build_ms', 'models/discriminator_build_ms'])
+        self.assertTrue(comparison['jitter/jitter_per_batch_images_per_sec']['regressed'])
+        self.assertFalse(comparison['models/generator_build_ms']['regressed'])
+        self.assertAllClose(comparison['models/discriminator_build_ms']['speedup'], 2.0)
+        self.assertFalse(comparison['models/discriminator_build_ms']['regressed'])
+
+    # Verify that the nested results of the xla benchmark are compared
+    def test_compare_to_baseline_nested(self):
+        baseline = {'xla': {'xla': {'train_steps_per_sec': 2.0}, 'no_xla': {'train_steps_per_sec': 1.0}}}
+        results = {'xla': {'xla': {'train_steps_per_sec': 1.0}, 'no_xla': {'train_steps_per_sec': 1.0}}}
+
+        comparison = benchmark.compare_to_baseline(results, baseline)
+        self.assertTrue(comparison['xla/xla/train_steps_per_sec']['regressed'])
+        self.assertFalse(comparison['xla/no_xla/train_steps_per_sec']['regressed'])
+
+
+if __name__ == '__main__':
+    tf.test.main()
@@ -0,0 +1,21 @@
+import input_pipeline as ip
+import argparse
+
+if __name__ == '__main__':
+
+    # Setup command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--OCT_data_folders', required=True, nargs='*', help='A file path or a list of space-separated file paths pointing to the folder(s) of OCT images. \
+                                                                                 Please see the docstring for load_dataset in input_pipeline.py for more formatting details')
+    parser.add_argument('--hist_data_folders', nargs='*', default=[''], help='A file path or a list of space-separated file paths pointing to the folder(s) of histology images. \
+                                                                    Please see the docstring for load_dataset in input_pipeline.py for more formatting details')
+    parser.add_argument('--output_folder', required=True, type=str, help='Folder the compiled dataset is written to. Pass it as --OCT_data_folders to train.py or test.py to use it.')
+    parser.add_argument('--num_shards', type=int, default=8, help='Number of TFRecord shards to split the image pairs into')
+    parser.add_argument('--image_size', type=int, nargs=2, default=None, metavar=('HEIGHT', 'WIDTH'),
+                        help='Resize every image to HEIGHT x WIDTH before storing it. Original dimensions are kept if not set')
+    args = parser.parse_args()
+
+    # Decode all image pairs once and store them in the output folder
+    num_images = ip.compile_dataset(args.OCT_data_folders, args.hist_data_folders, args.output_folder,
+                                    num_shards=args.num_shards, image_size=args.image_size)
+    print('Compiled {} image pairs into {}'.format(num_images, args.output_folder))
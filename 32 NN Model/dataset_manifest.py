@@ -0,0 +1,149 @@
+import json
+import os
+import tempfile
+import threading
+from PIL import Image
+
+'''
+This class contains a persistent index of the image files in the dataset folders, so that the folders do not have to
+be listed again on every run. The index is stored as a JSON file that records, for every image, its path relative to
+its folder, file size, modification time, image dimensions and pair key (the file name without extension, which is
+what OCT and histology images are matched by).
+
+The index is invalidated incrementally: a folder is only listed again if its modification time changed (which
+happens when files are added, removed or renamed), and within a re-listed folder only new or modified files are
+opened to read their dimensions. Files that are overwritten in place without changing the folder are only picked up
+by calling list_folder with refresh=True.
+
+    Class Members:
+        manifest_path       (string)    : The path of the JSON file holding the index
+        folders             (dict)      : Maps a folder path (relative to the manifest file) to its cached listing
+        is_modified         (boolean)   : Indicates whether the index changed since it was loaded or last saved
+'''
+class DatasetManifest:
+
+    VERSION = 1
+
+    '''
+    Loads the index from manifest_path. If the file does not exist yet, an empty index is created and it is written
+    when save is called.
+
+        Parameters:
+            manifest_path       (string)    : The path of the JSON file holding the index
+    '''
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        self.folders = {}
+        self.is_modified = False
+        self._lock = threading.Lock()
+
+        if os.path.isfile(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            # An index written by another version of this class is rebuilt from scratch
+            if manifest.get('version') == self.VERSION:
+                self.folders = manifest['folders']
+
+    '''
+    Returns the listing of the image files in a folder, listing the folder again only if it changed since the index
+    was built.
+
+        Parameters:
+            folder              (string)    : The folder to list
+            extensions          (tuple)     : File extensions of the images to list
+            refresh             (boolean)   : If True, the folder is listed again even if it did not change
+
+        Returns:
+            entries             (list)      : A list of dictionaries, one per image sorted by file name, holding the
+                                              'path', 'size', 'mtime', 'height', 'width' and 'pair_key' of the image
+    '''
+    def list_folder(self, folder, extensions=('.jpg',), refresh=False):
+        key = self._folder_key(folder)
+        folder_mtime = os.stat(folder).st_mtime
+
+        with self._lock:
+            cached = self.folders.get(key)
+        if cached is None or cached['mtime'] != folder_mtime or refresh:
+            cached = self._scan_folder(folder, folder_mtime, cached['files'] if cached is not None else {})
+            with self._lock:
+                self.folders[key] = cached
+                self.is_modified = True
+
+        entries = []
+        for name in sorted(cached['files']):
+            if name.endswith(tuple(extensions)):
+                entry = dict(cached['files'][name])
+                entry['path'] = os.path.join(folder, name)
+                entries.append(entry)
+        return entries
+
+    '''
+    Writes the index to manifest_path if it changed. The file is replaced atomically so that a concurrent reader
+    never sees a partially written index. Every save writes its own temporary file, so that several processes (e.g.
+    the workers of MultiWorkerMirroredStrategy on a shared file system) can save the same index at once; the last
+    save wins.
+    '''
+    def save(self):
+        with self._lock:
+            if not self.is_modified:
+                return
+            manifest_dir = os.path.dirname(os.path.abspath(self.manifest_path))
+            if not os.path.exists(manifest_dir):
+                os.makedirs(manifest_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=manifest_dir, prefix=os.path.basename(self.manifest_path) + '.',
+                                            suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump({'version': self.VERSION, 'folders': self.folders}, f)
+                os.chmod(tmp_path, 0o644)  # mkstemp creates files that only their owner can read
+                os.replace(tmp_path, self.manifest_path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            self.is_modified = False
+
+    '''
+    Lists a folder and builds its cached listing. Entries of files whose size and modification time did not change
+    are reused, so only new or modified images are opened.
+
+        Parameters:
+            folder              (string)    : The folder to list
+            folder_mtime        (float)     : Modification time of the folder
+            previous_files      (dict)      : The previous cached entries of the folder, keyed by file name
+
+        Returns:
+            listing             (dict)      : The cached listing of the folder
+    '''
+    def _scan_folder(self, folder, folder_mtime, previous_files):
+        files = {}
+        with os.scandir(folder) as it:
+            for dir_entry in it:
+                if not dir_entry.is_file():
+                    continue
+                stat = dir_entry.stat()
+                previous = previous_files.get(dir_entry.name)
+                if previous is not None and previous['size'] == stat.st_size and previous['mtime'] == stat.st_mtime:
+                    files[dir_entry.name] = previous
+                    continue
+
+                # Only the image header is read to get the image dimensions
+                try:
+                    with Image.open(dir_entry.path) as image:
+                        width, height = image.size
+                except (IOError, SyntaxError):
+                    width, height = None, None
+                files[dir_entry.name] = {'size': stat.st_size,
+                                         'mtime': stat.st_mtime,
+                                         'height': height,
+                                         'width': width,
+                                         'pair_key': os.path.splitext(dir_entry.name)[0]}
+
+        return {'mtime': folder_mtime, 'files': files}
+
+    '''
+    Returns the key of a folder in the index. Folders are stored relative to the manifest file so that the dataset
+    and its manifest can be moved together.
+    '''
+    def _folder_key(self, folder):
+        manifest_dir = os.path.dirname(os.path.abspath(self.manifest_path))
+        return os.path.relpath(os.path.abspath(folder), manifest_dir)
@@ -0,0 +1,75 @@
+import tensorflow as tf
+import concurrent.futures
+import os
+import shutil
+import threading
+from dataset_manifest import DatasetManifest
+
+
+class DatasetManifestTest(tf.test.TestCase):
+
+    def setUp(self):
+        super(DatasetManifestTest, self).setUp()
+
+        self.folder = os.path.join(self.get_temp_dir(), 'OCT/')
+        os.makedirs(self.folder)
+        shutil.copy("test_vectors/sample_OCT.jpg", os.path.join(self.folder, 'sample.jpg'))
+        self.manifest_path = os.path.join(self.get_temp_dir(), 'manifest.json')
+
+    # Verify that the listing records the image dimensions and pair key of every image
+    def test_list_folder_entries(self):
+        entries = DatasetManifest(self.manifest_path).list_folder(self.folder)
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['pair_key'], 'sample')
+        self.assertEqual(entries[0]['path'], os.path.join(self.folder, 'sample.jpg'))
+        self.assertIsNotNone(entries[0]['height'], msg="Image dimensions must be read from the image header.")
+
+    # Verify that an unchanged folder is served from the saved index
+    def test_list_folder_cached(self):
+        manifest = DatasetManifest(self.manifest_path)
+        manifest.list_folder(self.folder)
+        manifest.save()
+
+        reloaded_manifest = DatasetManifest(self.manifest_path)
+        entries = reloaded_manifest.list_folder(self.folder)
+        self.assertFalse(reloaded_manifest.is_modified, msg="An unchanged folder must not be listed again.")
+        self.assertEqual(len(entries), 1)
+
+    # Verify that files added to a folder invalidate its listing
+    def test_list_folder_invalidated(self):
+        manifest = DatasetManifest(self.manifest_path)
+        manifest.list_folder(self.folder)
+        manifest.save()
+
+        shutil.copy("test_vectors/sample_OCT.jpg", os.path.join(self.folder, 'sample2.jpg'))
+        # Make sure the folder modification time changes even on file systems with a coarse time resolution
+        folder_mtime = os.stat(self.folder).st_mtime + 10
+        os.utime(self.folder, (folder_mtime, folder_mtime))
+
+        entries = DatasetManifest(self.manifest_path).list_folder(self.folder)
+        self.assertEqual([entry['pair_key'] for entry in entries], ['sample', 'sample2'])
+
+    # Verify that several saves of the same index, as by several workers, leave a complete index and no temporary files
+    def test_save_concurrent(self):
+        num_workers = 8
+        manifests = [DatasetManifest(self.manifest_path) for _ in range(num_workers)]
+        for manifest in manifests:
+            manifest.list_folder(self.folder)
+
+        # Release all saves at once so that they overlap
+        barrier = threading.Barrier(num_workers)
+
+        def save(manifest):
+            barrier.wait()
+            manifest.save()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+            list(executor.map(save, manifests))
+
+        self.assertEqual(os.listdir(self.get_temp_dir()).count('manifest.json'), 1)
+        self.assertEqual([name for name in os.listdir(self.get_temp_dir()) if name.endswith('.tmp')], [])
+        self.assertEqual(len(DatasetManifest(self.manifest_path).list_folder(self.folder)), 1)
+
+
+if __name__ == '__main__':
+    tf.test.main()
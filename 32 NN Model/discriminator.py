@@ -1,8 +1,7 @@
 import tensorflow as tf
-import tensorflow_addons as tfa
 from tensorflow import keras
 from tensorflow.keras import layers
-from network_building_blocks import downsample
+from network_building_blocks import downsample, InstanceNormalization
 
 '''
 Constructs a PatchGAN discriminator model. Each block in the discriminator is (Conv -> BatchNorm -> Leaky ReLU)
@@ -48,7 +47,7 @@ def build_model():
     if NORM_TYPE == "batch":
         norm = layers.BatchNormalization()(conv)
     elif NORM_TYPE == "instance":
-        norm = tfa.layers.InstanceNormalization(axis=-1, epsilon=1e-5, center=False, scale=False)(conv)
+        norm = InstanceNormalization(epsilon=1e-5)(conv)
     else:
         raise Exception("NORM_TYPE must be 'instance' or 'batch'")
 
@@ -59,9 +58,13 @@ def build_model():
     zero_pad2 = layers.ZeroPadding2D()(leaky_relu)  # (bs, 33, 33, 512)
     last = layers.Conv2D(1, 4, strides=1, kernel_initializer=initializer)(zero_pad2)  # (bs, 30, 30, 1)
 
+    # The logits are always float32, also when the model is built with a mixed precision policy
+    last = layers.Activation('linear', dtype='float32')(last)
+
     # Define the model constructed by the above layers as well as the associated loss function
+    # The loss is not reduced by the loss object, compute_loss averages it over the (global) batch
     patch_GAN_model = keras.Model(inputs=[OCT_image, hist_image], outputs=last)
-    loss_object = keras.losses.BinaryCrossentropy(from_logits=True)
+    loss_object = keras.losses.BinaryCrossentropy(from_logits=True, reduction=keras.losses.Reduction.NONE)
 
     return patch_GAN_model, loss_object
 
@@ -72,21 +75,78 @@ Computes the total loss of the discriminator
         loss_object             (Tensor) : Loss function associated with the discriminator model 
         disc_real_output        (Tensor) : Output of the discriminator when given the real image
         disc_generated_output   (Tensor) : Output of the discriminator when given the image produced by the generator
+        global_batch_size       (Tensor) : (OPTIONAL) Number of images in the batch across all replicas when training 
+                                           is distributed. See generator.compute_loss.
 
     Returns:
         total_disc_loss         (Tensor) : Total discriminator loss
 '''
-def compute_loss(loss_object, disc_real_output, disc_generated_output):
+def compute_loss(loss_object, disc_real_output, disc_generated_output, global_batch_size=None):
 
     # Binary sigmoid cross entropy loss of the discriminator when the discriminator inputs are the real histology images
     # We send an array of ones the same shape as disc_real_output to indicate that all the images are real
     real_loss = loss_object(tf.ones_like(disc_real_output), disc_real_output)
+    real_loss = tf.nn.compute_average_loss(tf.reduce_mean(real_loss, axis=[1, 2]), global_batch_size=global_batch_size)
 
     # Binary sigmoid cross entropy loss of the discriminator when the discriminator inputs are the fake histology images
     # We send an array of zeros the same shape as disc_generated_output to indicate that all the images are fake
     generated_loss = loss_object(tf.zeros_like(disc_generated_output), disc_generated_output)
+    generated_loss = tf.nn.compute_average_loss(tf.reduce_mean(generated_loss, axis=[1, 2]),
+                                                global_batch_size=global_batch_size)
 
     # Combine both cross entropy losses (See the pix2pix paper for more details: https://arxiv.org/abs/1611.07004)
     total_disc_loss = (real_loss + generated_loss) * 0.5
 
     return total_disc_loss
+
+'''
+Runs the discriminator once on the real and the fake image pairs, concatenated along the batch axis, instead of once 
+per pair type. The discriminator normalizes every image on its own (instance normalization), so the outputs are the 
+same as with two separate calls.
+
+    Parameters:
+        patch_GAN_model         (TensorFlow.keras.Model) : The discriminator
+        input_image             (Tensor)                 : The batch of OCT images
+        target                  (Tensor)                 : The batch of real histology images
+        gen_output              (Tensor)                 : The batch of fake histology images
+        training                (Boolean)                : Whether the discriminator is run in training mode
+
+    Returns:
+        disc_real_output        (Tensor) : Output of the discriminator when given the real images
+        disc_generated_output   (Tensor) : Output of the discriminator when given the images produced by the generator
+'''
+def discriminate_real_and_generated(patch_GAN_model, input_image, target, gen_output, training=True):
+
+    batch_size = tf.shape(input_image)[0]
+    disc_output = patch_GAN_model([tf.concat([input_image, input_image], axis=0),
+                                   tf.concat([target, tf.cast(gen_output, target.dtype)], axis=0)], training=training)
+
+    return disc_output[:batch_size], disc_output[batch_size:]
+
+'''
+Computes the total loss of the discriminator directly from its logits, without allocating label tensors. Gives the 
+same loss as compute_loss.
+
+    Parameters:
+        disc_real_output        (Tensor) : Output (logits) of the discriminator when given the real image
+        disc_generated_output   (Tensor) : Output (logits) of the discriminator when given the image produced by the 
+                                           generator
+        global_batch_size       (Tensor) : (OPTIONAL) Number of images in the batch across all replicas when training 
+                                           is distributed. See generator.compute_loss.
+
+    Returns:
+        total_disc_loss         (Tensor) : Total discriminator loss
+'''
+def compute_loss_from_logits(disc_real_output, disc_generated_output, global_batch_size=None):
+
+    # Sigmoid cross entropy with labels of ones for the real images, sigmoid_cross_entropy_with_logits(1, x) = 
+    # softplus(-x), and with labels of zeros for the fake images, sigmoid_cross_entropy_with_logits(0, x) = softplus(x)
+    real_loss = tf.nn.compute_average_loss(tf.reduce_mean(tf.math.softplus(-disc_real_output), axis=[1, 2, 3]),
+                                           global_batch_size=global_batch_size)
+    generated_loss = tf.nn.compute_average_loss(tf.reduce_mean(tf.math.softplus(disc_generated_output),
+                                                               axis=[1, 2, 3]),
+                                                global_batch_size=global_batch_size)
+
+    total_disc_loss = (real_loss + generated_loss) * 0.5
+
+    return total_disc_loss
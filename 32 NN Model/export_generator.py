@@ -0,0 +1,97 @@
+import tensorflow as tf
+import generator
+import argparse
+
+'''
+This module exports the generator of a trained OCT2Hist model as a standalone SavedModel, so that inference does not
+have to construct the full OCT2HistModel (discriminator, optimizers and summary writer) and restore the whole training
+checkpoint. The SavedModel holds the weights and the traced graph of the generator only; it is loaded with
+tf.saved_model.load and needs none of the python code of this repository.
+'''
+
+# Dimensions of the images the exported generator takes
+IMG_HEIGHT = 256
+IMG_WIDTH = 256
+
+'''
+This class wraps the generator with a concrete tf.function signature for serving
+
+    Class Members:
+        generator   (TensorFlow.keras.Model) : The OCT2Hist generator
+        training    (boolean)                : Whether the generator is run in training mode, i.e. with dropout
+'''
+class ExportedGenerator(tf.Module):
+
+    def __init__(self, generator_model, training=False):
+        super(ExportedGenerator, self).__init__()
+        self.generator = generator_model
+        self.training = training
+
+    '''
+    Translates a batch of OCT images into virtual histology images
+
+        Parameters:
+            OCT_images      (Tensor) : A (batch x 256 x 256 x 3) batch of OCT images, normalized to [-1, 1]
+
+        Returns:
+            outputs         (dict)   : 'hist_images' holds the (batch x 256 x 256 x 3) batch of virtual histology
+                                       images, normalized to [-1, 1]
+    '''
+    @tf.function(input_signature=[tf.TensorSpec([None, IMG_HEIGHT, IMG_WIDTH, 3], tf.float32, name='OCT_images')])
+    def translate(self, OCT_images):
+        return {'hist_images': self.generator(OCT_images, training=self.training)}
+
+
+'''
+Builds the generator and restores its weights from a training checkpoint. Only the generator is restored, the
+discriminator and optimizer state stored in the checkpoint are skipped.
+
+    Parameters:
+        checkpoint_dir  (str) : The directory the training checkpoints are saved in, the latest checkpoint is restored
+
+    Returns:
+        generator_model (TensorFlow.keras.Model) : The restored generator
+'''
+def restore_generator(checkpoint_dir):
+    checkpoint_path = tf.train.latest_checkpoint(checkpoint_dir)
+    if checkpoint_path is None:
+        raise Exception('No checkpoint found in {}'.format(checkpoint_dir))
+
+    generator_model, _ = generator.build_model()
+    # The generator is tracked under the same name as in OCT2HistModel.checkpoint. The discriminator and optimizer
+    # variables of the checkpoint are not needed, but every generator variable must be restored from it
+    status = tf.train.Checkpoint(generator=generator_model).restore(checkpoint_path).expect_partial()
+    status.assert_existing_objects_matched()
+
+    return generator_model
+
+
+'''
+Writes the generator as a SavedModel with the serving signature of ExportedGenerator.translate
+
+    Parameters:
+        generator_model (TensorFlow.keras.Model) : The generator to export
+        export_dir      (str)                    : The directory the SavedModel is written to
+        training        (boolean)                : Whether the exported generator runs in training mode (with dropout),
+                                                   like test.py does
+'''
+def export_generator(generator_model, export_dir, training=False):
+    module = ExportedGenerator(generator_model, training)
+    tf.saved_model.save(module, export_dir, signatures={'serving_default': module.translate.get_concrete_function()})
+
+
+if __name__ == '__main__':
+
+    # Setup command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--checkpoint_dir', type=str, default='./training_checkpoints',
+                        help='Directory of the training checkpoints, the latest checkpoint is exported')
+    parser.add_argument('--export_dir', type=str, default='./exported_generator',
+                        help='Directory the SavedModel is written to')
+    parser.add_argument('--dropout', action='store_true',
+                        help='Export the generator in training mode (with dropout), which is how test.py runs it. '
+                             'The exported generator is deterministic otherwise')
+    args = parser.parse_args()
+
+    export_generator(restore_generator(args.checkpoint_dir), args.export_dir, training=args.dropout)
+    print('Exported the generator to', args.export_dir)
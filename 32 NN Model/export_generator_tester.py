@@ -0,0 +1,33 @@
+import tensorflow as tf
+import os
+import generator
+import export_generator
+
+
+class ExportGeneratorTest(tf.test.TestCase):
+
+    # Verify that the exported SavedModel translates images the same way as the generator it was exported from
+    def test_export_generator_round_trip(self):
+        generator_model, _ = generator.build_model()
+        export_dir = os.path.join(self.get_temp_dir(), 'exported_generator')
+        export_generator.export_generator(generator_model, export_dir)
+
+        OCT_images = tf.random.uniform([2, 256, 256, 3], -1, 1)
+        exported_generator = tf.saved_model.load(export_dir)
+        self.assertAllClose(exported_generator.translate(OCT_images)['hist_images'],
+                            generator_model(OCT_images, training=False), atol=1e-5)
+
+    # Verify that only the generator is restored from a full training checkpoint
+    def test_restore_generator(self):
+        generator_model, _ = generator.build_model()
+        discriminator_variable = tf.Variable(1.0)
+        checkpoint = tf.train.Checkpoint(generator=generator_model, discriminator=discriminator_variable)
+        checkpoint.save(os.path.join(self.get_temp_dir(), 'ckpt'))
+
+        restored_generator = export_generator.restore_generator(self.get_temp_dir())
+        for variable, restored_variable in zip(generator_model.variables, restored_generator.variables):
+            self.assertAllEqual(variable, restored_variable)
+
+
+if __name__ == '__main__':
+    tf.test.main()
@@ -1,6 +1,5 @@
 import tensorflow as tf
-import tensorflow_addons as tfa
-from network_building_blocks import downsample, upsample
+from network_building_blocks import downsample, upsample, InstanceNormalization, ReflectionPad2D
 from tensorflow import keras
 from tensorflow.keras import layers
 
@@ -30,7 +29,7 @@ def build_model():
     initializer = tf.random_normal_initializer(0., 0.02)
 
     # Pad the input tensor using the reflection of the input boundary (similar to nn.ReflectionPad2d in PyTorch)
-    ref_pad = tf.pad(gen_input, paddings=[[0, 0], [3, 3], [3, 3], [0, 0]], mode='REFLECT')
+    ref_pad = ReflectionPad2D(padding=3)(gen_input)
 
     # Pass padded tensor through a convolutional layer (bias terms are initialized to 0)
     conv1 = layers.Conv2D(NUM_FILTERS, 7, kernel_initializer=initializer, use_bias=NORM_TYPE == "instance")(ref_pad)
@@ -41,11 +40,13 @@ def build_model():
     elif NORM_TYPE == "instance":
         # Use instance norm over the channels
         # (no scaling by gamma or offset by beta - corresponds to affine=False in PyTorch)
-        norm1 = tfa.layers.InstanceNormalization(axis=-1, epsilon=1e-5, center=False, scale=False)(conv1)
+        norm1 = InstanceNormalization(epsilon=1e-5)(conv1)
     else:
         raise Exception("NORM_TYPE must be 'instance' or 'batch'")
 
     # Apply ReLU function
+    # (kept as its own layer rather than fused into the instance normalization: checkpoints restore the layers of a 
+    # functional model by their position, which fusing layers here would shift)
     downsample_input = layers.ReLU()(norm1)
 
     # Apply downsampling layers
@@ -71,15 +72,17 @@ def build_model():
         upsample_input = upsample(int(NUM_FILTERS * mult) / 2, 3, norm_type=NORM_TYPE, out_pad=1)(upsample_input)
 
     # Pad the upsampled tensor using the reflection of the input boundary (similar to nn.ReflectionPad2d in PyTorch)
-    upsampled_pad = tf.pad(upsample_input, paddings=[[0, 0], [3, 3], [3, 3], [0, 0]], mode='REFLECT')
+    upsampled_pad = ReflectionPad2D(padding=3)(upsample_input)
 
     # Pass padded tensor through one last conv layer with 3 filters and apply the tanh activation function
+    # The output is always float32, also when the model is built with a mixed precision policy
     conv_out = layers.Conv2D(NUM_OUTPUT_CHANNELS, 7, kernel_initializer=initializer)(upsampled_pad)
-    gen_output = layers.Activation('tanh')(conv_out)
+    gen_output = layers.Activation('tanh', dtype='float32')(conv_out)
 
     # Define the model constructed by the above layers as well as the associated loss function
+    # The loss is not reduced by the loss object, compute_loss averages it over the (global) batch
     resnet_model = keras.Model(inputs=gen_input, outputs=gen_output)
-    loss_object = keras.losses.BinaryCrossentropy(from_logits=True)
+    loss_object = keras.losses.BinaryCrossentropy(from_logits=True, reduction=keras.losses.Reduction.NONE)
     return resnet_model, loss_object
 
 '''
@@ -100,7 +103,7 @@ def resnet_block(input, num_filters, use_dropout, norm_type):
     res_block_input = input
     for i in range(2):
         # Pad the input tensor using the reflection of the input boundary (similar to nn.ReflectionPad2d in PyTorch)
-        padded_input = tf.pad(res_block_input, paddings=[[0, 0], [1, 1], [1, 1], [0, 0]], mode='REFLECT')
+        padded_input = ReflectionPad2D(padding=1)(res_block_input)
 
         # Weights of all convolutional layers are randomly initialized from a Gaussian distribution with mean 0 and
         # standard deviation 0.02
@@ -116,7 +119,7 @@ def resnet_block(input, num_filters, use_dropout, norm_type):
         elif norm_type == "instance":
             # Use instance norm over the channels
             # (no scaling by gamma or offset by beta - corresponds to affine=False in PyTorch)
-            norm = tfa.layers.InstanceNormalization(axis=-1, epsilon=1e-5, center=False, scale=False)(conv)
+            norm = InstanceNormalization(epsilon=1e-5)(conv)
         else:
             norm = conv
 
@@ -138,13 +141,17 @@ Computes the total loss of the generator
         disc_generated_output   (Tensor) : Output of the discriminator when given the image produced by the generator
         gen_output              (Tensor) : Output image from the generator (fake histology image)
         target                  (Tensor) : Real histology image
+        global_batch_size       (Tensor) : (OPTIONAL) Number of images in the batch across all replicas when training
+                                           is distributed. The losses are divided by it, so that summing the losses of
+                                           all replicas gives the mean loss. Defaults to the local batch size times the
+                                           number of replicas in sync.
         
     Returns:
         total_gen_loss          (Tensor) : Combination of adversarial GAN loss and weighted L1 loss
         gan_loss                (Tensor) : Adversarial GAN loss 
         ground_truth_loss       (Tensor) : L1 loss between the real image and image produced by the generator
 '''
-def compute_loss(loss_object, disc_generated_output, gen_output, target):
+def compute_loss(loss_object, disc_generated_output, gen_output, target, global_batch_size=None):
 
     # Weight set to balance between the adversarial GAN loss and the L1 loss. This parameter is set to 100 in the
     # pix2pix paper
@@ -155,12 +162,49 @@ def compute_loss(loss_object, disc_generated_output, gen_output, target):
     # images that fool the discriminator. Therefore, the generator is attempting to minimize the loss so that the fake
     # images appear real to the discriminator
     gan_loss = loss_object(tf.ones_like(disc_generated_output), disc_generated_output)
+    gan_loss = tf.nn.compute_average_loss(tf.reduce_mean(gan_loss, axis=[1, 2]), global_batch_size=global_batch_size)
 
     # mean absolute error (L1 loss) between the real histology image and the corresponding fake histology image
     # produced by the generator
-    ground_truth_loss = tf.reduce_mean(tf.abs(target - gen_output))
+    ground_truth_loss = tf.reduce_mean(tf.abs(target - gen_output), axis=[1, 2, 3])
+    ground_truth_loss = tf.nn.compute_average_loss(ground_truth_loss, global_batch_size=global_batch_size)
 
     # Total generator loss  (See the pix2pix paper for more details: https://arxiv.org/abs/1611.07004)
     total_gen_loss = gan_loss + (LAMBDA * ground_truth_loss)
 
     return total_gen_loss, gan_loss, ground_truth_loss
+
+'''
+Computes the total loss of the generator directly from the discriminator logits, without allocating a label tensor.
+Gives the same losses as compute_loss (see OCT2HistModel, which uses it when the discriminator passes are fused).
+
+    Parameters:
+        disc_generated_output   (Tensor) : Output (logits) of the discriminator when given the image produced by the 
+                                           generator
+        gen_output              (Tensor) : Output image from the generator (fake histology image)
+        target                  (Tensor) : Real histology image
+        global_batch_size       (Tensor) : (OPTIONAL) Number of images in the batch across all replicas. See 
+                                           compute_loss.
+        
+    Returns:
+        total_gen_loss          (Tensor) : Combination of adversarial GAN loss and weighted L1 loss
+        gan_loss                (Tensor) : Adversarial GAN loss 
+        ground_truth_loss       (Tensor) : L1 loss between the real image and image produced by the generator
+'''
+def compute_loss_from_logits(disc_generated_output, gen_output, target, global_batch_size=None):
+
+    # Weight set to balance between the adversarial GAN loss and the L1 loss (see compute_loss)
+    LAMBDA = 100.0
+
+    # Sigmoid cross entropy of the logits with labels of ones, sigmoid_cross_entropy_with_logits(1, x) = softplus(-x)
+    gan_loss = tf.math.softplus(-disc_generated_output)
+    gan_loss = tf.nn.compute_average_loss(tf.reduce_mean(gan_loss, axis=[1, 2, 3]),
+                                          global_batch_size=global_batch_size)
+
+    # mean absolute error (L1 loss) between the real histology image and the corresponding fake histology image
+    ground_truth_loss = tf.reduce_mean(tf.abs(target - gen_output), axis=[1, 2, 3])
+    ground_truth_loss = tf.nn.compute_average_loss(ground_truth_loss, global_batch_size=global_batch_size)
+
+    total_gen_loss = gan_loss + (LAMBDA * ground_truth_loss)
+
+    return total_gen_loss, gan_loss, ground_truth_loss
@@ -23,6 +23,16 @@ class GeneratorTest(tf.test.TestCase):
         self.generator, self.generator_loss = generator.build_model()
         tf.keras.utils.plot_model(self.generator, show_shapes=True, dpi=64, to_file="gen_model.png")
 
+    # Verify that instance normalization keeps every image of a batch independent of the other images in the batch
+    def test_build_model_batch_matches_single_image(self):
+        self.generator, self.generator_loss = generator.build_model()
+        OCT_image = tf.image.resize(self.OCT_image, [256, 256]) / 127.5 - 1
+        hist_image = tf.image.resize(self.hist_image, [256, 256]) / 127.5 - 1
+        batch_output = self.generator(tf.stack([OCT_image, hist_image]), training=False)
+        single_output = self.generator(tf.expand_dims(hist_image, 0), training=False)
+        self.assertAllClose(batch_output[1:], single_output, atol=1e-5,
+                            msg="Batched generator output must match the output for a single image.")
+
 
 if __name__ == '__main__':
     tf.test.main()
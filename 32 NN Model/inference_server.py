@@ -0,0 +1,198 @@
+import tensorflow as tf
+import argparse
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+'''
+This module serves a generator exported by export_generator.py over HTTP. The SavedModel is loaded once when the
+server starts, so requests skip the model construction and checkpoint restore.
+
+    POST /translate     : The body is an encoded (JPEG, PNG, ...) OCT image. The response is the virtual histology
+                          image as a PNG in the dimensions of the OCT image.
+    GET  /health        : Returns 200 once the model is loaded.
+
+Requests are handled on their own threads and the images of concurrent requests are translated together in one
+batch (see RequestBatcher).
+'''
+
+# Dimensions of the images the exported generator takes
+IMG_HEIGHT = 256
+IMG_WIDTH = 256
+
+'''
+This class collects the images of concurrent requests into batches and translates every batch with a single call.
+A batch is translated as soon as it holds max_batch_size images, or max_delay seconds after its first image arrived.
+
+    Class Members:
+        translate_fn    (function) : Maps a batch of images to the batch of translated images
+        max_batch_size  (int)      : Maximum number of images translated per call
+        max_delay       (float)    : Maximum time in seconds an image waits for other images to be batched with
+        queue           (Queue)    : The images waiting to be translated, with the Future their result is set on
+'''
+class RequestBatcher:
+
+    def __init__(self, translate_fn, max_batch_size=8, max_delay=0.01):
+        self.translate_fn = translate_fn
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    '''
+    Translates a single image, blocking until the batch it is part of was translated
+
+        Parameters:
+            image       (Tensor) : The image to translate
+
+        Returns:
+            output      (Tensor) : The translated image
+    '''
+    def predict(self, image):
+        future = Future()
+        self.queue.put((image, future))
+        return future.result()
+
+    '''
+    Translates the queued images batch by batch, runs on its own thread
+    '''
+    def _run(self):
+        while True:
+            requests = [self.queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(requests) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    requests.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            try:
+                outputs = self.translate_fn(tf.stack([image for image, _ in requests]))
+                for i, (_, future) in enumerate(requests):
+                    future.set_result(outputs[i])
+            except Exception as e:
+                for _, future in requests:
+                    future.set_exception(e)
+
+
+'''
+Decodes an encoded OCT image and prepares it for the generator the same way load_dataset does for test data
+
+    Parameters:
+        encoded_image   (bytes)  : The encoded OCT image
+
+    Returns:
+        OCT_image       (Tensor) : The 256 x 256 x 3 OCT image, normalized to [-1, 1]
+        dimensions      (Tensor) : The height and width of the OCT image
+'''
+def preprocess(encoded_image):
+    OCT_image = tf.io.decode_image(encoded_image, channels=3, expand_animations=False)
+    dimensions = tf.shape(OCT_image)[:2]
+
+    OCT_image = tf.image.resize(tf.cast(OCT_image, tf.float32), [IMG_HEIGHT, IMG_WIDTH],
+                                method=tf.image.ResizeMethod.BICUBIC)
+    OCT_image = tf.cast(tf.saturate_cast(OCT_image, tf.uint8), tf.float32)
+
+    return (OCT_image / 127.5) - 1, dimensions
+
+
+'''
+Resizes a translated image to the given dimensions and encodes it as PNG
+
+    Parameters:
+        hist_image      (Tensor) : The 256 x 256 x 3 virtual histology image, normalized to [-1, 1]
+        dimensions      (Tensor) : The height and width the image is resized to
+
+    Returns:
+        encoded_image   (bytes)  : The PNG encoded image
+'''
+def postprocess(hist_image, dimensions):
+    hist_image = tf.image.resize((hist_image + 1) * 127.5, dimensions, method=tf.image.ResizeMethod.LANCZOS3)
+    return tf.io.encode_png(tf.saturate_cast(hist_image, tf.uint8)).numpy()
+
+
+'''
+This class handles the HTTP requests of the inference server. The server is expected to have a batcher attribute
+holding its RequestBatcher.
+'''
+class InferenceRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path != '/health':
+            self.send_error(404)
+            return
+        self._send(200, 'text/plain', b'OK')
+
+    def do_POST(self):
+        if self.path != '/translate':
+            self.send_error(404)
+            return
+
+        encoded_image = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            OCT_image, dimensions = preprocess(encoded_image)
+        except (tf.errors.InvalidArgumentError, ValueError):
+            self.send_error(400, 'The request body must be an encoded image')
+            return
+
+        try:
+            hist_image = self.server.batcher.predict(OCT_image)
+            encoded_hist_image = postprocess(hist_image, dimensions)
+        except Exception as e:
+            # The batcher passes the errors of the generator on to every request of the batch
+            self.log_error('Translating the image failed: %r', e)
+            self.send_error(500, 'Translating the image failed')
+            return
+        self._send(200, 'image/png', encoded_hist_image)
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+'''
+Creates the inference server. The server is started with serve_forever.
+
+    Parameters:
+        export_dir      (str)   : The directory of the SavedModel written by export_generator.py
+        host            (str)   : The host name or address the server listens on
+        port            (int)   : The port the server listens on
+        max_batch_size  (int)   : Maximum number of images translated per generator call
+        max_delay       (float) : Maximum time in seconds a request waits for other requests to be batched with
+
+    Returns:
+        server          (ThreadingHTTPServer) : The inference server
+'''
+def create_server(export_dir, host='localhost', port=8080, max_batch_size=8, max_delay=0.01):
+    exported_generator = tf.saved_model.load(export_dir)
+    translate_fn = lambda OCT_images: exported_generator.translate(OCT_images)['hist_images']
+
+    server = ThreadingHTTPServer((host, port), InferenceRequestHandler)
+    server.batcher = RequestBatcher(translate_fn, max_batch_size, max_delay)
+    return server
+
+
+if __name__ == '__main__':
+
+    # Setup command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--export_dir', type=str, default='./exported_generator',
+                        help='Directory of the SavedModel written by export_generator.py')
+    parser.add_argument('--host', type=str, default='localhost', help='Host name or address the server listens on')
+    parser.add_argument('--port', type=int, default=8080, help='Port the server listens on')
+    parser.add_argument('--max_batch_size', type=int, default=8, help='Maximum number of images per generator call')
+    parser.add_argument('--max_delay', type=float, default=0.01,
+                        help='Maximum time in seconds a request waits for other requests to be batched with')
+    args = parser.parse_args()
+
+    server = create_server(args.export_dir, args.host, args.port, args.max_batch_size, args.max_delay)
+    print('Serving {} on http://{}:{}/translate'.format(args.export_dir, args.host, args.port))
+    server.serve_forever()
@@ -0,0 +1,66 @@
+import tensorflow as tf
+import threading
+import urllib.error
+import urllib.request
+import inference_server
+
+
+class InferenceServerTest(tf.test.TestCase):
+
+    # Verify that the images of concurrent requests are translated in a single batch and returned to their requests
+    def test_request_batcher(self):
+        batch_sizes = []
+
+        def translate_fn(images):
+            batch_sizes.append(int(images.shape[0]))
+            return images * 2
+
+        batcher = inference_server.RequestBatcher(translate_fn, max_batch_size=4, max_delay=1.0)
+        outputs = [None] * 4
+
+        def request(i):
+            outputs[i] = batcher.predict(tf.fill([2, 2, 3], float(i)))
+
+        threads = [threading.Thread(target=request, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(batch_sizes, [4])
+        for i, output in enumerate(outputs):
+            self.assertAllEqual(output, tf.fill([2, 2, 3], 2.0 * i))
+
+    # Verify that an uploaded image is resized for the generator and that its translation is returned in its dimensions
+    def test_pre_and_postprocess(self):
+        encoded_image = tf.io.read_file("test_vectors/sample_OCT.jpg")
+        OCT_image, dimensions = inference_server.preprocess(encoded_image)
+        self.assertAllEqual(tf.shape(OCT_image), [256, 256, 3])
+
+        hist_image = tf.io.decode_png(inference_server.postprocess(OCT_image, dimensions))
+        self.assertAllEqual(tf.shape(hist_image)[:2], dimensions)
+
+    # Verify that a failing translation is answered with an HTTP 500 error instead of a dropped connection
+    def test_translation_error(self):
+        def translate_fn(images):
+            raise tf.errors.ResourceExhaustedError(None, None, 'out of memory')
+
+        server = inference_server.ThreadingHTTPServer(('localhost', 0), inference_server.InferenceRequestHandler)
+        server.batcher = inference_server.RequestBatcher(translate_fn, max_batch_size=1, max_delay=0.0)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            url = 'http://localhost:{}/translate'.format(server.server_address[1])
+            with open("test_vectors/sample_OCT.jpg", 'rb') as f:
+                request = urllib.request.Request(url, data=f.read(), method='POST')
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                urllib.request.urlopen(request)
+            self.assertEqual(context.exception.code, 500)
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+
+if __name__ == '__main__':
+    tf.test.main()
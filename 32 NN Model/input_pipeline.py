@@ -1,7 +1,90 @@
 import tensorflow as tf
 import os
-import tensorflow_addons as tfa
 import math
+import json
+from dataset_manifest import DatasetManifest
+from concurrent.futures import ThreadPoolExecutor
+
+# Dimensions of the images passed to the model, and of the images before they are randomly cropped during training
+IMG_WIDTH = 256
+IMG_HEIGHT = 256
+IMG_JIT_WIDTH = 286
+IMG_JIT_HEIGHT = 286
+
+# Name of the index file written by compile_dataset
+COMPILED_INDEX_FILE_NAME = 'dataset_index.json'
+
+# Maximum number of folders that are listed at the same time
+MAX_LISTING_THREADS = 16
+
+# Maximum number of folders that are read from at the same time
+MAX_INTERLEAVED_FOLDERS = 16
+
+# Maximum number of image pairs held in the shuffle buffer when its size is derived from the size of the dataset
+MAX_SHUFFLE_BUFFER_SIZE = 10000
+
+# Cache modes of PipelineOptions
+CACHE_MODES = ['none', 'files', 'decoded']
+
+'''
+This class contains the tuning options of the tf.data input pipeline built by load_dataset. The defaults overlap the
+input pipeline with training and need no tuning, but every option can be changed per machine without editing this
+module (see the command line arguments of train.py).
+
+	Class Members:
+		prefetch			(int)     : Number of batches prepared ahead of the training step. 0 disables prefetching,
+										tf.data.experimental.AUTOTUNE lets tf.data tune it at runtime.
+		cache				(string)  : What to cache after the first epoch: 'none', 'files' (the encoded images, which
+										saves re-reading the files) or 'decoded' (the decoded and resized images, which
+										saves re-reading and decoding the files but takes ~50 times more space).
+										Random augmentation is always applied after the cache.
+		cache_path			(string)  : File prefix of an on-disk cache. If empty, the cache is kept in memory. Every
+										dataset (e.g. train and test) needs its own prefix.
+		shuffle_buffer_size	(int)     : Number of image pairs the training data is shuffled with. If None, the whole
+										dataset is shuffled, up to MAX_SHUFFLE_BUFFER_SIZE image pairs.
+		seed				(int)     : Seed of the random shuffling
+		deterministic		(boolean) : If False, the parallel stages of the pipeline may produce elements out of order,
+										so that a slow image does not stall the pipeline. If None, the pipeline is
+										deterministic for test data only. Shuffling is only reproducible from the seed
+										if the pipeline is deterministic.
+		num_parallel_calls	(int)     : Number of elements decoded and augmented in parallel.
+										tf.data.experimental.AUTOTUNE lets tf.data tune it at runtime.
+'''
+class PipelineOptions:
+
+    def __init__(self, prefetch=tf.data.experimental.AUTOTUNE, cache='none', cache_path='', shuffle_buffer_size=None,
+                 seed=8, deterministic=None, num_parallel_calls=tf.data.experimental.AUTOTUNE):
+        if cache not in CACHE_MODES:
+            raise Exception('cache must be one of {}, got {}'.format(', '.join(CACHE_MODES), cache))
+
+        self.prefetch = prefetch
+        self.cache = cache
+        self.cache_path = cache_path
+        self.shuffle_buffer_size = shuffle_buffer_size
+        self.seed = seed
+        self.deterministic = deterministic
+        self.num_parallel_calls = num_parallel_calls
+
+    '''
+    Returns whether the parallel stages of the pipeline have to preserve the order of the elements
+
+        Parameters:
+            is_train            (boolean) : Indicates whether the pipeline produces train data or test data
+    '''
+    def is_deterministic(self, is_train):
+        return not is_train if self.deterministic is None else self.deterministic
+
+    '''
+    Returns the size of the shuffle buffer for a dataset of num_images image pairs
+
+        Parameters:
+            num_images          (int)     : The number of image pairs in the dataset
+    '''
+    def get_shuffle_buffer_size(self, num_images):
+        if self.shuffle_buffer_size is not None:
+            return self.shuffle_buffer_size
+        return max(min(num_images, MAX_SHUFFLE_BUFFER_SIZE), 1)
+
 
 '''
 Constructs a TensorFlow dataset object
@@ -38,12 +121,22 @@ Constructs a TensorFlow dataset object
 
 											5. The images must be in jpg format.
 
+											6. A folder written by compile_dataset can be passed as the only entry of
+											   OCT_data_folders, in which case the pre-decoded images are streamed
+											   from its shards and hist_data_folders is ignored.
+
 		is_train     	 (boolean)		   - Indicates whether the OCT_data_folders and hist_data_folders are pointing 
 											 to train data or test data. 
 											 ** NOTE: When generating the train dataset, we introduce randomization 
 											  		  in the form of reshuffling and additional pre-processing to make
 											  		  the algorithm more robust. For more information, see docstring 
-											  		  for the _preprocess_image function below. **
+											  		  for the _augment_batch function below. **
+		batch_size		 (int)			   - (OPTIONAL) Number of OCT-Histology image pairs in a batch
+		manifest_path	 (string)		   - (OPTIONAL) Path of a JSON file caching the listing of the data folders
+											 (see dataset_manifest.py). It is created on first use and only folders
+											 that changed since are listed again.
+		options			 (PipelineOptions) - (OPTIONAL) Prefetching, caching, shuffling and parallelism options of the
+											 pipeline. If None, the default options are used.
 
 	Returns:
 		dataset 		 (tf.data.Dataset) - A TensorFlow dataset object containing images from data_folder
@@ -51,15 +144,23 @@ Constructs a TensorFlow dataset object
 '''
 
 
-def load_dataset(OCT_data_folders, hist_data_folders=[''], is_train=True):
-    BUFFER_SIZE = 553
-    BATCH_SIZE = 1
+def load_dataset(OCT_data_folders, hist_data_folders=[''], is_train=True, batch_size=1, manifest_path=None,
+                 options=None):
+    if options is None:
+        options = PipelineOptions()
 
     # If OCT_data_folders and OCT_data_folders are strings, convert them each to lists of length 1
     if isinstance(OCT_data_folders, str):
         OCT_data_folders = [OCT_data_folders]
     if isinstance(hist_data_folders, str):
         hist_data_folders = [hist_data_folders]
+    elif hist_data_folders is None:
+        hist_data_folders = ['']
+
+    # A folder produced by compile_dataset holds pre-decoded image pairs, stream them instead of decoding JPEGs. The
+    # histology images were compiled along with the OCT images, so hist_data_folders is not needed
+    if len(OCT_data_folders) == 1 and os.path.isfile(os.path.join(OCT_data_folders[0], COMPILED_INDEX_FILE_NAME)):
+        return _load_compiled_dataset(OCT_data_folders[0], is_train, batch_size, options)
 
     # Verify that is_train is set to True only if there are no empty folder names in hist_data_folders
     if ('' in hist_data_folders or len(OCT_data_folders) > len(hist_data_folders)) and is_train:
@@ -73,109 +174,465 @@ def load_dataset(OCT_data_folders, hist_data_folders=[''], is_train=True):
 
     # Pad the hist_data_folders lists with empty strings for the OCT data folders that don't have corresponding
     # histology data folders
-    elif len(OCT_data_folders) < len(hist_data_folders):
-        while len(OCT_data_folders) != len(hist_data_folders):
-            hist_data_folders.append('')
+    elif len(OCT_data_folders) > len(hist_data_folders):
+        hist_data_folders = hist_data_folders + [''] * (len(OCT_data_folders) - len(hist_data_folders))
+
+    # Build the list of (OCT, histology) file path pairs of all folders
+    manifest = DatasetManifest(manifest_path) if manifest_path is not None else None
+    OCT_paths, hist_paths, folder_sizes = _list_image_pairs(OCT_data_folders, hist_data_folders, manifest)
+    num_images = len(OCT_paths)
+
+    # Read the encoded images of all folders in parallel
+    dataset = _read_image_pairs(OCT_paths, hist_paths, folder_sizes, is_train, options)
+
+    # Decode and resize each element of the OCT and histology/OCT datasets, then batch and augment them
+    return _build_batches(dataset, num_images,
+                          lambda path, OCT, hist: _resize_image_pair(path, *_decode_image_pair(OCT, hist),
+                                                                     is_train=is_train),
+                          is_train, batch_size, options)
+
+
+'''
+Constructs a TensorFlow dataset object of the image pairs in their original dimensions, e.g. for tiled inference (see
+tiled_inference.py). The images are normalized to have values between -1 and 1 but are neither resized nor batched.
+
+	Parameters:
+		OCT_data_folders  (string or list) - A file path or a list of file paths pointing to the folder(s) of OCT images
+		hist_data_folders (string or list) - (OPTIONAL) A file path or a list of file paths pointing to the folder(s) of
+											 histology images. See load_dataset for the formatting details.
+		manifest_path	 (string)		   - (OPTIONAL) Path of a JSON file caching the listing of the data folders
+
+	Returns:
+		dataset 		 (tf.data.Dataset) - A TensorFlow dataset object containing (OCT file path, OCT image,
+											 histology image) elements
+		num_images       (int)             - The number of image pairs in the dataset
+'''
+
+
+def load_full_resolution_dataset(OCT_data_folders, hist_data_folders=[''], manifest_path=None):
+    if isinstance(OCT_data_folders, str):
+        OCT_data_folders = [OCT_data_folders]
+    if isinstance(hist_data_folders, str):
+        hist_data_folders = [hist_data_folders]
+    elif hist_data_folders is None:
+        hist_data_folders = ['']
+    hist_data_folders = hist_data_folders + [''] * (len(OCT_data_folders) - len(hist_data_folders))
+
+    manifest = DatasetManifest(manifest_path) if manifest_path is not None else None
+    OCT_paths, hist_paths, folder_sizes = _list_image_pairs(OCT_data_folders, hist_data_folders, manifest)
+
+    dataset = _read_image_pairs(OCT_paths, hist_paths, folder_sizes, is_train=False)
+    dataset = dataset.map(lambda path, OCT, hist: (path,) + normalize(*_decode_image_pair(OCT, hist)),
+                          num_parallel_calls=tf.data.experimental.AUTOTUNE)
+
+    return dataset.prefetch(1), len(OCT_paths)
+
+
+'''
+Turns a dataset of encoded image pairs into a dataset of batches ready for training or testing: the pairs are cached,
+shuffled, decoded, batched, augmented and prefetched as set by the pipeline options.
+
+	Parameters:
+		dataset 		 (tf.data.Dataset) - A TensorFlow dataset object containing encoded image pairs
+		num_images       (int)             - The number of image pairs in the dataset
+		decode_fn        (function)        - Maps an element of dataset to a (OCT file path, decoded OCT image, decoded
+											 histology image) tuple resized by _resize_image_pair
+		is_train     	 (boolean)		   - Indicates whether the dataset is used for training (see load_dataset)
+		batch_size		 (int)			   - Number of OCT-Histology image pairs in a batch
+		options			 (PipelineOptions) - Options of the pipeline
+
+	Returns:
+		dataset 		 (tf.data.Dataset) - A TensorFlow dataset object containing the batches
+		num_batches      (int)             - The number of batches created from the dataset
+'''
+
+
+def _build_batches(dataset, num_images, decode_fn, is_train, batch_size, options):
+    deterministic = options.is_deterministic(is_train)
+
+    if options.cache == 'files':
+        dataset = dataset.cache(options.cache_path)
+
+    # Randomly shuffle the elements of the dataset
+    # The dataset fills a buffer with shuffle_buffer_size elements, then randomly samples elements from this buffer,
+    # replacing the selected elements with new elements. For perfect shuffling, a buffer size >= the full size
+    # of the dataset is needed. Encoded image pairs are shuffled as they take much less memory than decoded ones.
+    if is_train and options.cache != 'decoded':
+        dataset = dataset.shuffle(options.get_shuffle_buffer_size(num_images), seed=options.seed)
+
+    # Decode and resize each element and return a new dataset containing the resized elements
+    dataset = dataset.map(decode_fn, num_parallel_calls=options.num_parallel_calls, deterministic=deterministic)
+
+    # Decoded images are cached before shuffling so that the order of the elements still changes every epoch
+    if options.cache == 'decoded':
+        dataset = dataset.cache(options.cache_path)
+        if is_train:
+            dataset = dataset.shuffle(options.get_shuffle_buffer_size(num_images), seed=options.seed)
+
+    # Combine consecutive elements of this dataset into batches
+    # The components of the resulting element will have an additional outer dimension which will be batch_size
+    dataset = dataset.batch(batch_size)
+
+    # Augment and normalize whole batches at once
+    dataset = dataset.map(lambda paths, OCT, hist: _augment_batch(paths, OCT, hist, is_train),
+                          num_parallel_calls=options.num_parallel_calls, deterministic=deterministic)
+
+    # Prepare the next batches while the current one is used for training
+    if options.prefetch != 0:
+        dataset = dataset.prefetch(options.prefetch)
+
+    return dataset, math.ceil(num_images / batch_size)
+
+
+'''
+Lists the (OCT, histology) file path pairs of all folders. The folders are listed concurrently and the pairs are
+matched by file name. See load_dataset for the folder naming conventions.
+
+	Parameters:
+		OCT_data_folders  (list) - A list of file paths pointing to the folder(s) of OCT images
+		hist_data_folders (list) - A list of file paths pointing to the folder(s) of histology images, an empty string
+								   means that the corresponding OCT folder has no histology images
+		manifest          (DatasetManifest) - (OPTIONAL) Index of the folder listings. If None, the folders are listed
+								   from the file system
+
+	Returns:
+		OCT_paths        (list) - File paths of the OCT images, grouped by folder
+		hist_paths       (list) - File paths of the corresponding histology images. If a folder has no histology
+								  images, the OCT file paths are duplicated for tensor format consistency
+		folder_sizes     (list) - Number of image pairs of each folder, in the order of OCT_data_folders
+'''
 
-    num_images = 0
 
-    # Construct TensorFlow dataset by iterating through OCT_data_folders and hist_data_folders
-    for i, (OCT_data_folder, hist_data_folder) in enumerate(zip(OCT_data_folders, hist_data_folders)):
-        # Create OCT and histology datasets of all files matching the glob pattern jpg
-        OCT_dataset = tf.data.Dataset.list_files(OCT_data_folder + '*.jpg', shuffle=False)
+def _list_image_pairs(OCT_data_folders, hist_data_folders, manifest=None):
+
+    # Map the pair key (file name without extension) of every jpg image in a folder to its file path
+    def list_jpg_files(folder):
+        if folder == '':
+            return {}
+        if manifest is not None:
+            return {entry['pair_key']: entry['path'] for entry in manifest.list_folder(folder, extensions=('.jpg',))}
+        return {os.path.splitext(os.path.basename(path))[0]: path for path in tf.io.gfile.glob(folder + '*.jpg')}
+
+    with ThreadPoolExecutor(max_workers=MAX_LISTING_THREADS) as executor:
+        OCT_listings = list(executor.map(list_jpg_files, OCT_data_folders))
+        hist_listings = list(executor.map(list_jpg_files, hist_data_folders))
+    if manifest is not None:
+        manifest.save()
+
+    OCT_paths, hist_paths, folder_sizes = [], [], []
+    for OCT_data_folder, hist_data_folder, OCT_files, hist_files in zip(OCT_data_folders, hist_data_folders,
+                                                                         OCT_listings, hist_listings):
         if hist_data_folder != '':
-            hist_dataset = tf.data.Dataset.list_files(hist_data_folder + '*.jpg', shuffle=False)
             # Verify that each jpg file in the OCT_data_folder contains a corresponding jpg image of the same name in
             # the hist_data_folder (and vice versa). Throw an exception otherwise.
-            OCT_jpg_names = [os.path.basename(x) for x in tf.data.Dataset.as_numpy_iterator(OCT_dataset)]
-            hist_jpg_names = [os.path.basename(x) for x in tf.data.Dataset.as_numpy_iterator(hist_dataset)]
-            if OCT_jpg_names.sort() != hist_jpg_names.sort():
+            unmatched_names = set(OCT_files).symmetric_difference(hist_files)
+            if unmatched_names:
                 raise Exception(
                     '1 or more jpg images in {} does not contain a corresponding jpg image of the same name '
-                    'in {} (or vice versa).'.format(OCT_data_folder, hist_data_folder))
-            # Keep track of number of OCT-Histology image pairs in the dataset
-            num_images += len(OCT_jpg_names)
-        # If histology images were provided, pair the corresponding OCT and histology images together
-        if hist_data_folder != '':
-            tmp_dataset = tf.data.Dataset.zip((OCT_dataset, hist_dataset))
+                    'in {} (or vice versa): {}'.format(OCT_data_folder, hist_data_folder,
+                                                       ', '.join(sorted(unmatched_names)[:10])))
         else:
-            # If no histology images are provided, duplicate the OCT images in the dataset for tensor format consistency
-            tmp_dataset = tf.data.Dataset.zip((OCT_dataset, OCT_dataset))
+            # If no histology images are provided, duplicate the OCT images for tensor format consistency
+            hist_files = OCT_files
 
-        # Instantiate dataset on first iteration
-        if i == 0:
-            dataset = tmp_dataset
-        # Append to tmp_dataset to dataset
-        else:
-            dataset.concatenate(tmp_dataset)
+        names = sorted(OCT_files)
+        OCT_paths += [OCT_files[name] for name in names]
+        hist_paths += [hist_files[name] for name in names]
+        folder_sizes.append(len(names))
 
-    # Randomly shuffle the elements of the dataset
-    # The dataset fills a buffer with BUFFER_SIZE elements, then randomly samples elements from this buffer,
-    # replacing the selected elements with new elements. For perfect shuffling, a buffer size >= the full size
-    # of the dataset is needed
-    if is_train:
-        dataset = dataset.shuffle(BUFFER_SIZE, seed=8)
+    return OCT_paths, hist_paths, folder_sizes
 
-    # Apply the _preprocess_image function to each element of the OCT and histology/OCT datasets and return
-    # a new dataset containing the transformed elements, in the same order as they appeared before pre-processing
-    dataset = dataset.map(lambda OCT, hist: _preprocess_image(OCT, hist, is_train),
-                          num_parallel_calls=tf.data.experimental.AUTOTUNE)
 
-    # Combine consecutive elements of this dataset into batches
-    # The components of the resulting element will have an additional outer dimension which will be BATCH_SIZE
-    dataset = dataset.batch(BATCH_SIZE)
+'''
+Constructs a TensorFlow dataset that reads the encoded OCT and histology images. Every folder is read by its own
+reader and the readers are interleaved, so the number of folders does not add serial latency.
 
-    return dataset, math.ceil(num_images / BATCH_SIZE)
+	Parameters:
+		OCT_paths        (list)    - File paths of the OCT images, grouped by folder
+		hist_paths       (list)    - File paths of the corresponding histology images
+		folder_sizes     (list)    - Number of image pairs of each folder
+		is_train     	 (boolean) - If True, the folders and the images within every folder are read in a random order
+		options			 (PipelineOptions) - (OPTIONAL) Options of the pipeline. If None, the default options are used.
 
+	Returns:
+		dataset 		 (tf.data.Dataset) - A TensorFlow dataset object containing (OCT file path, encoded OCT image,
+											 encoded histology image) elements
 '''
-Applies preprocessing steps to the input image. 
 
-If the image is from the train set, it is randomly translated, resized to 286 x 286, randomly cropped to be 256 x 256,
-and then the image may be randomly chosen to be mirrored. If the image is from the test set, it is only resized to 
-256 x 256. Images from the train and test set are both normalized to have values between -1 and 1. 
 
-	Parameters: 
-		OCT_image_file  (string)  : A file path to the OCT image 
-		hist_image_file (string)  : A file path to the histology image 
-		is_train        (boolean) : Indicates whether the OCT_image_file and hist_image_file are part of the train 
-									data or test data
+def _read_image_pairs(OCT_paths, hist_paths, folder_sizes, is_train, options=None):
+    if options is None:
+        options = PipelineOptions()
+    OCT_paths = tf.constant(OCT_paths, dtype=tf.string)
+    hist_paths = tf.constant(hist_paths, dtype=tf.string)
+
+    # Each folder is described by the position of its first image pair in the path lists and its number of pairs
+    folder_starts = [sum(folder_sizes[:i]) for i in range(len(folder_sizes))]
+    folders = [(start, size) for start, size in zip(folder_starts, folder_sizes) if size > 0]
+    dataset = tf.data.Dataset.from_tensor_slices((tf.constant([start for start, _ in folders], dtype=tf.int64),
+                                                  tf.constant([size for _, size in folders], dtype=tf.int64)))
+    if is_train:
+        dataset = dataset.shuffle(max(len(folders), 1), seed=options.seed)
+
+    def read_folder(start, size):
+        folder_dataset = tf.data.Dataset.from_tensor_slices((OCT_paths[start:start + size],
+                                                             hist_paths[start:start + size]))
+        if is_train:
+            folder_dataset = folder_dataset.shuffle(size, seed=options.seed)
+        return folder_dataset.map(lambda OCT, hist: (OCT, tf.io.read_file(OCT), tf.io.read_file(hist)))
+
+    return dataset.interleave(read_folder, cycle_length=max(min(len(folders), MAX_INTERLEAVED_FOLDERS), 1),
+                              num_parallel_calls=options.num_parallel_calls,
+                              deterministic=options.is_deterministic(is_train))
+
 
-	Returns:
-		preprocessed_image (Tensor) : The preprocessed OCT image
 '''
+Decodes the JPEG-encoded OCT and histology images to uint8 tensors, and casts them as a set of floats.
+The OCT is converted from grayscale to RGB.
 
+	Parameters:
+		OCT_jpeg        (Tensor)  : The encoded OCT image
+		hist_jpeg       (Tensor)  : The encoded histology image
+
+	Returns:
+		OCT_image       (Tensor) : The decoded OCT image
+		hist_image      (Tensor) : The decoded histology image
+'''
 
-def _preprocess_image(OCT_image_file, hist_image_file, is_train):
-    IMG_JIT_WIDTH = 286
-    IMG_JIT_HEIGHT = 286
-    IMG_WIDTH = 256
-    IMG_HEIGHT = 256
 
-    # Read in the images, decode the JPEG-encoded images to uint8 tensor, and cast them as a set of floats
-    # Convert the OCT from grayscale to RGB
-    OCT_image = tf.io.read_file(OCT_image_file)
-    OCT_image = tf.image.decode_jpeg(OCT_image, channels=3)
+def _decode_image_pair(OCT_jpeg, hist_jpeg):
+    OCT_image = tf.image.decode_jpeg(OCT_jpeg, channels=3)
     OCT_image = tf.cast(OCT_image, tf.float32)
 
-    hist_image = tf.io.read_file(hist_image_file)
-    hist_image = tf.image.decode_jpeg(hist_image)
+    hist_image = tf.image.decode_jpeg(hist_jpeg)
     hist_image = tf.cast(hist_image, tf.float32)
 
-    if is_train:
-        # Translate images by a random amount to increase robustness. Also apply random jittering (resize by
-        # 286 x 286 x 3, random crop to 256 x 256 x 3 image size, and apply random mirroring)
-        OCT_image, hist_image = random_translate_jitter(OCT_image, hist_image, IMG_HEIGHT, IMG_WIDTH, IMG_JIT_HEIGHT,
-                                                        IMG_JIT_WIDTH)
+    return OCT_image, hist_image
+
+
+'''
+Resizes a decoded OCT and histology image pair so that image pairs can be batched together.
+
+If the image is from the train set, it is resized to 286 x 286 so that it can be randomly translated, cropped to
+256 x 256 and mirrored once batched (see _augment_batch). If the image is from the test set, it is resized to
+256 x 256.
+
+	Parameters:
+		OCT_image_file  (string)  : A file path to the OCT image
+		OCT_image       (Tensor)  : The decoded OCT image
+		hist_image      (Tensor)  : The decoded histology image
+		is_train        (boolean) : Indicates whether the images are part of the train data or test data
+
+	Returns:
+		OCT_image_file  (string) : A file path to the OCT image
+		OCT_image       (Tensor) : The resized OCT image
+		hist_image      (Tensor) : The resized histology image
+'''
 
+
+def _resize_image_pair(OCT_image_file, OCT_image, hist_image, is_train):
+    if is_train:
+        # resize to 286 x 286 x 3 image size for jittering
+        OCT_image, hist_image = resize(OCT_image, hist_image, IMG_JIT_HEIGHT, IMG_JIT_WIDTH)
     else:
         # resize to 256 x 256 x 3 image size
         OCT_image, hist_image = resize(OCT_image, hist_image, IMG_HEIGHT, IMG_WIDTH)
 
+    return (OCT_image_file, OCT_image, hist_image)
+
+
+'''
+Transforms a batch of resized OCT and histology image pairs.
+
+If the images are from the train set, they are randomly translated, cropped to be 256 x 256 and may be randomly
+chosen to be mirrored, all with a single transformation per batch (see random_translate_jitter_batch). Images from the
+train and test set are both normalized to have values between -1 and 1.
+
+	Parameters:
+		OCT_image_files (Tensor)  : The file paths to the OCT images
+		OCT_images      (Tensor)  : The batch of resized OCT images
+		hist_images     (Tensor)  : The batch of resized histology images
+		is_train        (boolean) : Indicates whether the images are part of the train data or test data
+
+	Returns:
+		OCT_image_files (Tensor) : The file paths to the OCT images
+		OCT_images      (Tensor) : The preprocessed OCT images
+		hist_images     (Tensor) : The preprocessed histology images
+'''
+
+
+def _augment_batch(OCT_image_files, OCT_images, hist_images, is_train):
+    if is_train:
+        # Translate images by a random amount to increase robustness. Also apply random jittering (random crop to
+        # 256 x 256 x 3 image size, and apply random mirroring)
+        OCT_images, hist_images = random_translate_jitter_batch(OCT_images, hist_images, IMG_HEIGHT, IMG_WIDTH,
+                                                                IMG_JIT_HEIGHT, IMG_JIT_WIDTH)
+
     # normalize image values to be in range [-1, 1]
-    OCT_image, hist_image = normalize(OCT_image, hist_image)
+    OCT_images, hist_images = normalize(OCT_images, hist_images)
 
-    # Return file path along with images
-    return (OCT_image_file, OCT_image, hist_image)
+    # Return file paths along with images
+    return (OCT_image_files, OCT_images, hist_images)
+
+
+'''
+Decodes every OCT and histology image pair once and writes the decoded uint8 pixels into sharded TFRecord files
+together with an index file (dataset_index.json). The resulting folder can be passed to load_dataset in place of the
+OCT and histology folders, in which case no JPEG decoding happens during training.
+
+	Parameters:
+		OCT_data_folders  (string or list) - A file path or a list of file paths pointing to the folder(s) of OCT images
+		hist_data_folders (string or list) - (OPTIONAL) A file path or a list of file paths pointing to the folder(s) of
+											 histology images. See load_dataset for the formatting details.
+		output_folder	 (string)		   - The folder in which the shards and the index file will be written
+		num_shards		 (int)			   - Number of TFRecord shards to split the image pairs into. Several shards
+											 allow the images to be read in parallel.
+		image_size		 (tuple)		   - (OPTIONAL) (height, width) every image is resized to before it is stored.
+											 If None, images are stored in their original dimensions.
+
+	Returns:
+		num_images 		 (int) 			   - The number of image pairs written to output_folder
+'''
+
+
+def compile_dataset(OCT_data_folders, hist_data_folders=[''], output_folder='compiled_dataset/', num_shards=8,
+                    image_size=None):
+
+    # If OCT_data_folders and OCT_data_folders are strings, convert them each to lists of length 1
+    if isinstance(OCT_data_folders, str):
+        OCT_data_folders = [OCT_data_folders]
+    if isinstance(hist_data_folders, str):
+        hist_data_folders = [hist_data_folders]
+
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+
+    # Pad the hist_data_folders lists with empty strings for the OCT data folders that don't have corresponding
+    # histology data folders
+    hist_data_folders = hist_data_folders + [''] * (len(OCT_data_folders) - len(hist_data_folders))
+
+    # Read and decode every image pair exactly once
+    OCT_paths, hist_paths, folder_sizes = _list_image_pairs(OCT_data_folders, hist_data_folders)
+    dataset = _read_image_pairs(OCT_paths, hist_paths, folder_sizes, is_train=False)
+    dataset = dataset.map(lambda path, OCT, hist: (path,) + _decode_image_pair(OCT, hist),
+                          num_parallel_calls=tf.data.experimental.AUTOTUNE)
+    if image_size is not None:
+        dataset = dataset.map(lambda path, OCT, hist: (path,) + resize(OCT, hist, image_size[0], image_size[1]),
+                              num_parallel_calls=tf.data.experimental.AUTOTUNE)
+
+    # Distribute the image pairs over the shards in a round robin fashion
+    shard_names = ['shard-{:05d}-of-{:05d}.tfrecord'.format(i, num_shards) for i in range(num_shards)]
+    writers = [tf.io.TFRecordWriter(os.path.join(output_folder, name)) for name in shard_names]
+    num_images = 0
+    for path, OCT_image, hist_image in dataset:
+        writers[num_images % num_shards].write(_serialize_image_pair(path, OCT_image, hist_image))
+        num_images += 1
+    for writer in writers:
+        writer.close()
+
+    # The index is written last so that a partially compiled folder is never mistaken for a complete one
+    index = {'shards': shard_names,
+             'num_images': num_images,
+             'image_size': list(image_size) if image_size is not None else None}
+    with open(os.path.join(output_folder, COMPILED_INDEX_FILE_NAME), 'w') as f:
+        json.dump(index, f, indent=2)
+
+    return num_images
+
+
+'''
+Serializes a decoded image pair into a tf.train.Example. Pixels are stored as raw uint8 bytes.
+
+	Parameters:
+		OCT_image_file  (Tensor) : A file path to the OCT image
+		OCT_image       (Tensor) : The decoded OCT image
+		hist_image      (Tensor) : The decoded histology image
+
+	Returns:
+		example         (bytes)  : The serialized tf.train.Example
+'''
+
+
+def _serialize_image_pair(OCT_image_file, OCT_image, hist_image):
+
+    def _bytes_feature(value):
+        return tf.train.Feature(bytes_list=tf.train.BytesList(value=[value]))
+
+    def _int64_feature(value):
+        return tf.train.Feature(int64_list=tf.train.Int64List(value=list(value)))
+
+    OCT_image = tf.saturate_cast(OCT_image, tf.uint8)
+    hist_image = tf.saturate_cast(hist_image, tf.uint8)
+    feature = {
+        'OCT_path': _bytes_feature(OCT_image_file.numpy()),
+        'OCT_image': _bytes_feature(OCT_image.numpy().tobytes()),
+        'OCT_shape': _int64_feature(OCT_image.shape),
+        'hist_image': _bytes_feature(hist_image.numpy().tobytes()),
+        'hist_shape': _int64_feature(hist_image.shape),
+    }
+    return tf.train.Example(features=tf.train.Features(feature=feature)).SerializeToString()
+
+
+'''
+Parses a serialized image pair written by compile_dataset back into float tensors
+
+	Parameters:
+		example         (Tensor) : A serialized tf.train.Example
+
+	Returns:
+		OCT_image_file  (Tensor) : A file path to the OCT image
+		OCT_image       (Tensor) : The decoded OCT image
+		hist_image      (Tensor) : The decoded histology image
+'''
+
+
+def _parse_image_pair(example):
+    features = tf.io.parse_single_example(example, {
+        'OCT_path': tf.io.FixedLenFeature([], tf.string),
+        'OCT_image': tf.io.FixedLenFeature([], tf.string),
+        'OCT_shape': tf.io.FixedLenFeature([3], tf.int64),
+        'hist_image': tf.io.FixedLenFeature([], tf.string),
+        'hist_shape': tf.io.FixedLenFeature([3], tf.int64),
+    })
+    OCT_image = tf.reshape(tf.io.decode_raw(features['OCT_image'], tf.uint8), features['OCT_shape'])
+    hist_image = tf.reshape(tf.io.decode_raw(features['hist_image'], tf.uint8), features['hist_shape'])
+
+    return features['OCT_path'], tf.cast(OCT_image, tf.float32), tf.cast(hist_image, tf.float32)
+
+
+'''
+Constructs a TensorFlow dataset object from a folder written by compile_dataset. The shards are read in parallel and
+the same transformations as in load_dataset are applied, but no JPEG decoding is needed.
+
+	Parameters:
+		compiled_folder  (string)  - The folder containing the shards and the index file
+		is_train     	 (boolean) - Indicates whether the dataset is used for training (see load_dataset)
+		batch_size       (int)     - Number of image pairs in a batch
+		options			 (PipelineOptions) - Options of the pipeline
+
+	Returns:
+		dataset 		 (tf.data.Dataset) - A TensorFlow dataset object containing the compiled image pairs
+		num_batches      (int)             - The number of batches created from the dataset
+'''
+
+
+def _load_compiled_dataset(compiled_folder, is_train, batch_size, options):
+    with open(os.path.join(compiled_folder, COMPILED_INDEX_FILE_NAME)) as f:
+        index = json.load(f)
+    shard_files = [os.path.join(compiled_folder, name) for name in index['shards']]
+
+    # Read all shards in parallel
+    dataset = tf.data.Dataset.from_tensor_slices(shard_files)
+    if is_train:
+        dataset = dataset.shuffle(len(shard_files), seed=options.seed)
+    dataset = dataset.interleave(tf.data.TFRecordDataset, cycle_length=len(shard_files),
+                                 num_parallel_calls=options.num_parallel_calls,
+                                 deterministic=options.is_deterministic(is_train))
+
+    # The serialized records take the place of the encoded images
+    return _build_batches(dataset, index['num_images'],
+                          lambda example: _resize_image_pair(*_parse_image_pair(example), is_train=is_train),
+                          is_train, batch_size, options)
 
 
 '''
@@ -204,28 +661,6 @@ def resize(input_image, real_image, height, width):
     return resized_input_image, resized_real_image
 
 
-'''
-Randomly crops the input image and corresponding real image to the specified dimensions
-
-	Parameters:
-		input_image 		(Tensor) : A tensor holding the image that is to be translated by the GAN model
-		real_image			(Tensor) : A tensor holding the image of the real translation of the input image
-		height				(int)	 : Desired height for cropping the tensors
-		width				(int)	 : Desired width for cropping the tensors
-
-	Returns:
-		cropped_image[0]	(Tensor) : Cropped version of input_image Tensor with dimensions (height x width)
-		cropped_image[1]	(Tensor) : Cropped version of real_image Tensor with dimensions (height x width)
-'''
-
-
-def random_crop(input_image, real_image, height, width):
-    stacked_image = tf.stack([input_image, real_image], axis=0)
-    cropped_image = tf.image.random_crop(stacked_image, size=[2, height, width, 3])
-
-    return cropped_image[0], cropped_image[1]
-
-
 '''
 Normalizes the input image and corresponding real image to have values in range [-1, 1]
 
@@ -268,27 +703,74 @@ to increase robustness in the model.
 @tf.function
 def random_translate_jitter(input_image, real_image, im_height=256, im_width=256, jit_height=286, jit_width=286):
 
-    shape = tf.shape(input_image)
-    height = tf.cast(shape[0], tf.float32)
-    width = tf.cast(shape[1], tf.float32)
+    out_input_images, out_real_images = random_translate_jitter_batch(tf.expand_dims(input_image, 0),
+                                                                      tf.expand_dims(real_image, 0), im_height,
+                                                                      im_width, jit_height, jit_width)
+
+    return out_input_images[0], out_real_images[0]
+
+
+'''
+Batched version of random_translate_jitter. Every image pair of the batch is translated, resized, cropped and mirrored
+with its own random parameters, but the four steps are fused into a single affine transformation that is applied to 
+the whole batch at once with bilinear interpolation. The input and real images of a pair are transformed together as
+one stacked image, so both always undergo exactly the same transformation.
+
+	Parameters:
+		input_images (Tensor) : A batch of images that are to be translated by the GAN model (batch x height x width x channels)
+		real_images	 (Tensor) : A batch of images holding the real translation of the input images
+		im_height	 (int)	  : Desired height for the output Tensors
+		im_width	 (int)	  : Desired width for the output Tensors
+		jit_height	 (int)	  : Resize height for jittering
+		jit_width	 (int)	  : Resize width for jittering
+
+	Returns:
+		final_input_images 	(Tensor) : Translated and jittered version of input_images with dimensions (im_height x im_width)
+		final_real_images	(Tensor) : Translated and jittered version of real_images with dimensions (im_height x im_width)
+'''
+
+
+@tf.function
+def random_translate_jitter_batch(input_images, real_images, im_height=256, im_width=256, jit_height=286,
+                                  jit_width=286):
+
+    shape = tf.shape(input_images)
+    batch_size = shape[0]
+    height = tf.cast(shape[1], tf.float32)
+    width = tf.cast(shape[2], tf.float32)
 
     # translate images by a random amount to increase robustness
     scale = 0.5
-    randx = tf.random.uniform(shape=[], minval=-1, maxval=1) * width * scale
-    randy = tf.random.uniform(shape=[], minval=-1, maxval=1) * height * scale
-
-    input_image = tfa.image.translate(input_image, translations=[randx, randy])#, fill_mode='nearest')
-    real_image = tfa.image.translate(real_image, translations=[randx, randy])#, fill_mode='nearest')
+    randx = tf.random.uniform(shape=[batch_size], minval=-1, maxval=1) * width * scale
+    randy = tf.random.uniform(shape=[batch_size], minval=-1, maxval=1) * height * scale
 
-    # resize
-    input_image, real_image = resize(input_image, real_image, jit_height, jit_width)
+    # resize: ratio between the input image dimensions and the jittering dimensions
+    scale_x = width / jit_width
+    scale_y = height / jit_height
 
-    # random crop
-    out_input_image, out_real_image = random_crop(input_image, real_image, im_height, im_width)
+    # random crop: top left corner of the crop within the resized image
+    crop_x = tf.cast(tf.random.uniform(shape=[batch_size], maxval=jit_width - im_width + 1, dtype=tf.int32), tf.float32)
+    crop_y = tf.cast(tf.random.uniform(shape=[batch_size], maxval=jit_height - im_height + 1, dtype=tf.int32),
+                     tf.float32)
 
     # random mirroring
-    if tf.random.uniform(()) > 0.5:
-        out_input_image = tf.image.flip_left_right(out_input_image)
-        out_real_image = tf.image.flip_left_right(out_real_image)
-
-    return out_input_image, out_real_image
+    flip = tf.random.uniform(shape=[batch_size]) > 0.5
+
+    # Compose the four steps into one transform that maps every output pixel (x, y) to the input pixel it is sampled
+    # from: x_in = a0 * x + a2 and y_in = b1 * y + b2 (pixel centers are at +0.5 as in tf.image.resize)
+    x_start = tf.where(flip, float(im_width - 1), 0.) + crop_x
+    a0 = tf.where(flip, -scale_x, scale_x) * tf.ones([batch_size])
+    a2 = (x_start + 0.5) * scale_x - 0.5 - randx
+    b1 = scale_y * tf.ones([batch_size])
+    b2 = (crop_y + 0.5) * scale_y - 0.5 - randy
+    zeros = tf.zeros([batch_size])
+    transforms = tf.stack([a0, zeros, a2, zeros, b1, b2, zeros, zeros], axis=1)
+
+    # Transform the input and real images together so that they undergo the same transformation
+    stacked_images = tf.concat([input_images, tf.cast(real_images, input_images.dtype)], axis=-1)
+    transformed_images = tf.raw_ops.ImageProjectiveTransformV2(images=stacked_images, transforms=transforms,
+                                                               output_shape=tf.constant([im_height, im_width]),
+                                                               interpolation='BILINEAR', fill_mode='CONSTANT')
+
+    num_input_channels = tf.shape(input_images)[-1]
+    return transformed_images[..., :num_input_channels], transformed_images[..., num_input_channels:]
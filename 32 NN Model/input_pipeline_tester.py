@@ -1,6 +1,8 @@
 import tensorflow as tf
 import input_pipeline as ip
 import tester_helpers
+import os
+import shutil
 
 
 class InputPipelineTest(tf.test.TestCase):
@@ -40,6 +42,110 @@ class InputPipelineTest(tf.test.TestCase):
         self.assertNotAllEqual(self.rtj_OCT_image, self.rtj_OCT_image1,
                             msg="Both input images must undergo the same random transformation")
 
+    # Verify that the batched transformation produces a batch of 256x256x3 images
+    def test_random_translate_jitter_batch_correct_dimensions(self):
+        OCT_images = tf.stack([self.OCT_image] * 4)
+        rtj_OCT_images, rtj_OCT_images2 = ip.random_translate_jitter_batch(OCT_images, OCT_images)
+        self.assertAllEqual(tf.shape(rtj_OCT_images), [4, 256, 256, 3],
+                            msg="A batch of 4 images must have shape 4x256x256x3.")
+        self.assertAllEqual(tf.shape(rtj_OCT_images2), [4, 256, 256, 3],
+                            msg="A batch of 4 images must have shape 4x256x256x3.")
+
+    # Verify that both images of every pair in a batch undergo the same random transformation
+    def test_random_translate_jitter_batch_consistency(self):
+        OCT_images = tf.stack([self.OCT_image] * 4)
+        rtj_OCT_images1, rtj_OCT_images2 = ip.random_translate_jitter_batch(OCT_images, OCT_images)
+        self.assertAllEqual(rtj_OCT_images1, rtj_OCT_images2,
+                            msg="Both input images must undergo the same random transformation")
+
+    # Verify that every image pair of a batch gets its own random transformation
+    def test_random_translate_jitter_batch_independent(self):
+        OCT_images = tf.stack([self.OCT_image] * 4)
+        rtj_OCT_images, _ = ip.random_translate_jitter_batch(OCT_images, OCT_images)
+        self.assertNotAllEqual(rtj_OCT_images[0], rtj_OCT_images[1],
+                               msg="Every image pair of a batch must undergo its own random transformation")
+
+    # Verify that a compiled dataset holds the same decoded pixels as the JPEG files it was compiled from
+    def test_compile_dataset_round_trip(self):
+        OCT_folder, hist_folder = self._make_image_folders('subject', ['sample.jpg'])
+        compiled_folder = os.path.join(self.get_temp_dir(), 'compiled/')
+
+        num_images = ip.compile_dataset(OCT_folder, hist_folder, compiled_folder, num_shards=2)
+        self.assertEqual(num_images, 1)
+
+        dataset, num_batches = ip.load_dataset(compiled_folder, is_train=False)
+        expected_dataset, _ = ip.load_dataset(OCT_folder, hist_folder, is_train=False)
+        self.assertEqual(num_batches, 1)
+        for (_, OCT_image, hist_image), (_, expected_OCT_image, expected_hist_image) in zip(dataset, expected_dataset):
+            self.assertAllEqual(OCT_image, expected_OCT_image)
+            self.assertAllEqual(hist_image, expected_hist_image)
+
+    # Verify that a compiled dataset can be loaded for training without passing its histology folders again
+    def test_compile_dataset_train(self):
+        OCT_folder, hist_folder = self._make_image_folders('subject', ['sample.jpg'])
+        compiled_folder = os.path.join(self.get_temp_dir(), 'compiled/')
+        ip.compile_dataset(OCT_folder, hist_folder, compiled_folder, num_shards=2)
+
+        dataset, num_batches = ip.load_dataset(compiled_folder, is_train=True, batch_size=1)
+        _, OCT_images, hist_images = next(iter(dataset))
+        self.assertEqual(num_batches, 1)
+        self.assertEqual(OCT_images.shape, (1, ip.IMG_HEIGHT, ip.IMG_WIDTH, 3))
+        self.assertEqual(hist_images.shape, (1, ip.IMG_HEIGHT, ip.IMG_WIDTH, 3))
+
+    # Verify that the images of every folder end up in the dataset
+    def test_load_dataset_multiple_folders(self):
+        OCT_folder_A, hist_folder_A = self._make_image_folders('subject_A', ['a1.jpg', 'a2.jpg'])
+        OCT_folder_B, hist_folder_B = self._make_image_folders('subject_B', ['b1.jpg'])
+
+        dataset, num_batches = ip.load_dataset([OCT_folder_A, OCT_folder_B], [hist_folder_A, hist_folder_B],
+                                               is_train=False)
+        file_paths = sorted(os.path.basename(path) for path, _, _ in dataset.unbatch().as_numpy_iterator())
+        self.assertEqual(num_batches, 3)
+        self.assertEqual(file_paths, [b'a1.jpg', b'a2.jpg', b'b1.jpg'])
+
+    # Verify that an OCT image without a histology image of the same name is rejected
+    def test_load_dataset_unmatched_names(self):
+        OCT_folder, hist_folder = self._make_image_folders('subject', ['sample.jpg'])
+        shutil.copy("test_vectors/sample_OCT.jpg", os.path.join(OCT_folder, 'unmatched.jpg'))
+
+        with self.assertRaises(Exception):
+            ip.load_dataset(OCT_folder, hist_folder, is_train=True)
+
+    # Verify that caching the decoded images, in memory or on disk, does not change the test data
+    def test_load_dataset_cached(self):
+        OCT_folder, hist_folder = self._make_image_folders('subject', ['a1.jpg', 'a2.jpg'])
+        expected_dataset, _ = ip.load_dataset(OCT_folder, hist_folder, is_train=False)
+        expected_images = [OCT_image for _, OCT_image, _ in expected_dataset]
+
+        cache_path = os.path.join(self.get_temp_dir(), 'cache')
+        for options in [ip.PipelineOptions(cache='files'), ip.PipelineOptions(cache='decoded', cache_path=cache_path)]:
+            dataset, _ = ip.load_dataset(OCT_folder, hist_folder, is_train=False, options=options)
+            # The second epoch is read from the cache
+            for _ in range(2):
+                OCT_images = [OCT_image for _, OCT_image, _ in dataset]
+                self.assertEqual(len(OCT_images), len(expected_images))
+                for OCT_image, expected_OCT_image in zip(OCT_images, expected_images):
+                    self.assertAllEqual(OCT_image, expected_OCT_image)
+
+    # Verify that the shuffle buffer covers the whole dataset unless its size is set
+    def test_pipeline_options_shuffle_buffer_size(self):
+        self.assertEqual(ip.PipelineOptions().get_shuffle_buffer_size(553), 553)
+        self.assertEqual(ip.PipelineOptions().get_shuffle_buffer_size(10 ** 6), ip.MAX_SHUFFLE_BUFFER_SIZE)
+        self.assertEqual(ip.PipelineOptions(shuffle_buffer_size=16).get_shuffle_buffer_size(553), 16)
+        with self.assertRaises(Exception):
+            ip.PipelineOptions(cache='everything')
+
+    # Create an OCT and a histology folder holding copies of the test vectors under the given file names
+    def _make_image_folders(self, name, file_names):
+        OCT_folder = os.path.join(self.get_temp_dir(), name, 'OCT/')
+        hist_folder = os.path.join(self.get_temp_dir(), name, 'hist/')
+        os.makedirs(OCT_folder)
+        os.makedirs(hist_folder)
+        for file_name in file_names:
+            shutil.copy("test_vectors/sample_OCT.jpg", os.path.join(OCT_folder, file_name))
+            shutil.copy("test_vectors/sample_histology.jpg", os.path.join(hist_folder, file_name))
+        return OCT_folder, hist_folder
+
     # Verify that the dimensions of the OCT and histology image match up for resize function
 
 
@@ -1,5 +1,75 @@
 import tensorflow as tf
-import tensorflow_addons as tfa
+
+'''
+Instance normalization layer (no learned scale or offset, corresponds to affine=False in PyTorch), optionally fused 
+with the ReLU or Leaky ReLU activation that follows it. Every channel of every image is normalized to zero mean and 
+unit variance over its height and width, so the images of a batch are normalized independently of each other.
+
+The statistics are computed with the same ops as tfa.layers.InstanceNormalization(axis=-1, center=False, scale=False), 
+so the outputs match it and, as neither layer has weights, checkpoints of models built with either layer can be 
+restored into the other one.
+
+    Class Members:
+        epsilon             (float)  : Small value added to the variance to avoid dividing by zero
+        activation          (string) : Activation applied after the normalization: None, 'relu' or 'leaky_relu'
+        alpha               (float)  : Slope of the Leaky ReLU activation for negative values
+'''
+class InstanceNormalization(tf.keras.layers.Layer):
+
+    def __init__(self, epsilon=1e-5, activation=None, alpha=0.2, **kwargs):
+        super(InstanceNormalization, self).__init__(**kwargs)
+        if activation not in [None, 'relu', 'leaky_relu']:
+            raise Exception("activation must be None, 'relu' or 'leaky_relu'")
+        self.epsilon = epsilon
+        self.activation = activation
+        self.alpha = alpha
+
+    def call(self, inputs):
+        mean, variance = tf.nn.moments(inputs, axes=[1, 2], keepdims=True)
+        outputs = tf.nn.batch_normalization(inputs, mean, variance, offset=None, scale=None,
+                                            variance_epsilon=self.epsilon)
+
+        if self.activation == 'relu':
+            outputs = tf.nn.relu(outputs)
+        elif self.activation == 'leaky_relu':
+            outputs = tf.nn.leaky_relu(outputs, alpha=self.alpha)
+        return outputs
+
+    def get_config(self):
+        config = super(InstanceNormalization, self).get_config()
+        config.update({'epsilon': self.epsilon, 'activation': self.activation, 'alpha': self.alpha})
+        return config
+
+
+'''
+Pads the height and width of a batch of images with the reflection of the image boundary (similar to 
+nn.ReflectionPad2d in PyTorch)
+
+    Class Members:
+        padding             (int)    : Number of pixels added on every side of the images
+'''
+class ReflectionPad2D(tf.keras.layers.Layer):
+
+    def __init__(self, padding=1, **kwargs):
+        super(ReflectionPad2D, self).__init__(**kwargs)
+        self.padding = padding
+
+    def call(self, inputs):
+        return tf.pad(inputs, paddings=[[0, 0], [self.padding, self.padding], [self.padding, self.padding], [0, 0]],
+                      mode='REFLECT')
+
+    def compute_output_shape(self, input_shape):
+        input_shape = tf.TensorShape(input_shape).as_list()
+        for axis in [1, 2]:
+            if input_shape[axis] is not None:
+                input_shape[axis] += 2 * self.padding
+        return tf.TensorShape(input_shape)
+
+    def get_config(self):
+        config = super(ReflectionPad2D, self).get_config()
+        config.update({'padding': self.padding})
+        return config
+
 
 '''
 Constructs a downsampling block made up of three different layers.
@@ -34,17 +104,20 @@ def downsample(num_filters, filter_size, norm_type, apply_leaky_relu=True):
       tf.keras.layers.Conv2D(num_filters, filter_size, strides=2, kernel_initializer=initializer,
                              use_bias=norm_type == "instance"))
 
-    # Add a batch or instance normalization layer if specified
-    if norm_type == "batch":
-        result.add(tf.keras.layers.BatchNormalization())
-    elif norm_type == "instance":
-        result.add(tfa.layers.InstanceNormalization(axis=-1, epsilon=1e-5, center=False, scale=False))
-
-    # Add a Leaky ReLU activation function with slope -0.2 or add normal ReLU
-    if apply_leaky_relu:
-        result.add(tf.keras.layers.LeakyReLU(alpha=0.2))
+    # Add a batch or instance normalization layer if specified, followed by a Leaky ReLU activation function with
+    # slope -0.2 or a normal ReLU. The activation is fused into the instance normalization layer (it is the last layer
+    # of the block, so the position of the convolution layer in checkpoints does not change).
+    if norm_type == "instance":
+        result.add(InstanceNormalization(epsilon=1e-5, activation="leaky_relu" if apply_leaky_relu else "relu",
+                                         alpha=0.2))
     else:
-        result.add(tf.keras.layers.ReLU())
+        if norm_type == "batch":
+            result.add(tf.keras.layers.BatchNormalization())
+
+        if apply_leaky_relu:
+            result.add(tf.keras.layers.LeakyReLU(alpha=0.2))
+        else:
+            result.add(tf.keras.layers.ReLU())
 
     return result
 
@@ -85,13 +158,15 @@ def upsample(num_filters, filter_size, norm_type, out_pad):
                                         kernel_initializer=initializer, use_bias=norm_type == "instance",
                                         output_padding=out_pad))
 
-    # Add a batch or instance normalization layer if specified
-    if norm_type == "batch":
-        result.add(tf.keras.layers.BatchNormalization())
-    elif norm_type == "instance":
-        result.add(tfa.layers.InstanceNormalization(axis=-1, epsilon=1e-5, center=False, scale=False))
+    # Add a batch or instance normalization layer if specified, followed by a normal ReLU layer. The ReLU is fused into
+    # the instance normalization layer.
+    if norm_type == "instance":
+        result.add(InstanceNormalization(epsilon=1e-5, activation="relu"))
+    else:
+        if norm_type == "batch":
+            result.add(tf.keras.layers.BatchNormalization())
 
-    # Add normal ReLU layer
-    result.add(tf.keras.layers.ReLU())
+        # Add normal ReLU layer
+        result.add(tf.keras.layers.ReLU())
 
     return result
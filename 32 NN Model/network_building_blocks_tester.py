@@ -0,0 +1,55 @@
+import tensorflow as tf
+import network_building_blocks as nbb
+
+
+class NetworkBuildingBlocksTest(tf.test.TestCase):
+
+    def setUp(self):
+        super(NetworkBuildingBlocksTest, self).setUp()
+
+        self.images = tf.random.uniform([2, 16, 16, 4], -3, 3, seed=1)
+
+    # Verify that every channel of every image is normalized to zero mean and unit variance
+    def test_instance_normalization(self):
+        outputs = nbb.InstanceNormalization(epsilon=1e-5)(self.images)
+        mean, variance = tf.nn.moments(outputs, axes=[1, 2])
+        self.assertAllClose(mean, tf.zeros_like(mean), atol=1e-5)
+        self.assertAllClose(variance, tf.ones_like(variance), atol=1e-3)
+
+    # Verify that the fused activations give the same results as separate activation layers
+    def test_instance_normalization_fused_activation(self):
+        outputs = nbb.InstanceNormalization(epsilon=1e-5)(self.images)
+        self.assertAllEqual(nbb.InstanceNormalization(epsilon=1e-5, activation='relu')(self.images),
+                            tf.keras.layers.ReLU()(outputs))
+        self.assertAllEqual(nbb.InstanceNormalization(epsilon=1e-5, activation='leaky_relu', alpha=0.2)(self.images),
+                            tf.keras.layers.LeakyReLU(alpha=0.2)(outputs))
+
+    # Verify that the outputs match the tensorflow_addons layer the native layer replaces, if it is installed
+    def test_instance_normalization_matches_tfa(self):
+        try:
+            import tensorflow_addons as tfa
+        except ImportError:
+            self.skipTest('tensorflow_addons is not installed')
+        expected_outputs = tfa.layers.InstanceNormalization(axis=-1, epsilon=1e-5, center=False,
+                                                            scale=False)(self.images)
+        self.assertAllClose(nbb.InstanceNormalization(epsilon=1e-5)(self.images), expected_outputs, atol=1e-6)
+
+    # Verify that the reflection padding matches tf.pad and that the output shape is inferred
+    def test_reflection_pad_2d(self):
+        layer = nbb.ReflectionPad2D(padding=3)
+        outputs = layer(self.images)
+        self.assertAllEqual(outputs, tf.pad(self.images, [[0, 0], [3, 3], [3, 3], [0, 0]], mode='REFLECT'))
+        self.assertEqual(layer.compute_output_shape([None, 16, 16, 4]).as_list(), [None, 22, 22, 4])
+
+    # Verify that the downsample and upsample blocks keep the convolution as their only layer with weights, at the
+    # same position, so checkpoints written before the activation was fused still restore
+    def test_blocks_checkpoint_layout(self):
+        for block in [nbb.downsample(8, 3, norm_type="instance"), nbb.upsample(8, 3, norm_type="instance", out_pad=1)]:
+            block(self.images)
+            self.assertEqual(len(block.layers), 2)
+            self.assertEqual(len(block.layers[0].weights), 2)
+            self.assertEqual(len(block.layers[1].weights), 0)
+
+
+if __name__ == '__main__':
+    tf.test.main()
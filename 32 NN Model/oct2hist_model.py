@@ -2,7 +2,9 @@ import tensorflow as tf
 import discriminator
 import generator
 import datetime
+import math
 from learning_rate_scheduler import DelayedLinearDecayLR
+from training_metrics import TrainingMetrics
 
 '''
 This class contains all the components of the OCT2Hist model and with the train_step method. 
@@ -25,8 +27,43 @@ This class contains all the components of the OCT2Hist model and with the train_
         
         summary_writer           (TensorFlow.summary.SummaryWriter) : The SummaryWriter object which tracks metrics (loss, 
                                                                       accuracy, etc.) that can be viewed on TensorBoard
+                                                                      
+        training_metrics         (TrainingMetrics)              : Accumulates the losses of the train steps until they are
+                                                                  written to TensorBoard by write_summaries
+                                                                      
+        precision_policy         (String)                       : The Keras mixed precision policy the model is built with
+        
+        jit_compile              (Boolean)                      : Whether train_step and generate are compiled with XLA
+        
+        fuse_discriminator       (Boolean)                      : Whether train_step runs the discriminator once on the
+                                                                  real and fake image pairs together, see discriminate
+        
+        compute_gradients        (tf.function)                  : The forward and backward pass of train_step without
+                                                                  applying the gradients, see _replica_compute_gradients
+        
+        strategy                 (tf.distribute.Strategy)       : The strategy training is distributed with
+        
+        epoch                    (tf.Variable)                  : Number of completed training epochs, stored in the 
+                                                                  checkpoint together with the optimizer step counters 
+                                                                  so that training can be resumed
+        
+        checkpoint               (tf.train.Checkpoint)          : Checkpoint of the models, optimizers and epoch counter
+        
+        learning_rate            (DelayedLinearDecayLR)         : The learning rate schedule of both optimizers when 
+                                                                  training, None otherwise
+        
+        accumulation_steps       (int)                          : Number of batches whose gradients are accumulated 
+                                                                  into one optimizer step
+        
+        num_steps_per_epoch      (int)                          : Number of optimizer steps in an epoch
+        
+        num_accumulated_batches  (int)                          : Number of batches whose gradients are accumulated 
+                                                                  but not applied yet
 '''
 
+# Keras mixed precision policies the model can be built with
+PRECISION_POLICIES = ['float32', 'mixed_float16', 'mixed_bfloat16']
+
 
 class OCT2HistModel:
 
@@ -38,38 +75,341 @@ class OCT2HistModel:
         num_epochs_decay_lr (int)       : The number of epochs at which the learning rate should decay
         num_batches         (int)       : Number of batches in an epoch
         is_train            (Boolean)   : Indicates whether the model is being used for training or testing
+        precision_policy    (String)    : 'float32', or 'mixed_float16' / 'mixed_bfloat16' to compute the layers in 16 
+                                          bits while keeping the weights, the model outputs and the losses in float32. 
+                                          The policy is set as the global Keras policy. 'mixed_float16' also applies 
+                                          loss scaling to the optimizers, 'mixed_bfloat16' does not need it and can be 
+                                          used on CPU.
+        strategy            (tf.distribute.Strategy) : The strategy used to distribute training. The models, 
+                                          optimizers and checkpoint are created in its scope. If None, the default 
+                                          (single device) strategy is used.
+        jit_compile         (Boolean)   : If True, the forward and backward passes of train_step and the generator 
+                                          calls of generate are compiled with XLA, which fuses the padding, 
+                                          normalization and activation layers into fewer kernels. Applying the 
+                                          gradients is not compiled, as the optimizers synchronize across replicas.
+        fuse_discriminator  (Boolean)   : If True, train_step runs the discriminator once on the real and fake image 
+                                          pairs concatenated along the batch axis and computes the losses directly 
+                                          from the logits. If False, it runs the discriminator twice and computes the 
+                                          losses with the loss objects of the models. Both give the same losses.
+        accumulation_steps  (int)       : Number of batches whose gradients are accumulated (in variables allocated 
+                                          once) before they are applied in one optimizer step, which trains with a 
+                                          batch accumulation_steps times larger without its memory. The learning rate 
+                                          schedule counts optimizer steps, of which an epoch has 
+                                          ceil(num_batches / accumulation_steps).
     '''
-    def __init__(self, num_epochs_const_lr=0, num_epochs_decay_lr=0, num_batches=0, is_train=False):
+    def __init__(self, num_epochs_const_lr=0, num_epochs_decay_lr=0, num_batches=0, is_train=False,
+                 precision_policy='float32', strategy=None, jit_compile=False, fuse_discriminator=True,
+                 accumulation_steps=1):
+        if precision_policy not in PRECISION_POLICIES:
+            raise Exception("precision_policy must be one of {}".format(PRECISION_POLICIES))
+        if accumulation_steps < 1:
+            raise Exception("accumulation_steps must be at least 1")
+        self.precision_policy = precision_policy
+        self.strategy = strategy if strategy is not None else tf.distribute.get_strategy()
+        self.jit_compile = jit_compile
+        self.fuse_discriminator = fuse_discriminator
+        self.accumulation_steps = accumulation_steps
+        self.num_steps_per_epoch = math.ceil(num_batches / accumulation_steps)
+        self.num_accumulated_batches = 0
+        self.compute_gradients = tf.function(self._replica_compute_gradients, jit_compile=jit_compile)
+        self.generate = tf.function(self._generate, jit_compile=jit_compile)
+
         log_dir = "logs/"
         self.summary_writer = tf.summary.create_file_writer(
             log_dir + "fit/" + datetime.datetime.now().strftime("%Y%m%d-%H%M%S"))
+        self.training_metrics = TrainingMetrics(self.summary_writer, ['gen_total_loss', 'gen_gan_loss',
+                                                                      'gen_l1_loss', 'disc_loss'])
+
+        # Layers pick up the global policy when they are constructed
+        tf.keras.mixed_precision.set_global_policy(precision_policy)
+
+        # Variables created in the strategy scope are mirrored on every replica
+        with self.strategy.scope():
+            self.discriminator, self.discriminator_loss = discriminator.build_model()
+            self.generator, self.generator_loss = generator.build_model()
+
+            if is_train:
+                self.learning_rate = DelayedLinearDecayLR(2e-4, num_epochs_const_lr, num_epochs_decay_lr,
+                                                          self.num_steps_per_epoch)
+                self.generator_optimizer = tf.keras.optimizers.Adam(self.learning_rate, beta_1=0.5, epsilon=1e-8)
+                self.discriminator_optimizer = tf.keras.optimizers.Adam(self.learning_rate, beta_1=0.5, epsilon=1e-8)
+            else:
+                self.learning_rate = None
+                self.generator_optimizer = tf.keras.optimizers.Adam(2e-4, beta_1=0.5)
+                self.discriminator_optimizer = tf.keras.optimizers.Adam(2e-4, beta_1=0.5)
+
+            # float16 gradients can underflow, scale the losses up before computing the gradients (and the gradients
+            # back down before applying them)
+            if precision_policy == 'mixed_float16':
+                self.generator_optimizer = tf.keras.mixed_precision.LossScaleOptimizer(self.generator_optimizer)
+                self.discriminator_optimizer = tf.keras.mixed_precision.LossScaleOptimizer(
+                    self.discriminator_optimizer)
 
-        self.discriminator, self.discriminator_loss = discriminator.build_model()
-        self.generator, self.generator_loss = generator.build_model()
+            # Every replica accumulates the gradients of its part of the batches, the optimizers sum them across
+            # replicas when they are applied. The accumulated gradients are not part of the checkpoint.
+            self.generator_accumulators, self.discriminator_accumulators = [], []
+            if is_train and accumulation_steps > 1:
+                self.generator_accumulators = self._create_accumulators(self.generator)
+                self.discriminator_accumulators = self._create_accumulators(self.discriminator)
 
-        if is_train:
-            self.generator_optimizer = tf.keras.optimizers.Adam(DelayedLinearDecayLR(2e-4, num_epochs_const_lr,
-                                                                                     num_epochs_decay_lr, num_batches,
-                                                                                     self.summary_writer),
-                                                                                     beta_1=0.5, epsilon=1e-8)
-            self.discriminator_optimizer = tf.keras.optimizers.Adam(DelayedLinearDecayLR(2e-4, num_epochs_const_lr,
-                                                                                         num_epochs_decay_lr, num_batches,
-                                                                                         self.summary_writer),
-                                                                                         beta_1=0.5, epsilon=1e-8)
-        else:
-            self.generator_optimizer = tf.keras.optimizers.Adam(2e-4, beta_1=0.5)
-            self.discriminator_optimizer = tf.keras.optimizers.Adam(2e-4, beta_1=0.5)
+            self.epoch = tf.Variable(0, trainable=False, dtype=tf.int64, name='epoch')
+            self.checkpoint = tf.train.Checkpoint(generator_optimizer=self.generator_optimizer,
+                                                  discriminator_optimizer=self.discriminator_optimizer,
+                                                  generator=self.generator,
+                                                  discriminator=self.discriminator,
+                                                  epoch=self.epoch)
 
     '''
-    Run the OCT and histology image pair through the GAN model and record the losses to be logged on TensorBoard. 
+    Run a batch of OCT and histology image pairs through the GAN model and accumulate the losses in training_metrics.
+    No summaries are written by the train step, see write_summaries.
+    Instance normalization is computed per image, so every image in the batch is normalized the same way as with a 
+    batch size of 1.
+    
+    If the model was created with accumulation_steps > 1, the gradients of the batch are accumulated and applied 
+    together with those of the previous batches every accumulation_steps calls (see apply_accumulated_gradients).
+    
+    When a distribution strategy is used, input_image and target are the per-replica values of a distributed dataset
+    (see tf.distribute.Strategy.experimental_distribute_dataset). Every replica processes its part of the batch and 
+    the gradients and losses are summed across replicas. Losses are averaged over the global batch, so they are the 
+    same as for a single device.
     
     Parameters:
-        input_image (Tensor) : The OCT image to be passed through the model 
-        target      (Tensor) : The corresponding histology image to be passed through the model 
-        epoch       (int)    : Epoch index
+        input_image (Tensor) : The batch of OCT images to be passed through the model 
+        target      (Tensor) : The corresponding batch of histology images to be passed through the model 
+        
+    Returns:
+        gen_total_loss  (Tensor) : Total generator loss
+        gen_gan_loss    (Tensor) : Adversarial GAN loss of the generator
+        gen_l1_loss     (Tensor) : L1 loss of the generator
+        disc_loss       (Tensor) : Total discriminator loss
+    '''
+    def train_step(self, input_image, target):
+        if self.accumulation_steps == 1:
+            return self._train_step(input_image, target)
+
+        # Applying the gradients is decided here rather than with a tf.cond, as the optimizers cannot synchronize
+        # the replicas within a conditional branch
+        losses = self._accumulate_step(input_image, target)
+        self.num_accumulated_batches += 1
+        if self.num_accumulated_batches == self.accumulation_steps:
+            self.apply_accumulated_gradients()
+        return losses
+
+    '''
+    Apply the gradients accumulated by train_step since the last optimizer step, if any, averaged over the 
+    accumulated batches. Called by train_step every accumulation_steps batches, and at the end of an epoch so that 
+    the last batches of the epoch are not carried over to the next one.
+    '''
+    def apply_accumulated_gradients(self):
+        if self.num_accumulated_batches == 0:
+            return
+        self._distributed_apply_accumulated_gradients(tf.constant(self.num_accumulated_batches, tf.float32))
+        self.num_accumulated_batches = 0
+
+    '''
+    Training step that applies the gradients of the batch, see train_step
+    '''
+    @tf.function
+    def _train_step(self, input_image, target):
+        return self._distributed_step(self._replica_train_step, input_image, target)
+
+    '''
+    Training step that accumulates the gradients of the batch, see train_step
     '''
     @tf.function
-    def train_step(self, input_image, target, epoch):
+    def _accumulate_step(self, input_image, target):
+        return self._distributed_step(self._replica_accumulate_gradients, input_image, target)
+
+    '''
+    Run a training function on every replica, reduce the losses it returns and accumulate them in training_metrics
+    
+    Parameters:
+        replica_fn  (function) : _replica_train_step or _replica_accumulate_gradients
+        input_image (Tensor)   : The batch of OCT images
+        target      (Tensor)   : The batch of histology images
+        
+    Returns:
+        The losses returned by train_step
+    '''
+    def _distributed_step(self, replica_fn, input_image, target):
+
+        per_replica_losses = self.strategy.run(replica_fn, args=(input_image, target))
+        gen_total_loss, gen_gan_loss, gen_l1_loss, disc_loss = [
+            self.strategy.reduce(tf.distribute.ReduceOp.SUM, loss, axis=None) for loss in per_replica_losses]
+
+        # Accumulate the loss metrics for future plotting in TensorBoard
+        self.training_metrics.update_state({'gen_total_loss': gen_total_loss, 'gen_gan_loss': gen_gan_loss,
+                                            'gen_l1_loss': gen_l1_loss, 'disc_loss': disc_loss})
+
+        return gen_total_loss, gen_gan_loss, gen_l1_loss, disc_loss
+
+    '''
+    Write the mean of the losses accumulated since the last call, and the current learning rate, to TensorBoard. 
+    The values are written against the global step (the number of optimizer updates so far).
+    '''
+    def write_summaries(self):
+        step = self.generator_optimizer.iterations
+        extra_scalars = {'lr': self.learning_rate(step)} if self.learning_rate is not None else None
+        self.training_metrics.write_summaries(step, extra_scalars)
+
+    '''
+    Translate a batch of OCT images with the generator, compiled with XLA if the model was created with jit_compile
+    
+    Parameters:
+        input_image (Tensor)  : The batch of OCT images, normalized to [-1, 1]
+        training    (Boolean) : Whether the generator is run in training mode (with dropout), as test.py does
+        
+    Returns:
+        gen_output  (Tensor)  : The batch of virtual histology images, normalized to [-1, 1]
+    '''
+    def _generate(self, input_image, training=True):
+        return self.generator(input_image, training=training)
+
+    '''
+    Pass the OCT images with the real and with the fake histology images through the discriminator, in a single call 
+    if the model was created with fuse_discriminator
+    
+    Parameters:
+        input_image             (Tensor) : The batch of OCT images
+        target                  (Tensor) : The batch of real histology images
+        gen_output              (Tensor) : The batch of fake histology images produced by the generator
+        
+    Returns:
+        disc_real_output        (Tensor) : The discriminator logits of the real image pairs
+        disc_generated_output   (Tensor) : The discriminator logits of the fake image pairs
+    '''
+    def discriminate(self, input_image, target, gen_output):
+        if self.fuse_discriminator:
+            return discriminator.discriminate_real_and_generated(self.discriminator, input_image, target, gen_output)
+        return (self.discriminator([input_image, target], training=True),
+                self.discriminator([input_image, gen_output], training=True))
+
+    '''
+    Training step run by every replica on its part of the batch. See train_step.
+    
+    Parameters:
+        input_image (Tensor) : The replica's batch of OCT images
+        target      (Tensor) : The replica's batch of histology images
+        
+    Returns:
+        The replica's contribution to the losses returned by train_step
+    '''
+    def _replica_train_step(self, input_image, target):
+
+        losses, generator_gradients, discriminator_gradients = self._compute_replica_gradients(input_image, target)
+
+        # Update the weights of the generator and discriminator using the calculated gradients
+        # (the optimizers sum the gradients of all replicas)
+        self.generator_optimizer.apply_gradients(zip(generator_gradients, self.generator.trainable_variables))
+        self.discriminator_optimizer.apply_gradients(
+            zip(discriminator_gradients, self.discriminator.trainable_variables))
+
+        return losses
+
+    '''
+    Computes the gradients and the losses of a replica's part of the batch, see _replica_compute_gradients. A replica 
+    whose part is empty (e.g. when a batch of 1 is split across 2 replicas) contributes zero gradients and losses 
+    without running the model, as the convolutions do not support empty batches.
+    
+    Parameters:
+        input_image (Tensor) : The replica's batch of OCT images
+        target      (Tensor) : The replica's batch of histology images
+        
+    Returns:
+        The losses and gradients returned by _replica_compute_gradients
+    '''
+    def _compute_replica_gradients(self, input_image, target):
+
+        # Number of image pairs processed by all replicas together, the losses of every replica are divided by it
+        global_batch_size = self._get_global_batch_size(input_image)
+        if self.strategy.num_replicas_in_sync == 1:
+            return self.compute_gradients(input_image, target, global_batch_size)
+
+        def zero_gradients():
+            return ((tf.constant(0.0),) * 4,
+                    [tf.zeros_like(variable) for variable in self.generator.trainable_variables],
+                    [tf.zeros_like(variable) for variable in self.discriminator.trainable_variables])
+
+        return tf.cond(tf.shape(input_image)[0] > 0,
+                       lambda: self.compute_gradients(input_image, target, global_batch_size), zero_gradients)
+
+    '''
+    Returns the number of image pairs of the batch across all replicas. A distributed dataset does not always split a 
+    batch evenly (e.g. a batch of 3 on 2 replicas is split into 2 and 1 pairs, and a batch of 1 into 1 and 0), so the 
+    sizes of the replicas' parts are summed rather than the size of this replica's part multiplied by the number of 
+    replicas.
+    
+    Parameters:
+        input_image         (Tensor) : The replica's batch of OCT images
+        
+    Returns:
+        global_batch_size   (Tensor) : Number of image pairs processed by all replicas together
+    '''
+    def _get_global_batch_size(self, input_image):
+        batch_size = tf.shape(input_image)[0]
+        if self.strategy.num_replicas_in_sync == 1:
+            return batch_size
+        # Reduced as a float, which all cross-device reductions support
+        global_batch_size = tf.distribute.get_replica_context().all_reduce(tf.distribute.ReduceOp.SUM,
+                                                                           tf.cast(batch_size, tf.float32))
+        return tf.cast(global_batch_size, tf.int32)
+
+    '''
+    Accumulation step run by every replica on its part of the batch: computes the gradients like _replica_train_step 
+    but adds them to the accumulators instead of applying them
+    
+    Parameters:
+        input_image (Tensor) : The replica's batch of OCT images
+        target      (Tensor) : The replica's batch of histology images
+        
+    Returns:
+        The replica's contribution to the losses returned by train_step
+    '''
+    def _replica_accumulate_gradients(self, input_image, target):
+
+        losses, generator_gradients, discriminator_gradients = self._compute_replica_gradients(input_image, target)
+
+        for accumulator, gradient in zip(self.generator_accumulators + self.discriminator_accumulators,
+                                         generator_gradients + discriminator_gradients):
+            accumulator.assign_add(gradient)
+
+        return losses
+
+    '''
+    Apply the accumulated gradients on every replica and reset the accumulators, see apply_accumulated_gradients
+    
+    Parameters:
+        num_batches (Tensor) : Number of accumulated batches, the accumulated gradients are divided by it
+    '''
+    @tf.function
+    def _distributed_apply_accumulated_gradients(self, num_batches):
+        self.strategy.run(self._replica_apply_accumulated_gradients, args=(num_batches,))
+
+    def _replica_apply_accumulated_gradients(self, num_batches):
+        self.generator_optimizer.apply_gradients(
+            zip([accumulator / num_batches for accumulator in self.generator_accumulators],
+                self.generator.trainable_variables))
+        self.discriminator_optimizer.apply_gradients(
+            zip([accumulator / num_batches for accumulator in self.discriminator_accumulators],
+                self.discriminator.trainable_variables))
+
+        for accumulator in self.generator_accumulators + self.discriminator_accumulators:
+            accumulator.assign(tf.zeros_like(accumulator))
+
+    '''
+    Forward and backward pass of a replica, compiled with XLA if the model was created with jit_compile
+    
+    Parameters:
+        input_image         (Tensor) : The replica's batch of OCT images
+        target              (Tensor) : The replica's batch of histology images
+        global_batch_size   (Tensor) : Number of image pairs processed by all replicas together
+        
+    Returns:
+        losses                      (tuple) : The replica's contribution to the losses returned by train_step
+        generator_gradients         (list)  : The gradients of the generator weights
+        discriminator_gradients     (list)  : The gradients of the discriminator weights
+    '''
+    def _replica_compute_gradients(self, input_image, target, global_batch_size):
 
         # Enable GradientTape in order to keep track of weight gradients for the discriminator and generator
         with tf.GradientTape() as gen_tape, tf.GradientTape() as disc_tape:
@@ -77,37 +417,79 @@ class OCT2HistModel:
             # Pass the OCT through the generator network
             gen_output = self.generator(input_image, training=True)
 
-            # Pass the OCT and real histology images through the discriminator
-            disc_real_output = self.discriminator([input_image, target], training=True)
-            # Pass the OCT and fake histology images through the discriminator
-            disc_generated_output = self.discriminator([input_image, gen_output], training=True)
+            # Pass the OCT and real histology images, and the OCT and fake histology images, through the discriminator
+            disc_real_output, disc_generated_output = self.discriminate(input_image, target, gen_output)
 
             # Compute the GAN adversarial loss, the L1 loss, and the total generator loss using:
             # 1. The generator output
             # 2. The discriminator output (when the discriminator is given the fake histology image)
             # 3. The real histology image
-            gen_total_loss, gen_gan_loss, gen_l1_loss = generator.compute_loss(self.generator_loss,
-                                                                               disc_generated_output, gen_output,
-                                                                               target)
-
             # Compute the discriminator loss using:
             # 1. The output of the discriminator when it is given the real histology image
             # 2. The output of the discriminator when it is given the fake histology image
-            disc_loss = discriminator.compute_loss(self.discriminator_loss, disc_real_output, disc_generated_output)
+            if self.fuse_discriminator:
+                gen_total_loss, gen_gan_loss, gen_l1_loss = generator.compute_loss_from_logits(
+                    disc_generated_output, gen_output, target, global_batch_size)
+                disc_loss = discriminator.compute_loss_from_logits(disc_real_output, disc_generated_output,
+                                                                   global_batch_size)
+            else:
+                gen_total_loss, gen_gan_loss, gen_l1_loss = generator.compute_loss(self.generator_loss,
+                                                                                   disc_generated_output, gen_output,
+                                                                                   target, global_batch_size)
+                disc_loss = discriminator.compute_loss(self.discriminator_loss, disc_real_output,
+                                                       disc_generated_output, global_batch_size)
+
+            # Scale the losses when loss scaling is used (see __init__)
+            scaled_gen_total_loss = self._scale_loss(self.generator_optimizer, gen_total_loss)
+            scaled_disc_loss = self._scale_loss(self.discriminator_optimizer, disc_loss)
 
         # Calculate the generator and discriminator weight gradients
-        generator_gradients = gen_tape.gradient(gen_total_loss, self.generator.trainable_variables)
-        discriminator_gradients = disc_tape.gradient(disc_loss, self.discriminator.trainable_variables)
+        generator_gradients = self._unscale_gradients(
+            self.generator_optimizer, gen_tape.gradient(scaled_gen_total_loss, self.generator.trainable_variables))
+        discriminator_gradients = self._unscale_gradients(
+            self.discriminator_optimizer,
+            disc_tape.gradient(scaled_disc_loss, self.discriminator.trainable_variables))
 
-        # Update the weights of the generator and discriminator using the calculated gradients
-        self.generator_optimizer.apply_gradients(zip(generator_gradients, self.generator.trainable_variables))
-        self.discriminator_optimizer.apply_gradients(
-            zip(discriminator_gradients, self.discriminator.trainable_variables))
+        return (gen_total_loss, gen_gan_loss, gen_l1_loss, disc_loss), generator_gradients, discriminator_gradients
 
-        # Store the loss metrics for future plotting in TensorBoard
-        with self.summary_writer.as_default():
-            tf.summary.scalar('gen_total_loss', gen_total_loss, step=epoch)
-            tf.summary.scalar('gen_gan_loss', gen_gan_loss, step=epoch)
-            tf.summary.scalar('gen_l1_loss', gen_l1_loss, step=epoch)
-            tf.summary.scalar('disc_loss', disc_loss, step=epoch)
-            #tf.summary.image("Training Data", tf.squeeze([input_image, gen_output]), step=epoch)
+    '''
+    Create a gradient accumulator, initialized to zero, for every trainable weight of a model. The accumulators are 
+    local to every replica.
+
+    Parameters:
+        model       (TensorFlow.keras.Model) : The model whose gradients are accumulated
+
+    Returns:
+        accumulators (list) : The accumulator variables, in the order of model.trainable_variables
+    '''
+    @staticmethod
+    def _create_accumulators(model):
+        return [tf.Variable(tf.zeros(variable.shape, variable.dtype), trainable=False,
+                            synchronization=tf.VariableSynchronization.ON_READ,
+                            aggregation=tf.VariableAggregation.SUM) for variable in model.trainable_variables]
+
+    '''
+    Scale a loss by the loss scale of the optimizer if it applies loss scaling, otherwise return the loss unchanged
+
+    Parameters:
+        optimizer   (TensorFlow.keras.optimizer) : The optimizer the gradients of the loss will be applied with
+        loss        (Tensor)                     : The loss to scale
+    '''
+    @staticmethod
+    def _scale_loss(optimizer, loss):
+        if isinstance(optimizer, tf.keras.mixed_precision.LossScaleOptimizer):
+            return optimizer.get_scaled_loss(loss)
+        return loss
+
+    '''
+    Undo the loss scaling of gradients computed from a loss scaled by _scale_loss
+
+    Parameters:
+        optimizer   (TensorFlow.keras.optimizer) : The optimizer the gradients will be applied with
+        gradients   (list)                       : The gradients of the scaled loss
+    '''
+    @staticmethod
+    def _unscale_gradients(optimizer, gradients):
+        if isinstance(optimizer, tf.keras.mixed_precision.LossScaleOptimizer):
+            return optimizer.get_unscaled_gradients(gradients)
+        return gradients
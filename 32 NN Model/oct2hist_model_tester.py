@@ -0,0 +1,191 @@
+import tensorflow as tf
+import os
+import input_pipeline as ip
+import tester_helpers
+import generator
+import discriminator
+from oct2hist_model import OCT2HistModel
+
+# Split the CPU into 2 logical devices for the tests with 2 replicas. Devices can only be configured before TensorFlow
+# initializes them, so those tests are skipped if another test module initialized TensorFlow first.
+try:
+    tf.config.set_logical_device_configuration(tf.config.list_physical_devices('CPU')[0],
+                                               [tf.config.LogicalDeviceConfiguration()] * 2)
+except RuntimeError:
+    pass
+
+
+class OCT2HistModelTest(tf.test.TestCase):
+
+    def setUp(self):
+        super(OCT2HistModelTest, self).setUp()
+
+        OCT_image, hist_image = tester_helpers.load_tester_images("test_vectors/sample_OCT.jpg",
+                                                                  "test_vectors/sample_histology.jpg")
+        OCT_image, hist_image = ip.resize(OCT_image, hist_image, 256, 256)
+        OCT_image, hist_image = ip.normalize(OCT_image, hist_image)
+        self.OCT_images, self.hist_images = tf.stack([OCT_image] * 2), tf.stack([hist_image] * 2)
+
+    def tearDown(self):
+        # The model sets the global Keras policy, restore the default for the other tests
+        tf.keras.mixed_precision.set_global_policy('float32')
+        super(OCT2HistModelTest, self).tearDown()
+
+    # Verify that a training step runs with the bfloat16 mixed precision policy (supported on CPU)
+    def test_train_step_mixed_bfloat16(self):
+        model = OCT2HistModel(num_epochs_const_lr=1, num_epochs_decay_lr=1, num_batches=1, is_train=True,
+                              precision_policy='mixed_bfloat16')
+        losses = model.train_step(self.OCT_images, self.hist_images)
+        for loss in losses:
+            self.assertEqual(loss.dtype, tf.float32, msg="Losses must be computed in float32.")
+            self.assertAllEqual(tf.math.is_finite(loss), True, msg="Losses must be finite.")
+
+        gen_output = model.generator(self.OCT_images, training=False)
+        self.assertEqual(gen_output.dtype, tf.float32, msg="The generator output must be float32.")
+
+    # Verify that the losses are accumulated across training steps and reset once they are written
+    def test_write_summaries(self):
+        model = OCT2HistModel(num_epochs_const_lr=1, num_epochs_decay_lr=1, num_batches=1, is_train=True)
+        model.train_step(self.OCT_images, self.hist_images)
+        model.train_step(self.OCT_images, self.hist_images)
+        self.assertEqual(model.training_metrics.metrics['disc_loss'].count, 2)
+
+        model.write_summaries()
+        for metric in model.training_metrics.metrics.values():
+            self.assertEqual(metric.count, 0, msg="Metrics must be reset once they are written.")
+
+    # Verify that a training step runs on a distributed dataset and returns losses reduced across replicas
+    def test_train_step_mirrored_strategy(self):
+        strategy = tf.distribute.MirroredStrategy(['/cpu:0'])
+        model = OCT2HistModel(num_epochs_const_lr=1, num_epochs_decay_lr=1, num_batches=1, is_train=True,
+                              strategy=strategy)
+        dataset = tf.data.Dataset.from_tensor_slices((self.OCT_images, self.hist_images)).batch(2)
+        for input_image, target in strategy.experimental_distribute_dataset(dataset):
+            losses = model.train_step(input_image, target)
+        for loss in losses:
+            self.assertEqual(loss.shape, [], msg="Losses must be reduced to scalars.")
+            self.assertAllEqual(tf.math.is_finite(loss), True, msg="Losses must be finite.")
+
+    # Verify that the losses and gradients of batches that are split unevenly across 2 replicas (3 image pairs into 2
+    # and 1, and 1 image pair into 1 and 0) are the same as on a single device
+    def test_train_step_uneven_replica_batches(self):
+        if len(tf.config.list_logical_devices('CPU')) < 2:
+            self.skipTest('Needs 2 logical CPU devices')
+        strategy = tf.distribute.MirroredStrategy(['/cpu:0', '/cpu:1'])
+        single_model = OCT2HistModel(num_epochs_const_lr=1, num_epochs_decay_lr=1, num_batches=1, is_train=True)
+        model = OCT2HistModel(num_epochs_const_lr=1, num_epochs_decay_lr=1, num_batches=1, is_train=True,
+                              strategy=strategy)
+        # Dropout draws different masks on every replica
+        for layer in single_model.generator.layers + model.generator.layers:
+            if isinstance(layer, tf.keras.layers.Dropout):
+                layer.rate = 0.0
+
+        # Different images, so that weighting the image pairs unevenly changes the losses
+        scales = tf.constant([1.0, 0.5, -0.5])[:, tf.newaxis, tf.newaxis, tf.newaxis]
+        OCT_images, hist_images = self.OCT_images[:1] * scales, self.hist_images[:1] * scales[::-1]
+
+        @tf.function
+        def distributed_gradients(input_image, target):
+            def replica_gradients(input_image, target):
+                _, generator_gradients, discriminator_gradients = model._compute_replica_gradients(input_image, target)
+                return generator_gradients + discriminator_gradients
+            return [strategy.reduce(tf.distribute.ReduceOp.SUM, gradient, axis=None)
+                    for gradient in strategy.run(replica_gradients, args=(input_image, target))]
+
+        for batch_size in [3, 1]:
+            # The first Adam steps can amplify rounding differences, start every batch from the same weights
+            model.generator.set_weights(single_model.generator.get_weights())
+            model.discriminator.set_weights(single_model.discriminator.get_weights())
+            dataset = tf.data.Dataset.from_tensor_slices((OCT_images[:batch_size], hist_images[:batch_size]))
+            input_image, target = next(iter(strategy.experimental_distribute_dataset(dataset.batch(batch_size))))
+
+            # Compared as a whole, as the gradients of some biases are close to zero and only hold rounding errors
+            _, generator_gradients, discriminator_gradients = single_model.compute_gradients(
+                OCT_images[:batch_size], hist_images[:batch_size], batch_size)
+            expected_gradients = generator_gradients + discriminator_gradients
+            errors = [gradient - expected for gradient, expected in zip(distributed_gradients(input_image, target),
+                                                                         expected_gradients)]
+            self.assertLess(tf.linalg.global_norm(errors) / tf.linalg.global_norm(expected_gradients), 1e-3)
+
+            self.assertAllClose(model.train_step(input_image, target),
+                                single_model.train_step(OCT_images[:batch_size], hist_images[:batch_size]), rtol=1e-4)
+
+    # Verify that the XLA compiled training step and generator compute the same results as the uncompiled ones
+    def test_jit_compile(self):
+        model = OCT2HistModel(num_epochs_const_lr=1, num_epochs_decay_lr=1, num_batches=1, is_train=True,
+                              jit_compile=True)
+        self.assertAllClose(model.generate(self.OCT_images, training=False),
+                            model.generator(self.OCT_images, training=False), atol=1e-4)
+
+        losses = model.train_step(self.OCT_images, self.hist_images)
+        for loss in losses:
+            self.assertAllEqual(tf.math.is_finite(loss), True, msg="Losses must be finite.")
+        self.assertEqual(model.generator_optimizer.iterations, 1)
+
+    # Verify that the fused discriminator pass and the losses computed from the logits give the same results as two
+    # discriminator passes and the loss objects
+    def test_fuse_discriminator(self):
+        model = OCT2HistModel()
+        gen_output = model.generator(self.OCT_images, training=False)
+        disc_real_output, disc_generated_output = model.discriminate(self.OCT_images, self.hist_images, gen_output)
+        model.fuse_discriminator = False
+        expected_real_output, expected_generated_output = model.discriminate(self.OCT_images, self.hist_images,
+                                                                             gen_output)
+        self.assertAllClose(disc_real_output, expected_real_output, atol=1e-5)
+        self.assertAllClose(disc_generated_output, expected_generated_output, atol=1e-5)
+
+        self.assertAllClose(generator.compute_loss_from_logits(disc_generated_output, gen_output, self.hist_images),
+                            generator.compute_loss(model.generator_loss, disc_generated_output, gen_output,
+                                                   self.hist_images), atol=1e-5)
+        self.assertAllClose(discriminator.compute_loss_from_logits(disc_real_output, disc_generated_output),
+                            discriminator.compute_loss(model.discriminator_loss, disc_real_output,
+                                                       disc_generated_output), atol=1e-5)
+
+    # Verify that the gradients are applied once every accumulation_steps batches and at the end of an epoch, and that
+    # the learning rate schedule counts optimizer steps
+    def test_gradient_accumulation(self):
+        model = OCT2HistModel(num_epochs_const_lr=1, num_epochs_decay_lr=1, num_batches=3, is_train=True,
+                              accumulation_steps=2)
+        self.assertEqual(model.num_steps_per_epoch, 2)
+        self.assertEqual(model.learning_rate.num_batches, 2)
+
+        model.train_step(self.OCT_images, self.hist_images)
+        self.assertEqual(model.generator_optimizer.iterations, 0)
+        self.assertGreater(tf.reduce_sum(tf.abs(model.generator_accumulators[0])), 0)
+        model.train_step(self.OCT_images, self.hist_images)
+        self.assertEqual(model.generator_optimizer.iterations, 1)
+        self.assertEqual(model.discriminator_optimizer.iterations, 1)
+        for accumulator in model.generator_accumulators + model.discriminator_accumulators:
+            self.assertAllEqual(accumulator, tf.zeros_like(accumulator), msg="Accumulators must be reset.")
+
+        model.train_step(self.OCT_images, self.hist_images)
+        self.assertEqual(model.num_accumulated_batches, 1)
+        model.apply_accumulated_gradients()
+        self.assertEqual(model.generator_optimizer.iterations, 2)
+        self.assertEqual(model.num_accumulated_batches, 0)
+
+    # Verify that the epoch and step counters are restored from a checkpoint, so that training can be resumed
+    def test_checkpoint_resume(self):
+        model = OCT2HistModel(num_epochs_const_lr=1, num_epochs_decay_lr=1, num_batches=1, is_train=True)
+        model.train_step(self.OCT_images, self.hist_images)
+        model.epoch.assign(1)
+        manager = tf.train.CheckpointManager(model.checkpoint, os.path.join(self.get_temp_dir(), 'ckpt'), max_to_keep=1)
+        manager.save(checkpoint_number=model.generator_optimizer.iterations)
+
+        resumed_model = OCT2HistModel(num_epochs_const_lr=1, num_epochs_decay_lr=1, num_batches=1, is_train=True)
+        resumed_model.checkpoint.restore(manager.latest_checkpoint)
+        self.assertEqual(resumed_model.epoch, 1)
+        self.assertEqual(resumed_model.generator_optimizer.iterations, 1)
+        self.assertEqual(resumed_model.learning_rate(resumed_model.generator_optimizer.iterations),
+                         model.learning_rate(model.generator_optimizer.iterations))
+
+    # Verify that the layers are computed in 16 bits while the weights are kept in float32
+    def test_mixed_precision_variables(self):
+        model = OCT2HistModel(precision_policy='mixed_bfloat16')
+        self.assertEqual(model.generator.layers[-2].compute_dtype, 'bfloat16')
+        for variable in model.generator.trainable_variables:
+            self.assertEqual(variable.dtype, tf.float32, msg="Weights must be stored in float32.")
+
+
+if __name__ == '__main__':
+    tf.test.main()
@@ -0,0 +1,190 @@
+import tensorflow as tf
+import numpy as np
+import input_pipeline as ip
+import argparse
+import json
+import os
+import time
+from export_generator import restore_generator, IMG_HEIGHT, IMG_WIDTH
+
+'''
+This module converts the generator of a trained OCT2Hist model into TensorFlow Lite models for CPU inference, and
+reports how much accuracy the conversion costs compared to the float generator.
+
+    'float16' : Weights are stored as float16 (half the size), computations run in float32
+    'int8'    : Full integer quantization. Weights and activations are int8, their ranges are calibrated on a
+                representative sample of OCT images. Inputs and outputs stay float32 and are (de)quantized by the model.
+'''
+
+# Quantization modes of convert_generator
+QUANTIZATION_MODES = ['float32', 'float16', 'int8']
+
+'''
+Converts the generator into a TensorFlow Lite model that translates one 256 x 256 OCT image per call
+
+    Parameters:
+        generator_model         (TensorFlow.keras.Model) : The generator to convert
+        quantization            (str)                    : One of QUANTIZATION_MODES
+        representative_images   (list)                   : The (256 x 256 x 3) OCT images, normalized to [-1, 1], the
+                                                           int8 ranges are calibrated on. Required for 'int8'.
+
+    Returns:
+        tflite_model            (bytes) : The serialized TensorFlow Lite model
+'''
+def convert_generator(generator_model, quantization, representative_images=None):
+    if quantization not in QUANTIZATION_MODES:
+        raise Exception('quantization must be one of {}'.format(', '.join(QUANTIZATION_MODES)))
+
+    # TensorFlow Lite works best with static shapes, so the model translates a single image per call
+    translate = tf.function(lambda OCT_images: generator_model(OCT_images, training=False),
+                            input_signature=[tf.TensorSpec([1, IMG_HEIGHT, IMG_WIDTH, 3], tf.float32,
+                                                           name='OCT_images')])
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([translate.get_concrete_function()], generator_model)
+
+    if quantization == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == 'int8':
+        if not representative_images:
+            raise Exception('int8 quantization needs representative images to calibrate on')
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([image[np.newaxis]] for image in representative_images)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    return converter.convert()
+
+
+'''
+Translates images one by one with a TensorFlow Lite model
+
+    Parameters:
+        tflite_model    (bytes) : The serialized TensorFlow Lite model
+        images          (list)  : The (256 x 256 x 3) OCT images, normalized to [-1, 1]
+        num_threads     (int)   : Number of CPU threads the interpreter uses
+
+    Returns:
+        outputs         (list)  : The translated images, normalized to [-1, 1]
+        latency         (float) : The mean time in seconds it took to translate an image
+'''
+def run_tflite_model(tflite_model, images, num_threads=1):
+    interpreter = tf.lite.Interpreter(model_content=tflite_model, num_threads=num_threads)
+    interpreter.allocate_tensors()
+    input_index = interpreter.get_input_details()[0]['index']
+    output_index = interpreter.get_output_details()[0]['index']
+
+    outputs = []
+    start = time.time()
+    for image in images:
+        interpreter.set_tensor(input_index, image[np.newaxis].astype(np.float32))
+        interpreter.invoke()
+        outputs.append(interpreter.get_tensor(output_index)[0])
+
+    return outputs, (time.time() - start) / max(len(images), 1)
+
+
+'''
+Computes the mean L1 distance and SSIM between two lists of images normalized to [-1, 1]
+
+    Parameters:
+        images           (list) : The images to compare
+        reference_images (list) : The images to compare to
+
+    Returns:
+        metrics          (dict) : 'l1' and 'ssim'. SSIM is computed on images rescaled to [0, 1].
+'''
+def compare_images(images, reference_images):
+    images = tf.stack(images)
+    reference_images = tf.stack(reference_images)
+    l1 = tf.reduce_mean(tf.abs(images - reference_images))
+    ssim = tf.reduce_mean(tf.image.ssim((images + 1) / 2, (reference_images + 1) / 2, max_val=1.0))
+    return {'l1': float(l1), 'ssim': float(ssim)}
+
+
+'''
+Converts the generator with every quantization mode and compares the converted models to the float generator and to
+the real histology images
+
+    Parameters:
+        generator_model         (TensorFlow.keras.Model) : The generator
+        representative_images   (list)                   : The OCT images the int8 ranges are calibrated on
+        OCT_images              (list)                   : The OCT images the models are evaluated on
+        hist_images             (list)                   : The real histology images of OCT_images
+        quantization_modes      (list)                   : The quantization modes to convert the generator with
+        num_threads             (int)                    : Number of CPU threads of the TensorFlow Lite interpreter
+
+    Returns:
+        tflite_models           (dict) : Maps every quantization mode to its serialized TensorFlow Lite model
+        report                  (dict) : Maps 'float_generator' and every quantization mode to its metrics: model size
+                                         in bytes, mean latency per image in seconds, L1/SSIM compared to the float
+                                         generator ('vs_float') and compared to the real histology ('vs_histology')
+'''
+def evaluate_quantization(generator_model, representative_images, OCT_images, hist_images,
+                          quantization_modes=('float16', 'int8'), num_threads=1):
+    start = time.time()
+    float_outputs = [generator_model(image[np.newaxis], training=False)[0].numpy() for image in OCT_images]
+    report = {'float_generator': {
+        'size': sum(variable.shape.num_elements() * variable.dtype.size for variable in generator_model.variables),
+        'latency': (time.time() - start) / max(len(OCT_images), 1),
+        'vs_histology': compare_images(float_outputs, hist_images)}}
+
+    tflite_models = {}
+    for quantization in quantization_modes:
+        tflite_models[quantization] = convert_generator(generator_model, quantization, representative_images)
+        outputs, latency = run_tflite_model(tflite_models[quantization], OCT_images, num_threads)
+        report[quantization] = {'size': len(tflite_models[quantization]),
+                                'latency': latency,
+                                'vs_float': compare_images(outputs, float_outputs),
+                                'vs_histology': compare_images(outputs, hist_images)}
+
+    return tflite_models, report
+
+
+if __name__ == '__main__':
+
+    # Setup command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--OCT_data_folders', required=True, nargs='*', help='A file path or a list of space-separated file paths pointing to the folder(s) of OCT images. \
+                                                                             Please see the docstring for load_dataset in input_pipeline.py for more formatting details')
+    parser.add_argument('--hist_data_folders', required=True, nargs='*', help='A file path or a list of space-separated file paths pointing to the folder(s) of histology images. \
+                                                                Please see the docstring for load_dataset in input_pipeline.py for more formatting details')
+    parser.add_argument('--checkpoint_dir', type=str, default='./training_checkpoints',
+                        help='Directory of the training checkpoints, the latest checkpoint is converted')
+    parser.add_argument('--output_dir', type=str, default='./quantized_generator',
+                        help='Directory the TensorFlow Lite models and the report are written to')
+    parser.add_argument('--quantization', nargs='*', default=['float16', 'int8'], choices=QUANTIZATION_MODES,
+                        help='Quantization modes to convert the generator with')
+    parser.add_argument('--num_calibration_images', type=int, default=100,
+                        help='Number of OCT images the int8 ranges are calibrated on')
+    parser.add_argument('--num_eval_images', type=int, default=50,
+                        help='Number of image pairs the converted models are evaluated on, taken after the '
+                             'calibration images')
+    parser.add_argument('--num_threads', type=int, default=1, help='Number of CPU threads of the interpreter')
+    args = parser.parse_args()
+
+    # Draw the calibration and evaluation images the same way test.py does
+    dataset, _ = ip.load_dataset(args.OCT_data_folders, args.hist_data_folders, is_train=False)
+    image_pairs = [(OCT_image[0].numpy(), hist_image[0].numpy())
+                   for _, OCT_image, hist_image in dataset.take(args.num_calibration_images + args.num_eval_images)]
+    representative_images = [OCT_image for OCT_image, _ in image_pairs[:args.num_calibration_images]]
+    eval_pairs = image_pairs[args.num_calibration_images:]
+    if not eval_pairs:
+        print('Warning: no image pairs left for the evaluation, evaluating on the calibration images')
+        eval_pairs = image_pairs
+
+    generator_model = restore_generator(args.checkpoint_dir)
+    tflite_models, report = evaluate_quantization(generator_model, representative_images,
+                                                  [OCT_image for OCT_image, _ in eval_pairs],
+                                                  [hist_image for _, hist_image in eval_pairs],
+                                                  args.quantization, args.num_threads)
+
+    if not os.path.exists(args.output_dir):
+        os.makedirs(args.output_dir)
+    for quantization, tflite_model in tflite_models.items():
+        with open(os.path.join(args.output_dir, 'generator_{}.tflite'.format(quantization)), 'wb') as f:
+            f.write(tflite_model)
+    report['num_calibration_images'] = len(representative_images)
+    report['num_eval_images'] = len(eval_pairs)
+    with open(os.path.join(args.output_dir, 'quantization_report.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(json.dumps(report, indent=2))
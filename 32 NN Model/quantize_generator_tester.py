@@ -0,0 +1,38 @@
+import tensorflow as tf
+import numpy as np
+import generator
+import quantize_generator as qg
+
+
+class QuantizeGeneratorTest(tf.test.TestCase):
+
+    def setUp(self):
+        super(QuantizeGeneratorTest, self).setUp()
+
+        self.generator_model, _ = generator.build_model()
+        self.OCT_images = [np.random.uniform(-1, 1, (256, 256, 3)).astype(np.float32) for _ in range(2)]
+
+    # Verify that the float16 and int8 models translate images into images of the same dimensions and value range
+    def test_convert_generator(self):
+        for quantization in ['float16', 'int8']:
+            tflite_model = qg.convert_generator(self.generator_model, quantization, self.OCT_images)
+            outputs, _ = qg.run_tflite_model(tflite_model, self.OCT_images)
+            self.assertEqual(len(outputs), 2)
+            self.assertAllEqual(outputs[0].shape, [256, 256, 3])
+            self.assertAllInRange(outputs[0], -1.0, 1.0)
+
+    # Verify that int8 quantization cannot be calibrated without representative images
+    def test_convert_generator_int8_without_images(self):
+        with self.assertRaises(Exception):
+            qg.convert_generator(self.generator_model, 'int8')
+
+    # Verify that the report holds the metrics of every quantization mode
+    def test_evaluate_quantization(self):
+        _, report = qg.evaluate_quantization(self.generator_model, self.OCT_images, self.OCT_images, self.OCT_images,
+                                             quantization_modes=['float16'])
+        self.assertLess(report['float16']['size'], report['float_generator']['size'])
+        self.assertLess(report['float16']['vs_float']['l1'], 0.05)
+
+
+if __name__ == '__main__':
+    tf.test.main()
@@ -1,9 +1,11 @@
 import input_pipeline as ip
+import tiled_inference
 from oct2hist_model import *
 import os
 import ntpath
 import argparse
 from visualization_tools import html, util
+from visualization_tools.image_writer import ImageWriter
 from collections import OrderedDict
 
 '''
@@ -13,12 +15,15 @@ This function saves images to the disk and saves images stored in 'visuals' to t
             webpage                 (the HTML class) - the HTML webpage class that stores these images (see html.py for more details)
             visuals                 (OrderedDict)    - an ordered dictionary that stores (name, images (either tensor or numpy)) pairs
             image_path              (str)            - the string is used to create image paths
-            original_im_dimensions  (tuple)          - the width and height of the image before pre-processing
+            original_im_dimensions  (tuple)          - the width and height of the image before pre-processing, or None if
+                                                       the images already have their original dimensions
             width                   (int)            - the images will be resized to width x width
+            image_writer            (ImageWriter)    - (OPTIONAL) the pool of threads the images are written with. If None,
+                                                       the images are written before this function returns
 '''
 
 
-def save_images(webpage, visuals, image_path, original_im_dimensions, width=256):
+def save_images(webpage, visuals, image_path, original_im_dimensions, width=256, image_writer=None):
 
     # Retrieve directories for image results and name of the image being processed
     image_dir = webpage.get_image_dir()
@@ -36,8 +41,12 @@ def save_images(webpage, visuals, image_path, original_im_dimensions, width=256)
         save_path = os.path.join(image_dir, image_name)
         save_path_original_dim = os.path.join(image_dir_original_dim, image_name)
 
-        util.save_image(im, save_path)
-        util.save_image(im, save_path_original_dim, original_im_dimensions)
+        if image_writer is not None:
+            image_writer.save_image(im, save_path)
+            image_writer.save_image(im, save_path_original_dim, original_im_dimensions)
+        else:
+            util.save_image(im, save_path)
+            util.save_image(im, save_path_original_dim, original_im_dimensions)
 
         ims.append(image_name)
         txts.append(label)
@@ -53,21 +62,31 @@ if __name__ == '__main__':
                                                                              Please see the docstring for load_dataset in input_pipeline.py for more formatting details')
     parser.add_argument('--hist_data_folders', nargs='*', help='A file path or a list of space-separated file paths pointing to the folder(s) of histology images. \
                                                                 Please see the docstring for load_dataset in input_pipeline.py for more formatting details')
+    parser.add_argument('--manifest_path', type=str, default=None, help='JSON file caching the listing of the data folders. Created on first use, only changed folders are listed again')
     parser.add_argument('--dataset_type', required=True, type=str, help='Type of dataset: train, test, etc.')
+    parser.add_argument('--batch_size', type=int, default=1, help='Number of slides translated per generator call')
+    parser.add_argument('--tiled', action='store_true',
+                        help='Translate the images in their original dimensions, as overlapping 256x256 tiles blended '
+                             'back together, instead of resizing them to 256x256. --batch_size tiles are translated '
+                             'per generator call')
+    parser.add_argument('--tile_overlap', type=int, default=64, help='Minimum overlap of neighbouring tiles in pixels')
+    parser.add_argument('--jit_compile', action='store_true', help='Compile the generator with XLA')
+    parser.add_argument('--num_writers', type=int, default=4, help='Number of threads encoding and writing images')
 
     args = parser.parse_args()
 
-    # Initialize dataset and the OCT2Hist model with checkpoints
-    dataset, num_batches = ip.load_dataset(args.OCT_data_folders, args.hist_data_folders, is_train=False)
-    model = OCT2HistModel(num_batches=num_batches)
+    # Initialize dataset and the OCT2Hist model with checkpoints. The tiled translation reads the images in their
+    # original dimensions, the resized dataset is only needed without it
+    if args.tiled:
+        dataset, num_batches = ip.load_full_resolution_dataset(args.OCT_data_folders, args.hist_data_folders,
+                                                               manifest_path=args.manifest_path)
+    else:
+        dataset, num_batches = ip.load_dataset(args.OCT_data_folders, args.hist_data_folders, is_train=False,
+                                               batch_size=args.batch_size, manifest_path=args.manifest_path)
+    model = OCT2HistModel(num_batches=num_batches, jit_compile=args.jit_compile)
     checkpoint_dir = './training_checkpoints'
-    checkpoint_prefix = os.path.join(checkpoint_dir, "ckpt")
-    checkpoint = tf.train.Checkpoint(generator_optimizer=model.generator_optimizer,
-                                     discriminator_optimizer=model.discriminator_optimizer,
-                                     generator=model.generator,
-                                     discriminator=model.discriminator)
     # Restore checkpoints from previous training
-    checkpoint.restore(tf.train.latest_checkpoint(checkpoint_dir))
+    model.checkpoint.restore(tf.train.latest_checkpoint(checkpoint_dir))
 
     # Save images on disk and create html of images
     phase = args.dataset_type
@@ -75,11 +94,30 @@ if __name__ == '__main__':
     print('creating web directory', web_dir)
     webpage = html.HTML(web_dir, 'Experiment = %s, Phase = %s, Epoch = %s' % ('pix2pix', phase, 'latest'))
 
-    for n, (filepath, input_image, target) in dataset.enumerate():
-        prediction = model.generator(input_image, training=True)
-        visuals = OrderedDict([('real_A', input_image), ('fake_B', prediction), ('real_B', target)])
-        filepath = str(filepath.numpy()[0])[2:-1]
-        save_images(webpage, visuals, filepath, (1024, 512))
-
+    # Images are encoded and written in the background while the next batches are translated
+    image_writer = ImageWriter(num_workers=args.num_writers)
+
+    if args.tiled:
+        for filepath, input_image, target in dataset:
+            prediction = tiled_inference.translate_image(model.generate, input_image.numpy(),
+                                                         overlap=args.tile_overlap, batch_size=args.batch_size)
+            visuals = OrderedDict([('real_A', util.batch2ims(input_image[tf.newaxis])[0]),
+                                   ('fake_B', util.batch2ims(prediction[tf.newaxis])[0]),
+                                   ('real_B', util.batch2ims(target[tf.newaxis])[0])])
+            # The images already have their original dimensions
+            save_images(webpage, visuals, filepath.numpy().decode(), None, image_writer=image_writer)
+    else:
+        for filepaths, input_images, targets in dataset:
+            predictions = model.generate(input_images)
+
+            # Copy every batch to the host once, then hand the slides one by one to the writer
+            batch_visuals = OrderedDict([('real_A', util.batch2ims(input_images)),
+                                         ('fake_B', util.batch2ims(predictions)),
+                                         ('real_B', util.batch2ims(targets))])
+            for i, filepath in enumerate(filepaths.numpy()):
+                visuals = OrderedDict([(label, ims[i]) for label, ims in batch_visuals.items()])
+                save_images(webpage, visuals, filepath.decode(), (1024, 512), image_writer=image_writer)
+
+    image_writer.close()  # wait until all images are written
     webpage.save()  # save the HTML
 
@@ -0,0 +1,141 @@
+import numpy as np
+
+# Dimensions of the tiles passed to the generator (see generator.build_model)
+TILE_SIZE = 256
+
+'''
+Returns the start offsets of the tiles that cover an image dimension. Consecutive tiles overlap by at least overlap
+pixels and the last tile ends at the end of the dimension.
+
+    Parameters:
+        length      (int) : Length of the image dimension, at least tile_size
+        tile_size   (int) : Length of a tile
+        overlap     (int) : Minimum number of pixels by which consecutive tiles overlap, less than tile_size
+
+    Returns:
+        starts      (list) : The start offset of every tile, in increasing order
+'''
+def get_tile_starts(length, tile_size, overlap):
+    stride = tile_size - overlap
+    num_tiles = max(int(np.ceil((length - tile_size) / stride)), 0) + 1
+    if num_tiles == 1:
+        return [0]
+
+    # Spread the tiles evenly so that every overlap is about the same size
+    return [int(round(i * (length - tile_size) / (num_tiles - 1))) for i in range(num_tiles)]
+
+
+'''
+Returns the blending weights of a tile. The weights ramp up linearly from the edges of the tile over overlap pixels
+and are 1 in its center, so that overlapping tiles are feathered into each other instead of leaving seams. The weights
+are never 0, so pixels that are covered by a single tile (e.g. at the image borders) keep their value.
+
+    Parameters:
+        tile_size   (int) : Length of a tile
+        overlap     (int) : Number of pixels over which the weights ramp up
+
+    Returns:
+        weights     (numpy array) : The (tile_size x tile_size x 1) blending weights
+'''
+def get_blend_weights(tile_size, overlap):
+    ramp = np.ones(tile_size, dtype=np.float32)
+    if overlap > 0:
+        edge = (np.arange(overlap, dtype=np.float32) + 0.5) / overlap
+        ramp[:overlap] = np.minimum(ramp[:overlap], edge)
+        ramp[-overlap:] = np.minimum(ramp[-overlap:], edge[::-1])
+    return (ramp[:, np.newaxis] * ramp[np.newaxis, :])[:, :, np.newaxis]
+
+
+'''
+Translates an arbitrarily large OCT image with a generator that takes tile_size x tile_size images. The image is cut
+into overlapping tiles which are translated in batches and blended back together with feathered weights
+(see get_blend_weights).
+
+The image is processed one row of tiles at a time and the rows of the output are yielded as soon as no later tile
+overlaps them, so the memory used besides the input and output images is bounded by a row of tiles, regardless of the
+size of the image. The image can be any array that supports slicing, e.g. a numpy memmap of a stitched section.
+
+    Parameters:
+        generator   (TensorFlow.keras.Model) : The OCT2Hist generator
+        image       (numpy array)            : The (height x width x 3) OCT image, normalized to [-1, 1]
+        tile_size   (int)                    : Dimensions of the tiles the generator takes
+        overlap     (int)                    : Minimum number of pixels by which neighbouring tiles overlap
+        batch_size  (int)                    : Number of tiles translated per generator call
+        training    (boolean)                : Passed to the generator. Dropout is applied in training mode, which
+                                               makes neighbouring tiles disagree, so it is off by default
+
+    Returns:
+        A python generator of (row_start, rows) pairs, where rows is a (num_rows x width x 3) numpy array holding the
+        translated rows starting at row row_start, normalized to [-1, 1]. The pairs cover the image from top to bottom.
+'''
+def translate_image_rows(generator, image, tile_size=TILE_SIZE, overlap=64, batch_size=16, training=False):
+    if not 0 <= overlap < tile_size:
+        raise Exception("overlap must be at least 0 and less than tile_size")
+
+    height, width = image.shape[0], image.shape[1]
+
+    # Images smaller than a tile are padded with their reflection, the padding is cropped from the output
+    padded_height, padded_width = max(height, tile_size), max(width, tile_size)
+    row_starts = get_tile_starts(padded_height, tile_size, overlap)
+    col_starts = get_tile_starts(padded_width, tile_size, overlap)
+    weights = get_blend_weights(tile_size, overlap)
+
+    # Weighted sum of the translated tiles and sum of the weights of the rows that are not yielded yet, starting at
+    # row buffer_start
+    buffer_start = 0
+    output_sum = np.zeros((0, padded_width, 3), dtype=np.float32)
+    weight_sum = np.zeros((0, padded_width, 1), dtype=np.float32)
+
+    for i, row_start in enumerate(row_starts):
+        strip = np.asarray(image[row_start:row_start + tile_size], dtype=np.float32)
+        if strip.shape[0] < tile_size or strip.shape[1] < tile_size:
+            strip = np.pad(strip, [(0, tile_size - strip.shape[0]), (0, max(tile_size - strip.shape[1], 0)), (0, 0)],
+                           mode='symmetric')
+
+        # Grow the buffers to cover this row of tiles
+        num_new_rows = row_start + tile_size - (buffer_start + output_sum.shape[0])
+        if num_new_rows > 0:
+            output_sum = np.concatenate([output_sum, np.zeros((num_new_rows, padded_width, 3), np.float32)])
+            weight_sum = np.concatenate([weight_sum, np.zeros((num_new_rows, padded_width, 1), np.float32)])
+
+        # Translate the row of tiles in batches and accumulate the weighted tiles
+        tiles = np.stack([strip[:, col_start:col_start + tile_size] for col_start in col_starts])
+        top = row_start - buffer_start
+        for batch_start in range(0, len(col_starts), batch_size):
+            translated_tiles = generator(tiles[batch_start:batch_start + batch_size], training=training)
+            for col_start, translated_tile in zip(col_starts[batch_start:batch_start + batch_size],
+                                                  np.asarray(translated_tiles)):
+                output_sum[top:top + tile_size, col_start:col_start + tile_size] += translated_tile * weights
+                weight_sum[top:top + tile_size, col_start:col_start + tile_size] += weights
+
+        # Rows above the next row of tiles are complete
+        finished_rows = (row_starts[i + 1] if i + 1 < len(row_starts) else padded_height) - buffer_start
+        num_image_rows = min(finished_rows, height - buffer_start)
+        if num_image_rows > 0:
+            yield buffer_start, output_sum[:num_image_rows, :width] / weight_sum[:num_image_rows, :width]
+        buffer_start += finished_rows
+        output_sum, weight_sum = output_sum[finished_rows:], weight_sum[finished_rows:]
+
+
+'''
+Translates an arbitrarily large OCT image with a generator that takes tile_size x tile_size images
+(see translate_image_rows).
+
+    Parameters:
+        generator   (TensorFlow.keras.Model) : The OCT2Hist generator
+        image       (numpy array)            : The (height x width x 3) OCT image, normalized to [-1, 1]
+        output      (numpy array)            : (OPTIONAL) A (height x width x 3) array the translated image is written
+                                               to, e.g. a numpy memmap. If None, a new array is allocated.
+        kwargs                               : Additional parameters of translate_image_rows
+
+    Returns:
+        output      (numpy array) : The translated (height x width x 3) image, normalized to [-1, 1]
+'''
+def translate_image(generator, image, output=None, **kwargs):
+    if output is None:
+        output = np.zeros((image.shape[0], image.shape[1], 3), dtype=np.float32)
+
+    for row_start, rows in translate_image_rows(generator, image, **kwargs):
+        output[row_start:row_start + rows.shape[0]] = rows
+
+    return output
@@ -0,0 +1,47 @@
+import tensorflow as tf
+import numpy as np
+import tiled_inference as ti
+
+
+class TiledInferenceTest(tf.test.TestCase):
+
+    def setUp(self):
+        super(TiledInferenceTest, self).setUp()
+
+        # A generator that returns its input makes every blended output pixel equal to the input pixel
+        self.identity_generator = lambda tiles, training: tf.identity(tiles)
+
+    # Verify that an image larger than a tile is stitched back together without seams
+    def test_translate_image_large(self):
+        image = np.random.uniform(-1, 1, (600, 700, 3)).astype(np.float32)
+        output = ti.translate_image(self.identity_generator, image, overlap=64, batch_size=3)
+        self.assertAllClose(output, image, atol=1e-5)
+
+    # Verify that an image smaller than a tile is padded and cropped back to its dimensions
+    def test_translate_image_small(self):
+        image = np.random.uniform(-1, 1, (100, 130, 3)).astype(np.float32)
+        output = ti.translate_image(self.identity_generator, image)
+        self.assertAllClose(output, image, atol=1e-5)
+
+    # Verify that the streamed rows cover the image from top to bottom exactly once
+    def test_translate_image_rows_cover_image(self):
+        image = np.zeros((1024, 512, 3), dtype=np.float32)
+        row_start = 0
+        for start, rows in ti.translate_image_rows(self.identity_generator, image):
+            self.assertEqual(start, row_start)
+            self.assertEqual(rows.shape[1:], (512, 3))
+            self.assertLessEqual(rows.shape[0], ti.TILE_SIZE, msg="Rows must be streamed one row of tiles at a time.")
+            row_start += rows.shape[0]
+        self.assertEqual(row_start, 1024)
+
+    # Verify that consecutive tiles overlap by at least the requested overlap and cover the whole dimension
+    def test_get_tile_starts(self):
+        starts = ti.get_tile_starts(1000, 256, 64)
+        self.assertEqual(starts[0], 0)
+        self.assertEqual(starts[-1] + 256, 1000)
+        for start, next_start in zip(starts[:-1], starts[1:]):
+            self.assertLessEqual(next_start - start, 256 - 64)
+
+
+if __name__ == '__main__':
+    tf.test.main()
@@ -1,8 +1,155 @@
 import input_pipeline as ip
 from oct2hist_model import *
+from training_profiler import TrainingProfiler
 import time
 import os
 import argparse
+import shutil
+
+# Number of training steps between the checks of the workers of MultiWorkerMirroredStrategy whether a checkpoint is due
+CHECKPOINT_CHECK_FREQ = 100
+
+'''
+Creates the tf.distribute strategy used for training
+
+    Parameters:
+        name        (str) : 'default' for a single device, 'mirrored' for all devices (GPUs or, without GPUs, the CPU) 
+                            of this machine, or 'multi_worker' for several workers described by the TF_CONFIG 
+                            environment variable. The workers may be several processes on the same machine.
+
+    Returns:
+        strategy    (tf.distribute.Strategy) : The distribution strategy
+'''
+
+
+def create_strategy(name):
+    if name == 'mirrored':
+        return tf.distribute.MirroredStrategy()
+    elif name == 'multi_worker':
+        return tf.distribute.MultiWorkerMirroredStrategy()
+    return tf.distribute.get_strategy()
+
+
+'''
+Returns whether this process is the chief worker of the strategy. Without MultiWorkerMirroredStrategy, the only 
+process is the chief.
+
+    Parameters:
+        strategy    (tf.distribute.Strategy) : The distribution strategy
+
+    Returns:
+        is_chief    (boolean) : Whether this process is the chief worker
+        task_type   (str)     : The task type of this process, None without a cluster
+        task_id     (int)     : The task id of this process, None without a cluster
+'''
+
+
+def is_chief_worker(strategy):
+    cluster_resolver = getattr(strategy, 'cluster_resolver', None)
+    task_type = cluster_resolver.task_type if cluster_resolver is not None else None
+    task_id = cluster_resolver.task_id if cluster_resolver is not None else None
+    is_chief = task_type is None or task_type == 'chief' or (task_type == 'worker' and task_id == 0)
+    return is_chief, task_type, task_id
+
+
+'''
+Creates the manager of the training checkpoints. With MultiWorkerMirroredStrategy every worker has to take part in 
+saving, but only the chief worker writes to checkpoint_dir, the other workers write to a temporary directory that is 
+deleted after every save (see save_checkpoint).
+
+    Parameters:
+        model           (OCT2HistModel) : The model to save
+        checkpoint_dir  (str)           : The directory the checkpoints are saved in
+        max_to_keep     (int)           : Number of most recent checkpoints that are kept, older ones are deleted
+
+    Returns:
+        manager         (tf.train.CheckpointManager) : The checkpoint manager of this worker
+'''
+
+
+def create_checkpoint_manager(model, checkpoint_dir, max_to_keep=3):
+    is_chief, task_type, task_id = is_chief_worker(model.strategy)
+    if not is_chief:
+        checkpoint_dir = os.path.join(checkpoint_dir, 'worker_tmp_{}_{}'.format(task_type, task_id))
+    return tf.train.CheckpointManager(model.checkpoint, checkpoint_dir, max_to_keep=max_to_keep)
+
+
+'''
+Returns the options to write checkpoints in the background, so that training continues while a checkpoint is being
+written. Returns None if this version of TensorFlow does not support asynchronous checkpoints.
+'''
+
+
+def get_async_checkpoint_options():
+    try:
+        return tf.train.CheckpointOptions(experimental_enable_async_checkpoint=True)
+    except TypeError:
+        print('Asynchronous checkpoints are not supported by this version of TensorFlow, checkpoints are written '
+              'synchronously')
+        return None
+
+
+'''
+Saves a checkpoint numbered by the global step
+
+    Parameters:
+        model           (OCT2HistModel)              : The model to save
+        manager         (tf.train.CheckpointManager) : The checkpoint manager created by create_checkpoint_manager
+        options         (tf.train.CheckpointOptions) : (OPTIONAL) The options to save the checkpoint with, see 
+                                                       get_async_checkpoint_options
+'''
+
+
+def save_checkpoint(model, manager, options=None):
+    if is_chief_worker(model.strategy)[0]:
+        manager.save(checkpoint_number=model.generator_optimizer.iterations, options=options)
+    else:
+        # The temporary checkpoint is deleted right away, so it has to be written synchronously
+        manager.save(checkpoint_number=model.generator_optimizer.iterations)
+        shutil.rmtree(manager.directory, ignore_errors=True)
+
+
+'''
+Returns whether a checkpoint is due, i.e. checkpoint_minutes have passed since the last one. With 
+MultiWorkerMirroredStrategy every worker has to take part in each save, but the workers measure the time on their own 
+clocks. So the chief decides and the workers agree on its decision with an all-reduce, which is only done every 
+CHECKPOINT_CHECK_FREQ steps so that the workers do not wait for each other after every step.
+
+    Parameters:
+        strategy                (tf.distribute.Strategy) : The distribution strategy
+        step                    (int)                    : The number of training steps of the epoch so far, which 
+                                                           is the same on all workers
+        last_checkpoint_time    (float)                  : The time.time() of the last checkpoint
+        checkpoint_minutes      (float)                  : Minutes of training between checkpoints
+
+    Returns:
+        is_due                  (boolean) : Whether all workers should save a checkpoint now
+'''
+
+
+def is_checkpoint_due(strategy, step, last_checkpoint_time, checkpoint_minutes):
+    is_chief, task_type, _ = is_chief_worker(strategy)
+    is_due = time.time() - last_checkpoint_time > checkpoint_minutes * 60
+    if task_type is None:
+        return is_due
+    if step % CHECKPOINT_CHECK_FREQ != 0:
+        return False
+    votes = strategy.run(lambda: tf.constant(1 if is_chief and is_due else 0))
+    return int(strategy.reduce(tf.distribute.ReduceOp.SUM, votes, axis=None).numpy()) > 0
+
+
+'''
+Waits until all checkpoints written in the background are complete
+
+    Parameters:
+        model           (OCT2HistModel) : The saved model
+'''
+
+
+def wait_for_checkpoints(model):
+    if hasattr(model.checkpoint, 'sync'):
+        model.checkpoint.sync()
+
 
 if __name__ == '__main__':
 
@@ -12,8 +159,60 @@ if __name__ == '__main__':
                                                                                  Please see the docstring for load_dataset in input_pipeline.py for more formatting details')
     parser.add_argument('--hist_data_folders', nargs='*', help='A file path or a list of space-separated file paths pointing to the folder(s) of histology images. \
                                                                     Please see the docstring for load_dataset in input_pipeline.py for more formatting details')
+    parser.add_argument('--manifest_path', type=str, default=None, help='JSON file caching the listing of the data folders. Created on first use, only changed folders are listed again')
+    parser.add_argument('--batch_size', type=int, default=1, help='Number of OCT-Histology image pairs per training step')
+    parser.add_argument('--accumulation_steps', type=int, default=1,
+                        help='Number of batches whose gradients are accumulated into one optimizer step, which trains '
+                             'with an effective batch size of --batch_size times this without its memory')
+    parser.add_argument('--precision_policy', type=str, default='float32', choices=PRECISION_POLICIES,
+                        help='Keras mixed precision policy. mixed_float16 for GPUs, mixed_bfloat16 for TPUs and CPUs')
+    parser.add_argument('--distribution_strategy', type=str, default='default',
+                        choices=['default', 'mirrored', 'multi_worker'],
+                        help='How to distribute training: a single device, all devices of this machine, or several workers '
+                             'described by TF_CONFIG. --batch_size is the global batch size, split across all replicas')
+    parser.add_argument('--prefetch', type=int, default=tf.data.experimental.AUTOTUNE,
+                        help='Number of batches prepared ahead of the training step. 0 disables prefetching, '
+                             'the default lets tf.data tune it')
+    parser.add_argument('--cache', type=str, default='none', choices=ip.CACHE_MODES,
+                        help='Cache the encoded (files) or decoded images after the first epoch')
+    parser.add_argument('--cache_path', type=str, default='',
+                        help='File prefix of an on-disk cache. The cache is kept in memory if not set')
+    parser.add_argument('--shuffle_buffer_size', type=int, default=None,
+                        help='Number of image pairs the training data is shuffled with. Defaults to the size of the '
+                             'dataset, up to {} image pairs'.format(ip.MAX_SHUFFLE_BUFFER_SIZE))
+    parser.add_argument('--seed', type=int, default=8, help='Seed of the random shuffling of the training data')
+    parser.add_argument('--deterministic', action='store_true',
+                        help='Keep the order of the images produced by the parallel stages of the input pipeline, '
+                             'which makes shuffling reproducible at the cost of throughput')
+    parser.add_argument('--num_parallel_calls', type=int, default=tf.data.experimental.AUTOTUNE,
+                        help='Number of images decoded and augmented in parallel. The default lets tf.data tune it')
+    parser.add_argument('--jit_compile', action='store_true',
+                        help='Compile the forward and backward passes of the training step with XLA')
+    parser.add_argument('--checkpoint_dir', type=str, default='./training_checkpoints',
+                        help='Directory of the checkpoints. Training resumes from the latest checkpoint in it')
+    parser.add_argument('--max_to_keep', type=int, default=3, help='Number of most recent checkpoints that are kept')
+    parser.add_argument('--checkpoint_minutes', type=float, default=10,
+                        help='Minutes of training between checkpoints. A checkpoint is also saved at the end of '
+                             'training. When training resumes, the interrupted epoch skips as many batches as were '
+                             'already trained on, taken from a newly shuffled order')
+    parser.add_argument('--sync_checkpoint', action='store_true',
+                        help='Write checkpoints synchronously instead of in the background')
+    parser.add_argument('--profile_freq', type=int, default=0,
+                        help='Print the time spent in every stage of the training step every this many steps. '
+                             '0 disables profiling')
+    parser.add_argument('--profile_trace_dir', type=str, default=None,
+                        help='Write a tf.profiler trace of a window of steps to this directory, for the TensorBoard '
+                             'profiler')
+    parser.add_argument('--profile_trace_start_step', type=int, default=10, help='First step of the trace window')
+    parser.add_argument('--profile_trace_steps', type=int, default=5, help='Number of steps in the trace window')
+    parser.add_argument('--summary_freq', type=int, default=100,
+                        help='Number of training steps whose losses are averaged into one TensorBoard summary. '
+                             'Summaries are also written at the end of every epoch')
     args = parser.parse_args()
 
+    # The strategy has to be created before any other TensorFlow operation runs
+    strategy = create_strategy(args.distribution_strategy)
+
     # Specify the number of epochs at which the learning rate should be constant and the number of epochs at which
     # the learning rate should decay
     NUM_EPOCHS_CONST_LR = 100
@@ -21,33 +220,79 @@ if __name__ == '__main__':
     EPOCHS = NUM_EPOCHS_CONST_LR + NUM_EPOCHS_DECAY_LR
 
     # Initial dataset and the OCT2Hist model with checkpoints
-    train_dataset, num_batches = ip.load_dataset(args.OCT_data_folders, args.hist_data_folders, is_train=True)
+    pipeline_options = ip.PipelineOptions(prefetch=args.prefetch, cache=args.cache, cache_path=args.cache_path,
+                                          shuffle_buffer_size=args.shuffle_buffer_size, seed=args.seed,
+                                          deterministic=args.deterministic,
+                                          num_parallel_calls=args.num_parallel_calls)
+    train_dataset, num_batches = ip.load_dataset(args.OCT_data_folders, args.hist_data_folders, is_train=True,
+                                                 batch_size=args.batch_size, manifest_path=args.manifest_path,
+                                                 options=pipeline_options)
     model = OCT2HistModel(num_epochs_const_lr=NUM_EPOCHS_CONST_LR, num_epochs_decay_lr=NUM_EPOCHS_DECAY_LR,
-                          num_batches=num_batches, is_train=True)
-    checkpoint_dir = './training_checkpoints'
-    checkpoint_prefix = os.path.join(checkpoint_dir, "ckpt")
-    checkpoint = tf.train.Checkpoint(generator_optimizer=model.generator_optimizer,
-                                     discriminator_optimizer=model.discriminator_optimizer,
-                                     generator=model.generator,
-                                     discriminator=model.discriminator)
+                          num_batches=num_batches, is_train=True, precision_policy=args.precision_policy,
+                          strategy=strategy, jit_compile=args.jit_compile,
+                          accumulation_steps=args.accumulation_steps)
+    checkpoint_manager = create_checkpoint_manager(model, args.checkpoint_dir, args.max_to_keep)
+    checkpoint_options = None if args.sync_checkpoint else get_async_checkpoint_options()
+
+    # Resume from the latest checkpoint. The optimizer step counters are restored with it, so the learning rate
+    # schedule continues where it stopped, and the interrupted epoch is shortened by the number of batches that were
+    # already trained on. The training data is shuffled again after the restart, so these are skipped from a new
+    # order and are not the same batches; the epoch trains on the right number of batches, but not exactly on the
+    # ones that were left. The step counters count optimizer steps, each of which trained on accumulation_steps
+    # batches (checkpoints are only saved once the accumulated gradients are applied).
+    start_epoch, num_skipped_batches = 0, 0
+    latest_checkpoint = tf.train.latest_checkpoint(args.checkpoint_dir)
+    if latest_checkpoint is not None:
+        model.checkpoint.restore(latest_checkpoint)
+        num_steps = int(model.generator_optimizer.iterations.numpy())
+        start_epoch = int(model.epoch.numpy())
+        num_skipped_steps = max(num_steps - start_epoch * model.num_steps_per_epoch, 0)
+        # The epoch counter is not saved yet if training stopped between the end of an epoch and the next checkpoint
+        start_epoch += num_skipped_steps // model.num_steps_per_epoch
+        num_skipped_batches = (num_skipped_steps % model.num_steps_per_epoch) * args.accumulation_steps
+        print('Resuming from {} at epoch {}, step {}'.format(latest_checkpoint, start_epoch, num_steps))
+
+    # Split every batch across the replicas of the strategy
+    distributed_train_dataset = strategy.experimental_distribute_dataset(train_dataset)
+
+    profiler = TrainingProfiler(model, args.profile_freq, args.profile_trace_dir, args.profile_trace_start_step,
+                                args.profile_trace_steps)
 
     # Training loop
-    for epoch in range(EPOCHS):
+    last_checkpoint_time = time.time()
+    for epoch in range(start_epoch, EPOCHS):
         start = time.time()
 
         print("Epoch: ", epoch)
 
+        epoch_dataset = distributed_train_dataset
+        if num_skipped_batches > 0:
+            epoch_dataset = strategy.experimental_distribute_dataset(train_dataset.skip(num_skipped_batches))
+            num_skipped_batches = 0
+
         # Train
-        for n, (filepath, input_image, target) in train_dataset.enumerate():
+        for n, (filepath, input_image, target) in enumerate(profiler.iterate(epoch_dataset)):
             print('.', end='')
             if (n + 1) % 100 == 0:
                 print()
-            model.train_step(input_image, target, epoch)
-        print()
+            profiler.train_step(filepath, input_image, target)
+            if (n + 1) % args.summary_freq == 0:
+                with profiler.time_stage('summary'):
+                    model.write_summaries()
 
-        # saving (checkpoint) the model every 20 epochs
-        if (epoch + 1) % 20 == 0:
-            checkpoint.save(file_prefix=checkpoint_prefix)
+            # Save a checkpoint every few minutes so that little work is lost if training is interrupted. Gradients
+            # that are accumulated but not applied yet are not part of the checkpoint, wait until they are applied.
+            if (model.num_accumulated_batches == 0
+                    and is_checkpoint_due(strategy, n + 1, last_checkpoint_time, args.checkpoint_minutes)):
+                save_checkpoint(model, checkpoint_manager, checkpoint_options)
+                last_checkpoint_time = time.time()
+        # Apply the gradients of the last batches of the epoch and write the losses of the remaining steps
+        model.apply_accumulated_gradients()
+        model.write_summaries()
+        model.epoch.assign(epoch + 1)
+        print()
 
         print('Time taken for epoch {} is {} sec\n'.format(epoch + 1, time.time() - start))
-    checkpoint.save(file_prefix=checkpoint_prefix)
+    profiler.close()
+    save_checkpoint(model, checkpoint_manager, checkpoint_options)
+    wait_for_checkpoints(model)
@@ -0,0 +1,54 @@
+import tensorflow as tf
+
+'''
+This class accumulates training metrics on the device and writes them to TensorBoard in bulk. Every metric is a
+tf.keras.metrics.Mean that is updated inside the compiled train step without any summary I/O; write_summaries then
+writes the mean of every metric since the last call (e.g. every N steps or once per epoch) against the given global
+step and resets the metrics.
+
+The metrics are updated with the losses train_step already reduced across replicas, so they have to be created
+outside of the scope of a distribution strategy.
+
+    Class Members:
+        summary_writer  (TensorFlow.summary.SummaryWriter) : The SummaryWriter object the metrics are written with
+        metrics         (dict)                             : Maps the name of every metric to its tf.keras.metrics.Mean
+'''
+class TrainingMetrics:
+
+    '''
+    Initialize class variables
+
+    Parameters:
+        summary_writer  (TensorFlow.summary.SummaryWriter) : The SummaryWriter object the metrics are written with
+        metric_names    (list)                             : The names of the metrics
+    '''
+    def __init__(self, summary_writer, metric_names):
+        self.summary_writer = summary_writer
+        self.metrics = {name: tf.keras.metrics.Mean(name, dtype=tf.float32) for name in metric_names}
+
+    '''
+    Accumulate a new value of every metric. Can be called from a tf.function.
+
+    Parameters:
+        values  (dict) : Maps the name of every metric to its new value
+    '''
+    def update_state(self, values):
+        for name, value in values.items():
+            self.metrics[name].update_state(value)
+
+    '''
+    Write the mean of every metric accumulated since the last call and reset the metrics. Metrics without any new
+    value are skipped.
+
+    Parameters:
+        step            (int)  : The global step the values are written against
+        extra_scalars   (dict) : (OPTIONAL) Additional scalars to write, mapping their names to their values
+    '''
+    def write_summaries(self, step, extra_scalars=None):
+        with self.summary_writer.as_default():
+            for name, metric in self.metrics.items():
+                if metric.count > 0:
+                    tf.summary.scalar(name, metric.result(), step=step)
+                metric.reset_states()
+            for name, value in (extra_scalars or {}).items():
+                tf.summary.scalar(name, value, step=step)
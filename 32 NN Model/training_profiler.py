@@ -0,0 +1,254 @@
+import tensorflow as tf
+import input_pipeline as ip
+import contextlib
+import time
+
+# Stages reported by TrainingProfiler, in the order they are printed
+TRAINING_STAGES = ['input_wait', 'train_step', 'generator_forward', 'discriminator_forward', 'backward',
+                   'optimizer_apply', 'summary']
+INPUT_STAGES = ['decode', 'augment']
+
+'''
+This class reports where the time of the training loop goes, so that it can be told whether training is input-bound
+or compute-bound. Every report_freq steps it prints the mean time per step spent in:
+
+    input_wait              : Waiting for the next batch of the input pipeline
+    train_step              : OCT2HistModel.train_step, split into
+        generator_forward       : The forward pass of the generator
+        discriminator_forward   : The forward passes of the discriminator
+        backward                : Computing the losses and gradients
+        optimizer_apply         : Applying the gradients (the rest of train_step)
+    summary                 : Writing the TensorBoard summaries
+    decode, augment         : Decoding and resizing the JPEG images, and augmenting the batch. These stages run in the
+                              tf.data pipeline in parallel with training, so they only slow training down if they
+                              show up as input_wait.
+
+input_wait, train_step and summary are measured on every step. The split of train_step and the input stages are
+measured by probe functions that run each stage on its own, once per report on the current batch. As the stages do
+not overlap when they run on their own, they can add up to slightly more than train_step.
+
+To time the steps, the profiler waits for every training step to finish before the next one starts, which removes
+the overlap of consecutive steps on GPUs. When disabled (report_freq = 0 and no trace window), it adds no overhead.
+
+Optionally, a tf.profiler trace of a window of steps is written, which can be viewed in the TensorBoard profiler.
+
+    Class Members:
+        model               (OCT2HistModel) : The profiled model
+        report_freq         (int)           : Number of steps between reports, 0 disables the reports
+        trace_dir           (str)           : Directory the tf.profiler trace is written to, None disables tracing
+        trace_start_step    (int)           : The first step of the trace window
+        trace_num_steps     (int)           : Number of steps in the trace window
+        step                (int)           : Number of training steps run through the profiler
+        stage_times         (dict)          : Time in seconds spent in every stage since the last report
+        last_report         (dict)          : The last report, see report
+'''
+class TrainingProfiler:
+
+    def __init__(self, model, report_freq=0, trace_dir=None, trace_start_step=10, trace_num_steps=5):
+        self.model = model
+        self.report_freq = report_freq
+        self.trace_dir = trace_dir
+        self.trace_start_step = trace_start_step
+        self.trace_num_steps = trace_num_steps
+        self.step = 0
+        self.stage_times = {}
+        self.last_report = None
+        self._num_report_steps = 0
+        self._is_tracing = False
+        self._probes = None
+
+    '''
+    Returns whether the profiler measures or traces anything
+    '''
+    @property
+    def enabled(self):
+        return self.report_freq > 0 or self.trace_dir is not None
+
+    '''
+    Iterates over a dataset and measures the time spent waiting for every element
+
+        Parameters:
+            dataset     (iterable) : The dataset, or distributed dataset, to iterate over
+    '''
+    def iterate(self, dataset):
+        if self.report_freq <= 0:
+            yield from dataset
+            return
+
+        iterator = iter(dataset)
+        while True:
+            start = time.perf_counter()
+            try:
+                element = next(iterator)
+            except StopIteration:
+                return
+            self._add_time('input_wait', time.perf_counter() - start)
+            yield element
+
+    '''
+    Context manager that adds the time spent in its body to a stage
+
+        Parameters:
+            stage       (str) : The name of the stage
+    '''
+    @contextlib.contextmanager
+    def time_stage(self, stage):
+        if self.report_freq <= 0:
+            yield
+            return
+
+        start = time.perf_counter()
+        yield
+        self._add_time(stage, time.perf_counter() - start)
+
+    '''
+    Runs a training step of the model, measures it and prints a report every report_freq steps
+
+        Parameters:
+            filepaths   (Tensor) : The file paths of the OCT images of the batch
+            input_image (Tensor) : The batch of OCT images
+            target      (Tensor) : The batch of histology images
+
+        Returns:
+            The losses returned by OCT2HistModel.train_step
+    '''
+    def train_step(self, filepaths, input_image, target):
+        if not self.enabled:
+            return self.model.train_step(input_image, target)
+
+        self._update_trace()
+        with tf.profiler.experimental.Trace('train', step_num=self.step, _r=1):
+            with self.time_stage('train_step'):
+                losses = self.model.train_step(input_image, target)
+                if self.report_freq > 0:
+                    # Wait for the step to finish
+                    losses[0].numpy()
+        self.step += 1
+        self._num_report_steps += 1
+
+        if self.report_freq > 0 and self.step % self.report_freq == 0:
+            self._run_probes(filepaths, input_image, target)
+            self.report()
+        return losses
+
+    '''
+    Prints the mean time per step of every stage since the last report and resets the measurements
+
+        Returns:
+            report      (dict) : The mean time per step in milliseconds of every measured stage
+    '''
+    def report(self):
+        num_steps = max(self._num_report_steps, 1)
+        report = {stage: 1000 * self.stage_times[stage] / num_steps
+                  for stage in TRAINING_STAGES if stage in self.stage_times}
+        # The probes measure a single step
+        report.update({stage: 1000 * self.stage_times[stage] for stage in INPUT_STAGES if stage in self.stage_times})
+
+        print('\nProfile of steps {}-{} (ms per step): {}'.format(
+            self.step - self._num_report_steps + 1, self.step,
+            ', '.join('{} {:.1f}'.format(stage, value) for stage, value in report.items())))
+        total = report.get('input_wait', 0) + report.get('train_step', 0) + report.get('summary', 0)
+        if total > 0:
+            print('{:.1f}% of the time is spent waiting for input'.format(100 * report.get('input_wait', 0) / total))
+
+        self.stage_times = {}
+        self._num_report_steps = 0
+        self.last_report = report
+        return report
+
+    '''
+    Stops a running trace, e.g. when training ends inside the trace window
+    '''
+    def close(self):
+        if self._is_tracing:
+            tf.profiler.experimental.stop()
+            self._is_tracing = False
+
+    def _add_time(self, stage, seconds):
+        self.stage_times[stage] = self.stage_times.get(stage, 0) + seconds
+
+    '''
+    Starts or stops the tf.profiler trace at the borders of the trace window
+    '''
+    def _update_trace(self):
+        if self.trace_dir is None:
+            return
+        if self.step == self.trace_start_step:
+            tf.profiler.experimental.start(self.trace_dir)
+            self._is_tracing = True
+        elif self.step == self.trace_start_step + self.trace_num_steps:
+            self.close()
+
+    '''
+    Builds the probe functions, each of which runs one stage on its own
+    '''
+    def _build_probes(self):
+        model = self.model
+
+        def read_and_decode(filepaths):
+            # The histology file paths are not part of the batch, the histology images are assumed to take as long
+            # to decode as the OCT images
+            def decode(filepath):
+                OCT_jpeg = tf.io.read_file(filepath)
+                return ip._resize_image_pair(filepath, *ip._decode_image_pair(OCT_jpeg, OCT_jpeg), is_train=True)[1:]
+            return tf.map_fn(decode, filepaths, fn_output_signature=(tf.float32, tf.float32))
+
+        def augment(filepaths, OCT_images):
+            return ip._augment_batch(filepaths, OCT_images, OCT_images, is_train=True)[1]
+
+        def generator_forward(input_image):
+            return model.generator(input_image, training=True)
+
+        def generator_discriminator_forward(input_image, target):
+            gen_output = model.generator(input_image, training=True)
+            return model.discriminate(input_image, target, gen_output)
+
+        def forward_backward(input_image, target):
+            return model.compute_gradients(input_image, target, tf.shape(input_image)[0])
+
+        self._probes = {name: tf.function(fn) for name, fn in [('decode', read_and_decode), ('augment', augment),
+                                                              ('generator_forward', generator_forward),
+                                                              ('forward', generator_discriminator_forward),
+                                                              ('forward_backward', forward_backward)]}
+
+    '''
+    Times the stages of a step with the probe functions and splits the time of train_step across them
+    '''
+    def _run_probes(self, filepaths, input_image, target):
+        # The probes run outside of the distribution strategy, on the part of the batch of the first replica
+        filepaths, input_image, target = [self.model.strategy.experimental_local_results(value)[0]
+                                          for value in [filepaths, input_image, target]]
+
+        first_run = self._probes is None
+        if first_run:
+            self._build_probes()
+
+        def time_probe(name, *args):
+            # The first call traces the probe, time the second one
+            for _ in range(2 if first_run else 1):
+                start = time.perf_counter()
+                outputs = self._probes[name](*args)
+                for output in tf.nest.flatten(outputs):
+                    if output is not None:
+                        output.numpy()
+            return time.perf_counter() - start
+
+        try:
+            self._add_time('decode', time_probe('decode', filepaths))
+        except (tf.errors.NotFoundError, tf.errors.InvalidArgumentError):
+            # e.g. the images were streamed from a compiled dataset whose source images are not available
+            pass
+        resized_images = tf.image.resize(input_image, [ip.IMG_JIT_HEIGHT, ip.IMG_JIT_WIDTH])
+        self._add_time('augment', time_probe('augment', filepaths, resized_images))
+
+        generator_time = time_probe('generator_forward', input_image)
+        forward_time = time_probe('forward', input_image, target)
+        forward_backward_time = time_probe('forward_backward', input_image, target)
+
+        # Split the measured train_step time across its stages
+        num_steps = self._num_report_steps
+        self._add_time('generator_forward', generator_time * num_steps)
+        self._add_time('discriminator_forward', max(forward_time - generator_time, 0) * num_steps)
+        self._add_time('backward', max(forward_backward_time - forward_time, 0) * num_steps)
+        self._add_time('optimizer_apply',
+                       max(self.stage_times.get('train_step', 0) - forward_backward_time * num_steps, 0))
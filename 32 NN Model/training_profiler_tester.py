@@ -0,0 +1,46 @@
+import tensorflow as tf
+import input_pipeline as ip
+import tester_helpers
+from oct2hist_model import OCT2HistModel
+from training_profiler import TrainingProfiler, TRAINING_STAGES, INPUT_STAGES
+
+
+class TrainingProfilerTest(tf.test.TestCase):
+
+    def setUp(self):
+        super(TrainingProfilerTest, self).setUp()
+
+        OCT_image, hist_image = tester_helpers.load_tester_images("test_vectors/sample_OCT.jpg",
+                                                                  "test_vectors/sample_histology.jpg")
+        OCT_image, hist_image = ip.normalize(*ip.resize(OCT_image, hist_image, 256, 256))
+        self.dataset = tf.data.Dataset.from_tensors((tf.constant(["test_vectors/sample_OCT.jpg"] * 2),
+                                                     tf.stack([OCT_image] * 2),
+                                                     tf.stack([hist_image] * 2))).repeat(2)
+        self.model = OCT2HistModel(num_epochs_const_lr=1, num_epochs_decay_lr=1, num_batches=2, is_train=True)
+
+    # Verify that every stage is reported after report_freq steps
+    def test_report(self):
+        profiler = TrainingProfiler(self.model, report_freq=2)
+        for filepaths, input_image, target in profiler.iterate(self.dataset):
+            profiler.train_step(filepaths, input_image, target)
+            with profiler.time_stage('summary'):
+                self.model.write_summaries()
+
+        self.assertEqual(profiler.step, 2)
+        self.assertCountEqual(profiler.last_report.keys(), TRAINING_STAGES + INPUT_STAGES)
+        self.assertGreater(profiler.last_report['train_step'], 0)
+        self.assertEqual(profiler.stage_times, {}, msg="Measurements must be reset after a report.")
+
+    # Verify that a disabled profiler only runs the training steps
+    def test_disabled(self):
+        profiler = TrainingProfiler(self.model)
+        for filepaths, input_image, target in profiler.iterate(self.dataset):
+            profiler.train_step(filepaths, input_image, target)
+
+        self.assertEqual(self.model.generator_optimizer.iterations, 2)
+        self.assertEqual(profiler.stage_times, {})
+        self.assertIsNone(profiler.last_report)
+
+
+if __name__ == '__main__':
+    tf.test.main()
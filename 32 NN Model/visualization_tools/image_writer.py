@@ -0,0 +1,61 @@
+"""This module contains a pool of threads that encodes and writes images in the background"""
+import queue
+import threading
+from . import util
+
+
+class ImageWriter:
+    """This class encodes and writes images on a pool of worker threads, so that inference does not wait on PNG encoding.
+
+    Images are handed to the workers through a bounded queue: <save_image> only blocks when <max_queue_size> images
+    are waiting to be written, which bounds the memory held by pending images. PIL releases the GIL while it encodes
+    and resizes images, so the workers run in parallel with each other and with inference.
+    """
+
+    def __init__(self, num_workers=4, max_queue_size=64):
+        """Start the worker threads
+
+        Parameters:
+            num_workers (int)    -- the number of threads writing images
+            max_queue_size (int) -- the maximum number of images waiting to be written
+        """
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.errors = []
+        self.workers = [threading.Thread(target=self._work, daemon=True) for _ in range(num_workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def save_image(self, image_numpy, image_path, original_image_dims=None):
+        """Queue a numpy image to be written to the disk (see util.save_image)
+
+        Parameters:
+            image_numpy (numpy array)   -- input numpy array
+            image_path (str)            -- the path of the image
+            original_image_dims (tuple) -- the dimensions the image is resized to before it is written
+        """
+        self._raise_errors()
+        self.queue.put((image_numpy, image_path, original_image_dims))
+
+    def close(self):
+        """Wait until all queued images are written and stop the worker threads"""
+        for _ in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+        self._raise_errors()
+
+    def _work(self):
+        """Write queued images until a None item is received"""
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            try:
+                util.save_image(*item)
+            except Exception as e:
+                self.errors.append(e)
+
+    def _raise_errors(self):
+        """Re-raise the first error of a worker thread in the calling thread"""
+        if self.errors:
+            raise self.errors[0]
@@ -25,6 +25,19 @@ def tensor2im(input_image, imtype=np.uint8):
         image_numpy = input_image
     return image_numpy.astype(imtype)
 
+
+def batch2ims(input_images, imtype=np.uint8):
+    """"Converts a batch of images in [-1, 1] into a list of numpy image arrays.
+
+    The batch is scaled on the device and copied to the host once, instead of once per image.
+
+    Parameters:
+        input_images (tensor) --  the batch of image tensors
+        imtype (type)         --  the desired type of the converted numpy arrays
+    """
+    images = tf.clip_by_value((tf.cast(input_images, tf.float32) + 1) / 2.0 * 255.0, 0, 255)  # post-processing: scaling
+    return list(tf.cast(images, tf.dtypes.as_dtype(imtype)).numpy())
+
 '''Save a numpy image to the disk
 
     Parameters:
@@ -38,7 +51,7 @@ def save_image(image_numpy, image_path, original_image_dims=None):
     h, w, _ = image_numpy.shape
 
     if original_image_dims is not None:
-        image_pil = image_pil.resize(original_image_dims, Image.ANTIALIAS)
+        image_pil = image_pil.resize(original_image_dims, Image.LANCZOS)
     image_pil.save(image_path, quality=95)
 
 